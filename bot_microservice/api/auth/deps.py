@@ -1,6 +1,7 @@
 from fastapi import Depends
 
 from api.deps import get_database
+from core.auth.counters import UserQuestionCounter, get_user_question_counter
 from core.auth.repository import UserRepository
 from core.auth.services import UserService
 from infra.database.db_adapter import Database
@@ -12,5 +13,6 @@ def get_user_repository(db: Database = Depends(get_database)) -> UserRepository:
 
 def get_user_service(
     user_repository: UserRepository = Depends(get_user_repository),
+    question_counter: UserQuestionCounter = Depends(get_user_question_counter),
 ) -> UserService:
-    return UserService(repository=user_repository)
+    return UserService(repository=user_repository, question_counter=question_counter)
@@ -10,9 +10,12 @@ from api.bot.deps import (
     get_update_from_request,
 )
 from api.bot.serializers import (
+    BotQueueStatsSerializer,
+    ChatGptAnswerCacheStatsSerializer,
     ChatGptModelSerializer,
     ChatGptModelsPrioritySerializer,
     GETChatGptModelsSerializer,
+    GETChatGptModelsStatsSerializer,
     LightChatGptModel,
 )
 from api.exceptions import PermissionMissingResponse
@@ -28,14 +31,34 @@ router = APIRouter()
     name="bot:process_bot_updates",
     response_class=Response,
     status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "Bot queue is full, telegram will retry the update"},
+    },
     summary="process bot updates",
     include_in_schema=False,
 )
 async def process_bot_updates(
     tg_update: Update = Depends(get_update_from_request),
     queue: BotQueue = Depends(get_bot_queue),
-) -> None:
-    await queue.put_updates_on_queue(tg_update)
+) -> Response:
+    return await queue.put_updates_on_queue(tg_update)
+
+
+@router.get(
+    "/bot/queue/stats",
+    name="bot:queue_stats",
+    response_class=JSONResponse,
+    response_model=BotQueueStatsSerializer,
+    status_code=status.HTTP_200_OK,
+    summary="bot updates queue stats",
+)
+async def queue_stats(
+    queue: BotQueue = Depends(get_bot_queue),
+) -> JSONResponse:
+    """Получить размер очереди обновлений бота и количество занятых воркеров"""
+    return JSONResponse(
+        content=BotQueueStatsSerializer.model_validate(queue.stats).model_dump(), status_code=status.HTTP_200_OK
+    )
 
 
 @router.get(
@@ -56,6 +79,43 @@ async def models_list(
     )
 
 
+@router.get(
+    "/chatgpt/models/stats",
+    name="bot:models_stats",
+    response_class=JSONResponse,
+    response_model=GETChatGptModelsStatsSerializer,
+    status_code=status.HTTP_200_OK,
+    summary="live stats of models",
+)
+async def models_stats(
+    chatgpt_service: ChatGptService = Depends(get_chatgpt_service),
+) -> JSONResponse:
+    """Получить оценки моделей, время ответа и количество ошибок в порядке, в котором модели опрашиваются"""
+    models_stats = await chatgpt_service.get_chatgpt_models_stats()
+    return JSONResponse(
+        content=GETChatGptModelsStatsSerializer(data=models_stats).model_dump(mode="json"),  # type: ignore
+        status_code=status.HTTP_200_OK,
+    )
+
+
+@router.get(
+    "/chatgpt/answers/cache/stats",
+    name="bot:answer_cache_stats",
+    response_class=JSONResponse,
+    response_model=ChatGptAnswerCacheStatsSerializer,
+    status_code=status.HTTP_200_OK,
+    summary="answer cache stats",
+)
+async def answer_cache_stats(
+    chatgpt_service: ChatGptService = Depends(get_chatgpt_service),
+) -> JSONResponse:
+    """Получить размер кэша ответов и долю ответов из кэша"""
+    stats = await chatgpt_service.get_answer_cache_stats()
+    return JSONResponse(
+        content=ChatGptAnswerCacheStatsSerializer.model_validate(stats).model_dump(), status_code=status.HTTP_200_OK
+    )
+
+
 @router.put(
     "/chatgpt/models/{model_id}/priority",
     name="bot:change_model_priority",
@@ -1,4 +1,5 @@
 from fastapi import Depends, Header, HTTPException
+from httpx import AsyncClient
 from starlette import status
 from starlette.requests import Request
 from telegram import Update
@@ -8,9 +9,28 @@ from api.bot.constants import BOT_ACCESS_API_HEADER
 from api.deps import get_database
 from core.auth.services import UserService
 from core.bot.app import BotApplication, BotQueue
-from core.bot.repository import ChatGPTRepository
-from core.bot.services import ChatGptService
+from core.bot.dto import ChatGptAnswerDTO
+from core.bot.repository import (
+    ChatConversationRepository,
+    ChatGptAnswerRepository,
+    ChatGPTRepository,
+)
+from core.bot.scoring import ModelScoreboard, get_model_scoreboard
+from core.bot.services import (
+    ChatConversationService,
+    ChatGptAnswerCacheMetrics,
+    ChatGptAnswerCacheService,
+    ChatGptService,
+    get_chatgpt_answer_cache_metrics,
+    get_chatgpt_requests_in_flight,
+)
 from infra.database.db_adapter import Database
+from infra.http_client import (
+    ChatGptClientGuard,
+    get_chatgpt_client,
+    get_chatgpt_client_guard,
+)
+from infra.single_flight import SingleFlight
 from settings.config import AppSettings, get_settings, settings
 
 
@@ -28,20 +48,62 @@ async def get_update_from_request(request: Request, bot_app: BotApplication = De
 
 
 def get_chatgpt_repository(
-    db: Database = Depends(get_database), settings: AppSettings = Depends(get_settings)
+    db: Database = Depends(get_database),
+    settings: AppSettings = Depends(get_settings),
+    client: AsyncClient = Depends(get_chatgpt_client),
+    scoreboard: ModelScoreboard = Depends(get_model_scoreboard),
+    client_guard: ChatGptClientGuard = Depends(get_chatgpt_client_guard),
 ) -> ChatGPTRepository:
-    return ChatGPTRepository(settings=settings, db=db)
+    return ChatGPTRepository(settings=settings, db=db, client=client, scoreboard=scoreboard, client_guard=client_guard)
 
 
 def new_bot_queue(bot_app: BotApplication = Depends(get_bot_app)) -> BotQueue:
     return BotQueue(bot_app=bot_app)
 
 
+def get_chatgpt_answer_cache_service(
+    db: Database = Depends(get_database),
+    settings: AppSettings = Depends(get_settings),
+    metrics: ChatGptAnswerCacheMetrics = Depends(get_chatgpt_answer_cache_metrics),
+) -> ChatGptAnswerCacheService:
+    return ChatGptAnswerCacheService(
+        repository=ChatGptAnswerRepository(db=db),
+        metrics=metrics,
+        max_size=settings.GPT_ANSWER_CACHE_SIZE,
+        ttl=settings.GPT_ANSWER_CACHE_TTL,
+        max_question_length=settings.GPT_ANSWER_CACHE_MAX_QUESTION_LENGTH,
+        evict_interval=settings.GPT_ANSWER_CACHE_EVICT_INTERVAL,
+    )
+
+
+def get_chat_conversation_service(
+    db: Database = Depends(get_database),
+    settings: AppSettings = Depends(get_settings),
+) -> ChatConversationService:
+    return ChatConversationService(
+        repository=ChatConversationRepository(db=db),
+        max_turns=settings.GPT_CONVERSATION_MAX_TURNS,
+        max_chars=settings.GPT_CONVERSATION_MAX_CHARS,
+        expire=settings.GPT_CONVERSATION_EXPIRE,
+    )
+
+
 def get_chatgpt_service(
     chatgpt_repository: ChatGPTRepository = Depends(get_chatgpt_repository),
     user_service: UserService = Depends(get_user_service),
+    answer_cache: ChatGptAnswerCacheService = Depends(get_chatgpt_answer_cache_service),
+    requests_in_flight: SingleFlight[tuple[str, tuple[str, ...]], ChatGptAnswerDTO] = Depends(
+        get_chatgpt_requests_in_flight
+    ),
+    conversations: ChatConversationService = Depends(get_chat_conversation_service),
 ) -> ChatGptService:
-    return ChatGptService(repository=chatgpt_repository, user_service=user_service)
+    return ChatGptService(
+        repository=chatgpt_repository,
+        user_service=user_service,
+        answer_cache=answer_cache,
+        requests_in_flight=requests_in_flight,
+        conversations=conversations,
+    )
 
 
 async def get_access_to_bot_api_or_403(
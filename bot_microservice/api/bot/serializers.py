@@ -1,5 +1,7 @@
 from pydantic import BaseModel, ConfigDict, Field
 
+from constants import ChatGptCircuitStateEnum
+
 
 class LightChatGptModel(BaseModel):
     model: str = Field(..., title="Chat Gpt model")
@@ -22,3 +24,47 @@ class GETChatGptModelsSerializer(BaseModel):
     data: list[ChatGptModelSerializer] = Field(..., title="Список всех моделей")
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class ChatGptModelStatsSerializer(BaseModel):
+    model: str = Field(..., title="Chat Gpt model")
+    priority: int = Field(..., ge=0, title="Приоритет модели")
+    score: float = Field(..., ge=0, title="Текущая оценка модели, модели опрашиваются по убыванию оценки")
+    circuit_state: ChatGptCircuitStateEnum = Field(..., title="Состояние предохранителя модели")
+    requests: int = Field(..., ge=0, title="Количество запросов к модели")
+    failures: int = Field(..., ge=0, title="Количество неудачных запросов")
+    consecutive_failures: int = Field(..., ge=0, title="Количество неудачных запросов подряд")
+    failure_rate: float = Field(..., ge=0, le=1, title="Скользящая средняя доли неудачных запросов")
+    latency: float | None = Field(..., title="Скользящая средняя времени ответа в секундах")
+    first_byte_latency: float | None = Field(..., title="Скользящая средняя времени до первого байта ответа")
+    latency_histogram: dict[str, int] = Field(..., title="Количество ответов по интервалам времени ответа")
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class GETChatGptModelsStatsSerializer(BaseModel):
+    data: list[ChatGptModelStatsSerializer] = Field(..., title="Статистика моделей в порядке опроса")
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ChatGptAnswerCacheStatsSerializer(BaseModel):
+    hits: int = Field(..., ge=0, title="Количество ответов из кэша в этом процессе")
+    misses: int = Field(..., ge=0, title="Количество вопросов без ответа в кэше в этом процессе")
+    hit_rate: float = Field(..., ge=0, le=1, title="Доля ответов из кэша в этом процессе")
+    size: int = Field(..., ge=0, title="Количество ответов в кэше")
+    total_hits: int = Field(..., ge=0, title="Количество ответов из кэша всеми процессами")
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class BotQueueStatsSerializer(BaseModel):
+    queue_size: int = Field(..., ge=0, title="Количество обновлений в очереди")
+    queue_maxsize: int = Field(..., ge=0, title="Максимальный размер очереди, 0 - без ограничений")
+    workers_count: int = Field(..., ge=0, title="Количество воркеров, 0 - каждое обновление в отдельной задаче")
+    active_workers: int = Field(..., ge=0, title="Количество обновлений в обработке")
+    rejected_updates: int = Field(..., ge=0, title="Количество отклоненных обновлений")
+    dropped_updates: int = Field(..., ge=0, title="Количество вытесненных из очереди обновлений")
+    chat_lanes: int = Field(default=0, ge=0, title="Количество активных очередей чатов")
+
+    model_config = ConfigDict(from_attributes=True)
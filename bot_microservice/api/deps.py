@@ -1,4 +1,3 @@
-from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.requests import Request
 
@@ -14,5 +13,5 @@ def get_db_session(request: Request) -> AsyncSession:
     return request.app.state.db_session_factory()
 
 
-def get_database(settings: AppSettings = Depends(get_settings)) -> Database:
-    return Database(settings=settings)
+def get_database(request: Request) -> Database:
+    return request.app.state.db
@@ -1,12 +1,10 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from fastapi.responses import ORJSONResponse
 from starlette import status
 from starlette.responses import Response
 
-from api.bot.deps import get_chatgpt_service
-from api.exceptions import BaseAPIException
-from constants import INVALID_GPT_REQUEST_MESSAGES
-from core.bot.services import ChatGptService
+from api.system.serializers import GPTHealthcheckSerializer
+from core.bot.prober import ChatGptModelProber, get_chatgpt_model_prober
 
 router = APIRouter()
 
@@ -27,23 +25,24 @@ async def healthcheck() -> ORJSONResponse:
     response_class=Response,
     summary="Проверяет доступность моделей и если они недоступны, то возвращает код ответа 500",
     responses={
-        status.HTTP_500_INTERNAL_SERVER_ERROR: {"description": "Request to chat gpt not success"},
-        status.HTTP_200_OK: {"description": "Successful Response"},
+        status.HTTP_500_INTERNAL_SERVER_ERROR: {"description": "None of the models is available"},
+        status.HTTP_200_OK: {"description": "Successful Response", "model": GPTHealthcheckSerializer},
     },
 )
 async def gpt_healthcheck(
-    response: Response,
-    chatgpt_service: ChatGptService = Depends(get_chatgpt_service),
+    detail: bool = Query(default=False, description="Вернуть результаты проверки каждой модели"),
+    prober: ChatGptModelProber = Depends(get_chatgpt_model_prober),
 ) -> Response:
-    response.status_code = status.HTTP_200_OK
-    try:
-        chatgpt_response = await chatgpt_service.request_to_chatgpt_microservice(question="Привет!")
-        if chatgpt_response.status_code != status.HTTP_200_OK:
-            response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
-        for message in INVALID_GPT_REQUEST_MESSAGES:
-            if message in chatgpt_response.text:
-                response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
-    except BaseAPIException:
-        response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
-
-    return Response(status_code=response.status_code, content=None)
+    """Результаты последней фоновой проверки моделей, запросы к chatgpt не выполняются"""
+    results = await prober.get_results()
+    # models are not checked yet after start, the service is not reported as failed until they are
+    is_available = None if results is None else any(result.is_available for result in results)
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR if is_available is False else status.HTTP_200_OK
+    if not detail:
+        return Response(status_code=status_code, content=None)
+    return ORJSONResponse(
+        content=GPTHealthcheckSerializer(is_available=is_available, models=results or []).model_dump(  # type: ignore
+            mode="json"
+        ),
+        status_code=status_code,
+    )
@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class ChatGptModelProbeSerializer(BaseModel):
+    model: str = Field(..., title="Chat Gpt model")
+    is_available: bool = Field(..., title="Модель ответила на проверочный вопрос")
+    checked_at: datetime = Field(..., title="Время проверки")
+    latency: float = Field(..., ge=0, title="Время ответа в секундах")
+    status_code: int | None = Field(default=None, title="Код ответа chatgpt микросервиса")
+    error: str | None = Field(default=None, title="Причина недоступности модели")
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class GPTHealthcheckSerializer(BaseModel):
+    is_available: bool | None = Field(
+        ..., title="Хотя бы одна модель доступна, null - модели еще не проверены после запуска"
+    )
+    models: list[ChatGptModelProbeSerializer] = Field(..., title="Результаты последней проверки моделей")
+
+    model_config = ConfigDict(from_attributes=True)
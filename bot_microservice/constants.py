@@ -1,14 +1,24 @@
 from datetime import timezone
-from enum import StrEnum, unique
+from enum import IntEnum, StrEnum, unique
 from typing import Any
 
 from dateutil import tz
 
 AUDIO_SEGMENT_DURATION = 120 * 1000
+# segments after the first one start earlier, so words on the border are not lost
+AUDIO_SEGMENT_OVERLAP = 250
+# voice messages are decoded to mono 16 bit pcm which sphinx is trained on
+AUDIO_SAMPLE_RATE = 16000
+AUDIO_SAMPLE_WIDTH = 2
+TELEGRAM_MESSAGE_MAX_LENGTH = 4096
 
 API_PREFIX = "/api"
 CHATGPT_BASE_URI = "/backend-api/v2/conversation"
 INVALID_GPT_REQUEST_MESSAGES = ("Invalid request model", "return unexpected http status code")
+# upper bounds in seconds of chatgpt answer latency histogram buckets, the last bucket is unbounded
+GPT_LATENCY_HISTOGRAM_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60)
+# stripped from both ends of the question before looking up the cached answer
+QUESTION_EDGE_PUNCTUATION = " .,!?;:…"
 
 MOSCOW_TZ = tz.gettz("Europe/Moscow")
 UTC_TZ = timezone.utc
@@ -27,6 +37,7 @@ class BotCommands(StrEnum):
     bug_report = "bug_report"
     website = "website"
     developer = "developer"
+    reset = "reset"
 
 
 class BotEntryPoints(StrEnum):
@@ -34,6 +45,56 @@ class BotEntryPoints(StrEnum):
     end = "end"
 
 
+class BotQueueOverloadPolicyEnum(StrEnum):
+    reject = "reject"
+    drop_oldest = "drop_oldest"
+
+
+class BotQueueDispatcherEnum(StrEnum):
+    queue = "queue"
+    chat_lanes = "chat_lanes"
+
+
+class SpeechRecognitionModeEnum(StrEnum):
+    thread = "thread"
+    process = "process"
+
+
+class ChatGptCircuitStateEnum(StrEnum):
+    closed = "closed"
+    open = "open"
+    half_open = "half_open"
+
+
+class TelegramSendPriorityEnum(IntEnum):
+    """Outgoing requests with lower value are sent first"""
+
+    message = 0
+    edit = 1
+
+
+class SqliteJournalModeEnum(StrEnum):
+    DELETE = "delete"
+    TRUNCATE = "truncate"
+    PERSIST = "persist"
+    MEMORY = "memory"
+    WAL = "wal"
+    OFF = "off"
+
+
+class SqliteSynchronousEnum(StrEnum):
+    OFF = "off"
+    NORMAL = "normal"
+    FULL = "full"
+    EXTRA = "extra"
+
+
+class SqliteTempStoreEnum(StrEnum):
+    DEFAULT = "default"
+    FILE = "file"
+    MEMORY = "memory"
+
+
 class LogLevelEnum(StrEnum):
     CRITICAL = "critical"
     ERROR = "error"
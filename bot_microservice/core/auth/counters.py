@@ -0,0 +1,102 @@
+import asyncio
+from contextlib import suppress
+from datetime import datetime
+from functools import cache
+
+from loguru import logger
+
+from constants import MOSCOW_TZ
+from core.auth.dto import UserQuestionCountDeltaDTO
+from core.auth.repository import UserRepository
+from infra.database.db_adapter import get_database
+from settings.config import settings
+
+
+class UserQuestionCounter:
+    """
+    Write-behind aggregator of users question counts.
+
+    Questions are accumulated in memory and written with one multi-row upsert every `flush_interval` seconds,
+    when `flush_size` users are pending or on shutdown, so sqlite write lock is taken once per batch instead of
+    once per question. Until the counter is started questions are written immediately.
+    """
+
+    def __init__(self, repository: UserRepository, flush_interval: float, flush_size: int) -> None:
+        self.repository = repository
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._pending: dict[int, UserQuestionCountDeltaDTO] = {}
+        self._flush_task: asyncio.Task[None] | None = None
+        self._size_reached = asyncio.Event()
+
+    @property
+    def is_running(self) -> bool:
+        return self._flush_task is not None and not self._flush_task.done()
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def add(self, user_id: int) -> None:
+        if not self.is_running:
+            await self.repository.update_user_message_count(user_id)
+            return
+        now = datetime.now(tz=MOSCOW_TZ)
+        if delta := self._pending.get(user_id):
+            delta.question_count += 1
+            delta.last_question_at = now
+        else:
+            self._pending[user_id] = UserQuestionCountDeltaDTO(question_count=1, last_question_at=now)
+        if len(self._pending) >= self.flush_size:
+            self._size_reached.set()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        # swap before await, questions added during the write go to the next batch
+        deltas, self._pending = self._pending, {}
+        try:
+            await self.repository.update_users_message_count(deltas)
+        except asyncio.CancelledError:
+            # stopped in the middle of the write, the batch is flushed again on stop
+            self._restore(deltas)
+            raise
+        except Exception as error:
+            logger.error("users question counts are not saved", error=error, users_count=len(deltas))
+            self._restore(deltas)
+
+    def start(self) -> None:
+        if self.is_running:
+            return
+        self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self) -> None:
+        if self._flush_task:
+            self._flush_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._flush_task
+            self._flush_task = None
+        await self.flush()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._size_reached.wait(), timeout=self.flush_interval)
+            self._size_reached.clear()
+            await self.flush()
+
+    def _restore(self, deltas: dict[int, UserQuestionCountDeltaDTO]) -> None:
+        for user_id, delta in deltas.items():
+            if pending := self._pending.get(user_id):
+                pending.question_count += delta.question_count
+            else:
+                self._pending[user_id] = delta
+
+
+@cache
+def get_user_question_counter() -> UserQuestionCounter:
+    return UserQuestionCounter(
+        repository=UserRepository(db=get_database()),
+        flush_interval=settings.USER_QUESTION_COUNT_FLUSH_INTERVAL,
+        flush_size=settings.USER_QUESTION_COUNT_FLUSH_SIZE,
+    )
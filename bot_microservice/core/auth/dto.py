@@ -1,7 +1,22 @@
 from dataclasses import dataclass
+from datetime import datetime
 
 
 @dataclass
 class UserIsBannedDTO:
     is_banned: bool = False
     ban_reason: str | None = None
+
+
+@dataclass
+class UserStateDTO:
+    id: int
+    exists: bool
+    is_banned: bool = False
+    ban_reason: str | None = None
+
+
+@dataclass
+class UserQuestionCountDeltaDTO:
+    question_count: int
+    last_question_at: datetime
@@ -1,21 +1,32 @@
 from dataclasses import dataclass
 from datetime import datetime
+from typing import Mapping
 
 from sqlalchemy import select
 from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import load_only
 
 from constants import MOSCOW_TZ
-from core.auth.dto import UserIsBannedDTO
+from core.auth.dto import UserIsBannedDTO, UserQuestionCountDeltaDTO, UserStateDTO
 from core.auth.models.users import AccessToken, User, UserQuestionCount
+from infra.cache import TTLCache, VersionFile
 from infra.database.db_adapter import Database
+from settings.config import settings
+
+# state of telegram users checked on each bot command. Missing users are cached as well,
+# changes through admin invalidate the state in all processes
+user_states_cache: TTLCache[int, UserStateDTO] = TTLCache(
+    ttl=settings.USER_STATE_CACHE_TTL,
+    maxsize=settings.USER_STATE_CACHE_MAXSIZE,
+    version_file=VersionFile("user_states"),
+)
 
 
 @dataclass
 class UserRepository:
     db: Database
 
-    async def create_user(
+    async def get_or_create_user(
         self,
         id: int,
         email: str | None,
@@ -27,7 +38,12 @@ class UserRepository:
         is_active: bool,
         is_superuser: bool,
     ) -> User:
-        user = User.build(
+        """
+        Create the user in one statement, the existing user is returned as is.
+
+        Concurrent calls for the same user don't fail on primary key: only one of them inserts the row.
+        """
+        new_user = User.build(
             id=id,
             email=email,
             username=username,
@@ -38,12 +54,35 @@ class UserRepository:
             is_active=is_active,
             is_superuser=is_superuser,
         )
+        query = (
+            insert(User)
+            .values(
+                id=new_user.id,
+                email=new_user.email,
+                username=new_user.username,
+                first_name=new_user.first_name,
+                last_name=new_user.last_name,
+                ban_reason=new_user.ban_reason,
+                hashed_password=new_user.hashed_password,
+                is_active=new_user.is_active,
+                is_superuser=new_user.is_superuser,
+            )
+            .on_conflict_do_nothing(index_elements=[User.id])
+            .returning(User)
+        )
 
         async with self.db.session() as session:
-            session.add(user)
+            result = await session.execute(query)
+            user = result.scalar()
             await session.commit()
-            await session.refresh(user)
-            return user
+            if not user:
+                # row already exists, RETURNING is empty for skipped inserts
+                result = await session.execute(select(User).filter_by(id=id))
+                user = result.scalar_one()
+            user_state = self._build_user_state(user)
+
+        user_states_cache.set(id, user_state)
+        return user
 
     async def get_user_by_id(self, user_id: int) -> User | None:
         query = select(User).filter_by(id=user_id)
@@ -52,31 +91,52 @@ class UserRepository:
             result = await session.execute(query)
             return result.scalar()
 
-    async def check_user_is_banned(self, user_id: int) -> UserIsBannedDTO:
-        query = select(User).options(load_only(User.is_active, User.ban_reason)).filter_by(id=user_id)
+    async def get_user_state(self, user_id: int) -> UserStateDTO:
+        if user_state := user_states_cache.get(user_id):
+            return user_state
 
+        query = select(User).options(load_only(User.id, User.is_active, User.ban_reason)).filter_by(id=user_id)
         async with self.db.session() as session:
             result = await session.execute(query)
-            if user := result.scalar():
-                return UserIsBannedDTO(is_banned=not bool(user.is_active), ban_reason=user.ban_reason)
-            return UserIsBannedDTO()
+            user = result.scalar()
+            user_state = self._build_user_state(user) if user else UserStateDTO(id=user_id, exists=False)
+
+        user_states_cache.set(user_id, user_state)
+        return user_state
+
+    async def check_user_is_banned(self, user_id: int) -> UserIsBannedDTO:
+        user_state = await self.get_user_state(user_id)
+        return UserIsBannedDTO(is_banned=user_state.is_banned, ban_reason=user_state.ban_reason)
 
     async def update_user_message_count(self, user_id: int) -> None:
-        query = (
-            insert(UserQuestionCount)
-            .values({UserQuestionCount.user_id: user_id, UserQuestionCount.question_count: 1})
-            .on_conflict_do_update(
-                index_elements=[UserQuestionCount.user_id],
-                set_={
-                    UserQuestionCount.get_real_column_name(
-                        UserQuestionCount.question_count.key
-                    ): UserQuestionCount.question_count
-                    + 1,
-                    UserQuestionCount.get_real_column_name(UserQuestionCount.last_question_at.key): datetime.now(
-                        tz=MOSCOW_TZ
-                    ),
-                },
-            )
+        await self.update_users_message_count(
+            {user_id: UserQuestionCountDeltaDTO(question_count=1, last_question_at=datetime.now(tz=MOSCOW_TZ))}
+        )
+
+    async def update_users_message_count(self, deltas: Mapping[int, UserQuestionCountDeltaDTO]) -> None:
+        """Add question counts of many users in one statement"""
+        if not deltas:
+            return
+        query = insert(UserQuestionCount).values(
+            [
+                {
+                    UserQuestionCount.user_id: user_id,
+                    UserQuestionCount.question_count: delta.question_count,
+                    UserQuestionCount.last_question_at: delta.last_question_at,
+                }
+                for user_id, delta in deltas.items()
+            ]
+        )
+        query = query.on_conflict_do_update(
+            index_elements=[UserQuestionCount.user_id],
+            set_={
+                UserQuestionCount.get_real_column_name(UserQuestionCount.question_count.key): (
+                    UserQuestionCount.question_count + query.excluded.question_count
+                ),
+                UserQuestionCount.get_real_column_name(
+                    UserQuestionCount.last_question_at.key
+                ): query.excluded.last_question_at,
+            },
         )
 
         async with self.db.session() as session:
@@ -88,3 +148,7 @@ class UserRepository:
         async with self.db.session() as session:
             result = await session.execute(query)
             return result.scalar()
+
+    @staticmethod
+    def _build_user_state(user: User) -> UserStateDTO:
+        return UserStateDTO(id=user.id, exists=True, is_banned=not bool(user.is_active), ban_reason=user.ban_reason)
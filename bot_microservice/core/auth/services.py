@@ -8,23 +8,24 @@ from telegram import Update
 from telegram.ext import ContextTypes
 
 from constants import BotCommands
-from core.auth.dto import UserIsBannedDTO
+from core.auth.counters import UserQuestionCounter, get_user_question_counter
+from core.auth.dto import UserIsBannedDTO, UserStateDTO
 from core.auth.models.users import User
 from core.auth.repository import UserRepository
 from core.auth.utils import create_password_hash
-from infra.database.db_adapter import Database
-from settings.config import settings
+from infra.database.db_adapter import get_database
 
 
 @dataclass
 class UserService:
     repository: UserRepository
+    question_counter: UserQuestionCounter
 
     @classmethod
     def build(cls) -> "UserService":
-        db = Database(settings=settings)
+        db = get_database()
         repository = UserRepository(db=db)
-        return UserService(repository=repository)
+        return UserService(repository=repository, question_counter=get_user_question_counter())
 
     async def get_user_by_id(self, user_id: int) -> User | None:
         return await self.repository.get_user_by_id(user_id)
@@ -41,23 +42,42 @@ class UserService:
         is_active: bool = True,
         is_superuser: bool = False,
     ) -> User:
-        hashed_password = hashed_password or create_password_hash(uuid.uuid4().hex)
-        if not (user := await self.repository.get_user_by_id(user_id=user_id)):
-            user = await self.repository.create_user(
-                id=user_id,
-                email=email,
-                username=username,
-                first_name=first_name,
-                last_name=last_name,
-                ban_reason=ban_reason,
-                hashed_password=hashed_password,
-                is_active=is_active,
-                is_superuser=is_superuser,
-            )
-        return user
+        return await self.repository.get_or_create_user(
+            id=user_id,
+            email=email,
+            username=username,
+            first_name=first_name,
+            last_name=last_name,
+            ban_reason=ban_reason,
+            hashed_password=hashed_password or create_password_hash(uuid.uuid4().hex),
+            is_active=is_active,
+            is_superuser=is_superuser,
+        )
+
+    async def get_or_create_user_state(
+        self,
+        user_id: int,
+        email: str | None = None,
+        username: str | None = None,
+        first_name: str | None = None,
+        last_name: str | None = None,
+    ) -> UserStateDTO:
+        """
+        State of the user, the user is created if it does not exist.
+
+        State is usually cached by the ban check of the same update, so the existing user costs no queries.
+        """
+        user_state = await self.repository.get_user_state(user_id)
+        if user_state.exists:
+            return user_state
+        # the password is hashed only when the user is missing, i.e. the row is going to be created
+        await self.get_or_create_user_by_id(
+            user_id=user_id, email=email, username=username, first_name=first_name, last_name=last_name
+        )
+        return await self.repository.get_user_state(user_id)
 
     async def update_user_message_count(self, user_id: int) -> None:
-        await self.repository.update_user_message_count(user_id)
+        await self.question_counter.add(user_id)
 
     async def check_user_is_banned(self, user_id: int) -> UserIsBannedDTO:
         return await self.repository.check_user_is_banned(user_id)
@@ -1,17 +1,18 @@
 import asyncio
 import os
 from asyncio import Queue, sleep
-from contextlib import asynccontextmanager
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from functools import cached_property
 from http import HTTPStatus
-from typing import Any, AsyncGenerator
+from typing import Any, Coroutine
 
 from fastapi import Response
 from loguru import logger
 from telegram import Bot, Update
 from telegram.ext import Application
 
+from constants import BotQueueOverloadPolicyEnum
+from core.bot.scheduler import TelegramSendScheduler
 from settings.config import AppSettings
 
 
@@ -22,7 +23,10 @@ class BotApplication:
         handlers: list[Any] | None = None,
     ) -> None:
         self.application: Application = (  # type: ignore[type-arg]
-            Application.builder().token(token=settings.TELEGRAM_API_TOKEN).build()
+            Application.builder()
+            .token(token=settings.TELEGRAM_API_TOKEN)
+            .rate_limiter(TelegramSendScheduler.build(settings))
+            .build()
         )
         self.handlers = handlers or []
         self.settings = settings
@@ -68,29 +72,169 @@ class BotApplication:
             self.application.add_handler(handler)
 
 
+@dataclass
+class BotQueueStats:
+    queue_size: int
+    queue_maxsize: int
+    workers_count: int
+    active_workers: int
+    rejected_updates: int
+    dropped_updates: int
+    chat_lanes: int = 0
+
+
 @dataclass
 class BotQueue:
     bot_app: BotApplication
-    queue: Queue = asyncio.Queue()  # type: ignore[type-arg]
+    workers_count: int = 0
+    maxsize: int = 0
+    overload_policy: BotQueueOverloadPolicyEnum = BotQueueOverloadPolicyEnum.reject
+    queue: Queue = field(init=False)  # type: ignore[type-arg]
+
+    def __post_init__(self) -> None:
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._active_workers = 0
+        self._rejected_updates = 0
+        self._dropped_updates = 0
+
+    @property
+    def stats(self) -> BotQueueStats:
+        return BotQueueStats(
+            queue_size=self.queue.qsize(),
+            queue_maxsize=self.maxsize,
+            workers_count=self.workers_count,
+            active_workers=self._active_workers,
+            rejected_updates=self._rejected_updates,
+            dropped_updates=self._dropped_updates,
+        )
 
     async def put_updates_on_queue(self, tg_update: Update) -> Response:
         """
         Listen /{URL_PREFIX}/{API_PREFIX}/{TELEGRAM_WEB_TOKEN} path and proxy post request to bot
         """
+        if self._is_full():
+            if self.overload_policy == BotQueueOverloadPolicyEnum.reject:
+                self._rejected_updates += 1
+                logger.warning("bot queue is full, update rejected", queue_size=self.stats.queue_size)
+                return Response(status_code=HTTPStatus.SERVICE_UNAVAILABLE, headers={"Retry-After": "1"})
+            self._drop_oldest_update()
+            self._dropped_updates += 1
+            logger.warning("bot queue is full, the oldest update dropped", queue_size=self.stats.queue_size)
         self.queue.put_nowait(tg_update)
         return Response(status_code=HTTPStatus.ACCEPTED)
 
     async def get_updates_from_queue(self, wait_on_each_update: int = 0) -> None:
+        if self.workers_count:
+            await asyncio.gather(*(self._worker() for _ in range(self.workers_count)))
+            return
         while True:
             update = await self.queue.get()
-            asyncio.create_task(self.bot_app.application.process_update(update))
+            self._create_task(self._process_update(update))
             await sleep(wait_on_each_update)
 
+    def _is_full(self) -> bool:
+        return self.queue.full()
+
+    def _drop_oldest_update(self) -> None:
+        self.queue.get_nowait()
+
+    async def _worker(self) -> None:
+        while True:
+            update = await self.queue.get()
+            await self._process_update(update)
+
+    async def _process_update(self, update: Update) -> None:
+        self._active_workers += 1
+        try:
+            await self.bot_app.application.process_update(update)
+        except Exception as error:
+            logger.error("error processing bot update", error=error)
+        finally:
+            self._active_workers -= 1
+
+    def _create_task(self, coro: Coroutine[Any, Any, None]) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+@dataclass
+class ChatLanesBotQueue(BotQueue):
+    """
+    Updates of one chat are processed one by one in order of arrival,
+    updates of different chats are processed in parallel.
 
-@asynccontextmanager
-async def get_bot(token: str) -> AsyncGenerator[Bot, None]:
-    app = Application.builder().token(token=token).build()
-    try:
-        yield app.bot
-    finally:
-        await app.shutdown()
+    Each chat gets its own lane which is removed after `lane_idle_timeout` seconds without updates.
+    `workers_count` limits quantity of lanes processing updates at the same time, 0 - no limit.
+    `maxsize` limits quantity of updates waiting in all lanes together. When it is reached with drop_oldest policy,
+    the oldest update of the longest lane is dropped, so a flooding chat loses its own updates first.
+    """
+
+    lane_idle_timeout: float = 60
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        self._lanes: dict[int, Queue[Update]] = {}
+        self._lanes_semaphore = asyncio.Semaphore(self.workers_count) if self.workers_count else None
+
+    @property
+    def stats(self) -> BotQueueStats:
+        stats = super().stats
+        stats.queue_size = self._pending_updates_count()
+        stats.chat_lanes = len(self._lanes)
+        return stats
+
+    async def get_updates_from_queue(self, wait_on_each_update: int = 0) -> None:
+        while True:
+            update = await self.queue.get()
+            chat_id = self._get_chat_id(update)
+            if chat_id is None:
+                # updates without chat (inline queries, polls, etc.) have nothing to be ordered with
+                self._create_task(self._process_lane_update(update))
+            elif lane := self._lanes.get(chat_id):
+                lane.put_nowait(update)
+            else:
+                lane = asyncio.Queue()
+                lane.put_nowait(update)
+                self._lanes[chat_id] = lane
+                self._create_task(self._process_lane(chat_id, lane))
+            await sleep(wait_on_each_update)
+
+    def _pending_updates_count(self) -> int:
+        return self.queue.qsize() + sum(lane.qsize() for lane in self._lanes.values())
+
+    def _is_full(self) -> bool:
+        return bool(self.maxsize) and self._pending_updates_count() >= self.maxsize
+
+    def _drop_oldest_update(self) -> None:
+        longest_lane = max(self._lanes.values(), key=lambda lane: lane.qsize(), default=None)
+        if longest_lane and not longest_lane.empty():
+            longest_lane.get_nowait()
+        else:
+            self.queue.get_nowait()
+
+    async def _process_lane(self, chat_id: int, lane: Queue[Update]) -> None:
+        while True:
+            try:
+                update = await asyncio.wait_for(lane.get(), timeout=self.lane_idle_timeout)
+            except TimeoutError:
+                # there is no await between the check and the removal, so a new update can't be lost
+                if lane.empty():
+                    self._lanes.pop(chat_id, None)
+                    return
+                continue
+            await self._process_lane_update(update)
+
+    async def _process_lane_update(self, update: Update) -> None:
+        if not self._lanes_semaphore:
+            await self._process_update(update)
+            return
+        async with self._lanes_semaphore:
+            await self._process_update(update)
+
+    @staticmethod
+    def _get_chat_id(update: Update) -> int | None:
+        if isinstance(update, Update) and update.effective_chat:
+            return update.effective_chat.id
+        return None
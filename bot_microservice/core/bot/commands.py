@@ -1,16 +1,28 @@
 import asyncio
-import tempfile
+from typing import Any, AsyncIterator, Callable, Coroutine
 from urllib.parse import urljoin
 
 from loguru import logger
+from speech_recognition import UnknownValueError as SpeechRecognizerError
 from telegram import InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
 
 from constants import BotCommands, BotEntryPoints
 from core.auth.services import check_user_is_banned
-from core.bot.app import get_bot
 from core.bot.keyboards import main_keyboard
-from core.bot.services import ChatGptService, SpeechToTextService
+from core.bot.messages import (
+    StreamedAnswerMessage,
+    VoiceAnswerMessages,
+    reply_text_parts,
+)
+from core.bot.rate_limiter import check_rate_limit
+from core.bot.services import (
+    AudioDecodeError,
+    ChatGptService,
+    SpeechToTextService,
+    VoiceTranscriptionService,
+    get_user_speech_semaphore,
+)
 from settings.config import settings
 
 
@@ -72,8 +84,9 @@ async def bug_report(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
 
     if not update.effective_message or not settings.ADMIN_CHAT_ID:
         return
-    async with get_bot(settings.TELEGRAM_API_TOKEN) as bot:
-        await bot.send_message(chat_id=settings.ADMIN_CHAT_ID, text=f"Bug report from user: {update.effective_user}")
+    await context.bot.send_message(
+        chat_id=settings.ADMIN_CHAT_ID, text=f"Bug report from user: {update.effective_user}"
+    )
     await update.effective_message.reply_text(
         f"Спасибо за баг репорт.\n"
         f"Можете попробовать воспользоваться веб версией /{BotCommands.website}, выбрав различные GPT модели",
@@ -81,6 +94,17 @@ async def bug_report(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     )
 
 
+@check_user_is_banned
+async def reset_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Forget previous questions and answers of the chat when the command /reset is issued."""
+
+    if not update.effective_message or not update.effective_chat:
+        return
+    chatgpt_service = ChatGptService.build()
+    await chatgpt_service.reset_conversation(update.effective_chat.id)
+    await update.effective_message.reply_text("Контекст диалога очищен, следующий вопрос начнет новый диалог")
+
+
 async def github(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a message when the command /help is issued."""
 
@@ -92,6 +116,7 @@ async def github(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     )
 
 
+@check_rate_limit
 @check_user_is_banned
 async def ask_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.message:
@@ -105,38 +130,95 @@ async def ask_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
     chatgpt_service = ChatGptService.build()
     logger.warning("question asked", user=update.message.from_user, question=update.message.text)
+    get_or_create_user = chatgpt_service.get_or_create_bot_user(
+        user_id=update.effective_user.id,  # type: ignore[union-attr]
+        username=update.effective_user.username,  # type: ignore[union-attr]
+        first_name=update.effective_user.first_name,  # type: ignore[union-attr]
+        last_name=update.effective_user.last_name,  # type: ignore[union-attr]
+    )
+    if settings.GPT_STREAM_ANSWERS:
+        answer_message = StreamedAnswerMessage(
+            reply_to=update.message,
+            edit_interval=settings.GPT_STREAM_EDIT_INTERVAL,
+            edit_min_chars=settings.GPT_STREAM_EDIT_MIN_CHARS,
+        )
+        _, user = await asyncio.gather(
+            answer_message.send(
+                chatgpt_service.request_to_chatgpt_stream(question=update.message.text, chat_id=update.message.chat_id)
+            ),
+            get_or_create_user,
+        )
+        await chatgpt_service.update_bot_user_message_count(user.id)
+        return
+
     answer, user = await asyncio.gather(
-        chatgpt_service.request_to_chatgpt(question=update.message.text),
-        chatgpt_service.get_or_create_bot_user(
-            user_id=update.effective_user.id,  # type: ignore[union-attr]
-            username=update.effective_user.username,  # type: ignore[union-attr]
-            first_name=update.effective_user.first_name,  # type: ignore[union-attr]
-            last_name=update.effective_user.last_name,  # type: ignore[union-attr]
-        ),
+        chatgpt_service.request_to_chatgpt(question=update.message.text, chat_id=update.message.chat_id),
+        get_or_create_user,
+    )
+    await asyncio.gather(
+        reply_text_parts(update.message, answer), chatgpt_service.update_bot_user_message_count(user.id)
     )
-    await asyncio.gather(update.message.reply_text(answer), chatgpt_service.update_bot_user_message_count(user.id))
 
 
+@check_rate_limit
 async def voice_recognize(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.message:
         return
-    if not update.message.voice:
+    if not (voice := update.message.voice or update.message.audio):
         await update.message.reply_text("Голосовое сообщение не найдено")
         return
+
+    voice_messages = VoiceAnswerMessages(reply_to=update.message, ask=await _get_voice_question_asker(update))
+    transcription_service = VoiceTranscriptionService.build()
+    if text_parts := await transcription_service.get_text_parts(voice.file_unique_id):
+        await voice_messages.send(_iterate(text_parts))
+        return
+
     await update.message.reply_text("Пожалуйста, ожидайте :)\nТрехминутная запись обрабатывается примерно 30 секунд")
-    sound_file = await update.message.voice.get_file()
-    sound_bytes = await sound_file.download_as_bytearray()
-    with tempfile.NamedTemporaryFile(delete=False) as tmpfile:
-        tmpfile.write(sound_bytes)
-    logger.info("file has been saved", filename=tmpfile.name)
-
-    speech_to_text_service = SpeechToTextService(filename=tmpfile.name)
-    speech_to_text_service.get_text_from_audio()
-
-    part = 0
-    while speech_to_text_service.text_parts or not speech_to_text_service.text_recognised:
-        if text := speech_to_text_service.text_parts.get(part):
-            speech_to_text_service.text_parts.pop(part)
-            await update.message.reply_text(text)
-            part += 1
-        await asyncio.sleep(5)
+    user_id = update.effective_user.id if update.effective_user else update.message.chat_id
+    async with get_user_speech_semaphore(user_id):
+        sound_file = await voice.get_file()
+        sound_bytes = await sound_file.download_as_bytearray()
+
+        speech_to_text_service = SpeechToTextService(audio=sound_bytes)
+        try:
+            text_parts = await voice_messages.send(speech_to_text_service.get_text_from_audio())
+        except (SpeechRecognizerError, AudioDecodeError) as error:
+            # recognized parts are already sent, but incomplete transcription is not cached
+            logger.error("voice message is not recognized", error=error, sent_parts=len(voice_messages.sent_parts))
+            text_parts, is_complete = voice_messages.sent_parts, False
+        else:
+            is_complete = True
+        if not text_parts:
+            await update.message.reply_text("Не удалось распознать голосовое сообщение :(")
+            return
+        if is_complete:
+            await transcription_service.save_text_parts(voice.file_unique_id, text_parts)
+
+
+async def _get_voice_question_asker(update: Update) -> Callable[[str], Coroutine[Any, Any, str]] | None:
+    """Function asking recognized voice as a question if voice answers are enabled and the user is not banned"""
+    if not settings.STT_ANSWER_WITH_GPT or not update.effective_user:
+        return None
+    chatgpt_service = ChatGptService.build()
+    user = await chatgpt_service.get_or_create_bot_user(
+        user_id=update.effective_user.id,
+        username=update.effective_user.username,
+        first_name=update.effective_user.first_name,
+        last_name=update.effective_user.last_name,
+    )
+    if user.is_banned:
+        return None
+
+    async def ask(question: str) -> str:
+        logger.warning("voice question asked", user=update.effective_user, question=question)
+        answer = await chatgpt_service.request_to_chatgpt(question=question)
+        await chatgpt_service.update_bot_user_message_count(user.id)
+        return answer
+
+    return ask
+
+
+async def _iterate(text_parts: list[str]) -> AsyncIterator[str]:
+    for text in text_parts:
+        yield text
@@ -0,0 +1,73 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import NamedTuple
+
+from constants import ChatGptCircuitStateEnum
+
+
+@dataclass
+class ChatGptModelDTO:
+    model: str
+    priority: int
+
+
+@dataclass
+class ChatGptModelStatsDTO:
+    model: str
+    priority: int
+    score: float
+    circuit_state: ChatGptCircuitStateEnum
+    requests: int
+    failures: int
+    consecutive_failures: int
+    failure_rate: float
+    latency: float | None
+    first_byte_latency: float | None
+    latency_histogram: dict[str, int]
+
+
+@dataclass
+class ChatGptModelProbeDTO:
+    model: str
+    is_available: bool
+    checked_at: datetime
+    latency: float
+    status_code: int | None = None
+    error: str | None = None
+
+
+@dataclass
+class ChatGptAnswerDTO:
+    """
+    Answer collected from chunks.
+
+    `chatgpt_model` is set if the model has started answering successfully,
+    `is_complete` - only if the answer has been received to the end.
+    """
+
+    text: str = ""
+    chatgpt_model: str | None = None
+    is_complete: bool = False
+
+
+@dataclass
+class ChatGptAnswerCacheStatsDTO:
+    hits: int
+    misses: int
+    hit_rate: float
+    size: int
+    total_hits: int
+
+
+class ConversationTurn(NamedTuple):
+    question: str
+    answer: str
+
+
+@dataclass
+class RateLimitDTO:
+    is_allowed: bool
+    # seconds until the next question can be asked
+    retry_after: float = 0
+    # limit of all users is reached, not of the user
+    is_global: bool = False
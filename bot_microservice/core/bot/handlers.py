@@ -17,6 +17,7 @@ from core.bot.commands import (
     bug_report,
     github,
     help_command,
+    reset_conversation,
     start_command,
     voice_recognize,
     website,
@@ -37,6 +38,7 @@ bot_event_handlers.add_handler(CommandHandler(BotCommands.help, help_command))
 bot_event_handlers.add_handler(CommandHandler(BotCommands.website, website))
 bot_event_handlers.add_handler(CommandHandler(BotCommands.bug_report, bug_report))
 bot_event_handlers.add_handler(CommandHandler(BotCommands.developer, about_me))
+bot_event_handlers.add_handler(CommandHandler(BotCommands.reset, reset_conversation))
 
 bot_event_handlers.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, ask_question))
 bot_event_handlers.add_handler(MessageHandler(filters.VOICE | filters.AUDIO, voice_recognize))
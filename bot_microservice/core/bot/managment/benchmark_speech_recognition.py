@@ -0,0 +1,63 @@
+"""
+Compare wall-clock time of voice message recognition in thread and process modes.
+
+Usage: python core/bot/managment/benchmark_speech_recognition.py [sample.wav]
+
+Clips of 1, 5 and 15 minutes are made by repeating the sample (white noise if it is not passed).
+The sample must be mono 16 bit 16 kHz wav. Requires pocketsphinx to be installed.
+"""
+
+import asyncio
+import os
+import sys
+import time
+import wave
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from loguru import logger
+
+CLIP_MINUTES = (1, 5, 15)
+
+
+async def recognize(pcm: bytes, recognition_executor: Executor) -> float:
+    speech_to_text_service = SpeechToTextService(audio=pcm, recognition_executor=recognition_executor)
+    # audio is already pcm, it is passed through instead of decoding
+    speech_to_text_service.decode_command = ("cat",)
+    started_at = time.monotonic()
+    async for _ in speech_to_text_service.get_text_from_audio():
+        pass
+    return time.monotonic() - started_at
+
+
+async def main(sample: bytes) -> None:
+    thread_pool = ThreadPoolExecutor(max_workers=1)
+    process_pool = ProcessPoolExecutor(max_workers=settings.STT_MAX_PROCESSES)
+    for minutes in CLIP_MINUTES:
+        size = minutes * 60 * AUDIO_SAMPLE_RATE * AUDIO_SAMPLE_WIDTH
+        pcm = (sample * (size // len(sample) + 1))[:size]
+        thread_time = await recognize(pcm, thread_pool)
+        process_time = await recognize(pcm, process_pool)
+        logger.info(
+            "speech recognition benchmark",
+            clip_minutes=minutes,
+            thread_seconds=round(thread_time, 2),
+            process_seconds=round(process_time, 2),
+            processes=settings.STT_MAX_PROCESSES,
+        )
+    thread_pool.shutdown()
+    process_pool.shutdown()
+
+
+if __name__ == "__main__":
+    sys.path.append(str(Path(__file__).parent.parent.parent.parent))
+    from constants import AUDIO_SAMPLE_RATE, AUDIO_SAMPLE_WIDTH
+    from core.bot.services import SpeechToTextService
+    from settings.config import settings
+
+    if len(sys.argv) > 1:
+        with wave.open(sys.argv[1]) as wav:
+            sample = wav.readframes(wav.getnframes())
+    else:
+        sample = os.urandom(10 * AUDIO_SAMPLE_RATE * AUDIO_SAMPLE_WIDTH)
+    asyncio.run(main(sample))
@@ -0,0 +1,170 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Coroutine
+
+from loguru import logger
+from telegram import Message
+from telegram.error import BadRequest, RetryAfter
+
+from constants import TELEGRAM_MESSAGE_MAX_LENGTH
+
+
+def split_text(text: str, max_length: int = TELEGRAM_MESSAGE_MAX_LENGTH) -> list[str]:
+    """Split text into parts fitting telegram message, preferably on line breaks"""
+    parts = []
+    while len(text) > max_length:
+        if (end := text.rfind("\n", 0, max_length + 1)) <= 0:
+            end = max_length
+        parts.append(text[:end])
+        text = text[end:].lstrip("\n")
+    parts.append(text)
+    return parts
+
+
+async def reply_text_parts(reply_to: Message, text: str) -> None:
+    """Send long text in several messages"""
+    for part in split_text(text):
+        await reply_to.reply_text(part)
+
+
+@dataclass
+class StreamedAnswerMessage:
+    """
+    Send an answer which is generated by chunks.
+
+    The first chunk is sent as a reply as soon as it arrives, the next chunks are coalesced into edits of that reply.
+    The reply is edited not more often than once in `edit_interval` seconds and only if at least `edit_min_chars`
+    new characters have arrived, so telegram edit limits are respected. The last edit is always sent.
+    Answers longer than telegram message limit are continued in new messages.
+    """
+
+    reply_to: Message
+    edit_interval: float
+    edit_min_chars: int
+    # times the edit which can't be skipped is repeated after telegram asks to retry later
+    edit_max_retries: int = 3
+
+    def __post_init__(self) -> None:
+        self._text = ""
+        # position in text where the current message starts
+        self._offset = 0
+        self._message: Message | None = None
+        self._message_text = ""
+        self._last_edit_at = 0.0
+
+    async def send(self, chunks: AsyncIterator[str]) -> str:
+        async for chunk in chunks:
+            self._text += chunk
+            await self._send_overflow()
+            if not self._message:
+                await self._send_new_message()
+            elif self._can_edit():
+                await self._edit_message()
+        if self._message:
+            await self._edit_message(wait_on_retry=True)
+        else:
+            await self._send_new_message()
+        return self._text
+
+    @property
+    def _current_text(self) -> str:
+        return self._text[self._offset : self._offset + TELEGRAM_MESSAGE_MAX_LENGTH]
+
+    def _can_edit(self) -> bool:
+        loop = asyncio.get_running_loop()
+        return (
+            loop.time() - self._last_edit_at >= self.edit_interval
+            and len(self._current_text) - len(self._message_text) >= self.edit_min_chars
+        )
+
+    async def _send_overflow(self) -> None:
+        """Complete messages which are filled up to telegram limit"""
+        while len(self._text) - self._offset > TELEGRAM_MESSAGE_MAX_LENGTH:
+            if self._message:
+                await self._edit_message(wait_on_retry=True)
+            else:
+                await self._send_new_message()
+            self._offset += TELEGRAM_MESSAGE_MAX_LENGTH
+            self._message, self._message_text = None, ""
+
+    async def _send_new_message(self) -> None:
+        text = self._current_text
+        if not text.strip():
+            return
+        self._message = await self.reply_to.reply_text(text)
+        self._message_text = text
+        self._last_edit_at = asyncio.get_running_loop().time()
+
+    async def _edit_message(self, wait_on_retry: bool = False) -> None:
+        text = self._current_text
+        if not self._message or text == self._message_text:
+            return
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.edit_max_retries + 1):
+            try:
+                await self._message.edit_text(text)
+            except RetryAfter as error:  # noqa: PERF203
+                logger.warning("streamed answer edit is rate limited", retry_after=error.retry_after, attempt=attempt)
+                if not wait_on_retry:
+                    # intermediate edit can be skipped, the next one will contain its text
+                    self._last_edit_at = loop.time() + error.retry_after
+                    return
+                await asyncio.sleep(error.retry_after)
+            except BadRequest as error:
+                logger.warning("streamed answer edit failed", error=error)
+                return
+            else:
+                self._message_text = text
+                self._last_edit_at = loop.time()
+                return
+        logger.error("streamed answer edit is not sent", retries=self.edit_max_retries)
+
+
+@dataclass
+class VoiceAnswerMessages:
+    """
+    Send text parts of a voice message as soon as they are recognized.
+
+    If `ask` is set, each part is asked as a question right away, while the next parts are still being recognized.
+    Answers are sent in order of the parts, each one as soon as it and the previous ones are ready.
+    """
+
+    reply_to: Message
+    ask: Callable[[str], Coroutine[Any, Any, str]] | None = None
+
+    def __post_init__(self) -> None:
+        # parts sent before recognition of the next part has failed are available here
+        self.sent_parts: list[str] = []
+
+    async def send(self, text_parts: AsyncIterator[str]) -> list[str]:
+        answers: asyncio.Queue[asyncio.Task[str] | None] = asyncio.Queue()
+        asked: list[asyncio.Task[str]] = []
+        sender = asyncio.create_task(self._send_answers(answers))
+        try:
+            async for text in text_parts:
+                await self.reply_to.reply_text(text)
+                self.sent_parts.append(text)
+                if self.ask:
+                    asked.append(task := asyncio.create_task(self.ask(text)))
+                    answers.put_nowait(task)
+        finally:
+            # answers of recognized parts are sent even if recognition of the next part has failed
+            answers.put_nowait(None)
+            try:
+                await sender
+            finally:
+                # sending could fail or be cancelled, questions which are not answered yet are not left running
+                for task in asked:
+                    task.cancel()
+                await asyncio.gather(*asked, return_exceptions=True)
+        return self.sent_parts
+
+    async def _send_answers(self, answers: "asyncio.Queue[asyncio.Task[str] | None]") -> None:
+        while (answer := await answers.get()) is not None:
+            try:
+                text = await answer
+            except Exception as error:
+                # failed answer doesn't stop answers to the next parts
+                logger.error("voice question is not answered", error=error)
+                text = "Вообще всё сломалось :("
+            await reply_text_parts(self.reply_to, text)
@@ -1,9 +1,11 @@
-from sqlalchemy import INTEGER, SMALLINT, VARCHAR
+from datetime import datetime
+
+from sqlalchemy import INTEGER, SMALLINT, TEXT, TIMESTAMP, VARCHAR
 from sqlalchemy.orm import Mapped, mapped_column
 
 from infra.database.base import Base
 
-__slots__ = ("ChatGptModels",)
+__slots__ = ("ChatGptModels", "ChatGptAnswer")
 
 
 class ChatGptModels(Base):
@@ -12,3 +14,16 @@ class ChatGptModels(Base):
     id: Mapped[int] = mapped_column("id", INTEGER(), primary_key=True, autoincrement=True)
     model: Mapped[str] = mapped_column("model", VARCHAR(length=256), nullable=False, unique=True)
     priority: Mapped[int] = mapped_column("priority", SMALLINT(), default=0)
+
+
+class ChatGptAnswer(Base):
+    __tablename__ = "chatgpt_answers"  # type: ignore[assignment]
+
+    question: Mapped[str] = mapped_column(TEXT, primary_key=True)
+    model: Mapped[str] = mapped_column(VARCHAR(length=256), primary_key=True)
+    answer: Mapped[str] = mapped_column(TEXT, nullable=False)
+    hits: Mapped[int] = mapped_column(INTEGER(), nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False, default=datetime.now)
+    last_used_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), nullable=False, default=datetime.now, index=True
+    )
@@ -0,0 +1,20 @@
+from datetime import datetime
+
+from sqlalchemy import BIGINT, INTEGER, JSON, TIMESTAMP
+from sqlalchemy.orm import Mapped, mapped_column
+
+from infra.database.base import Base
+
+__slots__ = ("ChatConversation",)
+
+
+class ChatConversation(Base):
+    __tablename__ = "chat_conversations"  # type: ignore[assignment]
+
+    chat_id: Mapped[int] = mapped_column(BIGINT, primary_key=True, autoincrement=False)
+    turns: Mapped[list[list[str]]] = mapped_column(JSON, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), nullable=False, default=datetime.now, index=True
+    )
+    # incremented on each change, so concurrent changes from different workers don't overwrite each other
+    version: Mapped[int] = mapped_column(INTEGER, nullable=False, default=0, server_default="0")
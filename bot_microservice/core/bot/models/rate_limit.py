@@ -0,0 +1,15 @@
+from sqlalchemy import Float, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from infra.database.base import Base
+
+__slots__ = ("RateLimitBucket",)
+
+
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limit_buckets"  # type: ignore[assignment]
+
+    key: Mapped[str] = mapped_column(String(length=64), primary_key=True)
+    tokens: Mapped[float] = mapped_column(Float, nullable=False)
+    # unix timestamp: buckets are shared by processes, so monotonic clock can't be used
+    updated_at: Mapped[float] = mapped_column(Float, nullable=False, index=True)
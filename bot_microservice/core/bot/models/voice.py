@@ -0,0 +1,19 @@
+from datetime import datetime
+
+from sqlalchemy import JSON, TIMESTAMP, VARCHAR
+from sqlalchemy.orm import Mapped, mapped_column
+
+from infra.database.base import Base
+
+__slots__ = ("VoiceTranscription",)
+
+
+class VoiceTranscription(Base):
+    __tablename__ = "voice_transcriptions"  # type: ignore[assignment]
+
+    file_unique_id: Mapped[str] = mapped_column(VARCHAR(length=128), primary_key=True)
+    text_parts: Mapped[list[str]] = mapped_column(JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False, default=datetime.now)
+    last_used_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), nullable=False, default=datetime.now, index=True
+    )
@@ -0,0 +1,183 @@
+import asyncio
+import fcntl
+import json
+import os
+import time
+from contextlib import suppress
+from dataclasses import asdict
+from datetime import datetime
+from functools import cache
+from pathlib import Path
+
+import httpx
+from loguru import logger
+
+from constants import INVALID_GPT_REQUEST_MESSAGES, MOSCOW_TZ
+from core.bot.dto import ChatGptModelProbeDTO
+from core.bot.repository import ChatGPTRepository
+from core.bot.scoring import get_model_scoreboard
+from infra.database.db_adapter import get_database
+from infra.http_client import get_chatgpt_client, get_chatgpt_client_guard
+from settings.config import DIR_CACHE, settings
+
+
+class ChatGptModelProber:
+    """
+    Background availability checks of all chatgpt models.
+
+    Every `interval` seconds each model is asked a short question, not more than `concurrency` models at once,
+    and the results are kept in memory, so healthcheck answers without requests to chatgpt.
+    Only one worker of the host probes models: the one holding the lock file. It shares the results with
+    other workers through the results file, the lock is taken over by another worker if the holder exits.
+    Until the prober is started models are probed on each request of the results.
+    """
+
+    question = "Привет!"
+
+    def __init__(
+        self,
+        repository: ChatGPTRepository,
+        interval: float,
+        concurrency: int,
+        timeout: float,
+        directory: Path = DIR_CACHE,
+    ) -> None:
+        self.repository = repository
+        self.interval = interval
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.lock_path = directory / "chatgpt_model_prober.lock"
+        self.results_path = directory / "chatgpt_model_probes.json"
+        self._results: dict[str, ChatGptModelProbeDTO] = {}
+        self._probe_task: asyncio.Task[None] | None = None
+        self._lock_fd: int | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._probe_task is not None and not self._probe_task.done()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_fd is not None
+
+    async def get_results(self) -> list[ChatGptModelProbeDTO] | None:
+        """Results of the last check, None - the first check after start is not finished yet"""
+        if not self.is_running:
+            await self.probe()
+            return list(self._results.values())
+        if self.is_leader:
+            return list(self._results.values()) or None
+        return self._read_results()
+
+    async def probe(self) -> None:
+        models = await self.repository.get_chatgpt_models_priority()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def probe_model(chatgpt_model: str) -> ChatGptModelProbeDTO:
+            async with semaphore:
+                return await self._probe_model(chatgpt_model)
+
+        results = await asyncio.gather(*(probe_model(model.model) for model in models))
+        self._results = {result.model: result for result in results}
+
+    def start(self) -> None:
+        if self.is_running:
+            return
+        self._probe_task = asyncio.create_task(self._probe_periodically())
+
+    async def stop(self) -> None:
+        if self._probe_task:
+            self._probe_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._probe_task
+            self._probe_task = None
+        if self._lock_fd is not None:
+            # closing the file releases the lock
+            os.close(self._lock_fd)
+            self._lock_fd = None
+        self._results = {}
+
+    async def _probe_periodically(self) -> None:
+        while True:
+            if self._acquire_lock():
+                try:
+                    await self.probe()
+                    self._write_results()
+                except Exception as error:
+                    logger.error("chatgpt models are not probed", error=error)
+            await asyncio.sleep(self.interval)
+
+    def _acquire_lock(self) -> bool:
+        if self._lock_fd is not None:
+            return True
+        lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(lock_fd)
+            return False
+        self._lock_fd = lock_fd
+        logger.info("chatgpt models are probed by this worker", pid=os.getpid())
+        return True
+
+    def _write_results(self) -> None:
+        results = [asdict(result) | {"checked_at": result.checked_at.isoformat()} for result in self._results.values()]
+        tmp_path = self.results_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(results))
+        os.replace(tmp_path, self.results_path)
+
+    def _read_results(self) -> list[ChatGptModelProbeDTO] | None:
+        try:
+            # results of a previous run or of a stuck worker are not trusted
+            if time.time() - self.results_path.stat().st_mtime > 2 * self.interval + self.timeout:
+                return None
+            results = json.loads(self.results_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        return [
+            ChatGptModelProbeDTO(**result | {"checked_at": datetime.fromisoformat(result["checked_at"])})
+            for result in results
+        ]
+
+    async def _probe_model(self, chatgpt_model: str) -> ChatGptModelProbeDTO:
+        started_at = time.monotonic()
+        status_code, error = None, None
+        try:
+            async with asyncio.timeout(self.timeout):
+                response = await self.repository.request_to_chatgpt_microservice(
+                    question=self.question, chatgpt_model=chatgpt_model
+                )
+            status_code = response.status_code
+            if status_code != httpx.codes.OK:
+                error = "unexpected http status code"
+            elif invalid_messages := [message for message in INVALID_GPT_REQUEST_MESSAGES if message in response.text]:
+                error = invalid_messages[0]
+        except Exception as exception:
+            error = repr(exception)
+        if error:
+            logger.info("chatgpt model is not available", chatgpt_model=chatgpt_model, error=error)
+        return ChatGptModelProbeDTO(
+            model=chatgpt_model,
+            is_available=error is None,
+            checked_at=datetime.now(tz=MOSCOW_TZ),
+            latency=time.monotonic() - started_at,
+            status_code=status_code,
+            error=error,
+        )
+
+
+@cache
+def get_chatgpt_model_prober() -> ChatGptModelProber:
+    repository = ChatGPTRepository(
+        settings=settings,
+        db=get_database(),
+        client=get_chatgpt_client(),
+        scoreboard=get_model_scoreboard(),
+        client_guard=get_chatgpt_client_guard(),
+    )
+    return ChatGptModelProber(
+        repository=repository,
+        interval=settings.GPT_PROBE_INTERVAL,
+        concurrency=settings.GPT_PROBE_CONCURRENCY,
+        timeout=settings.GPT_PROBE_TIMEOUT,
+    )
@@ -0,0 +1,107 @@
+import math
+import time
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any
+
+from loguru import logger
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from core.bot.dto import RateLimitDTO
+from core.bot.repository import RateLimitRepository
+from infra.database.db_adapter import get_database
+from settings.config import settings
+
+GLOBAL_BUCKET_KEY = "global"
+
+
+@dataclass
+class RateLimiter:
+    """
+    Token buckets limiting questions of each user and of all users together.
+
+    Buckets are stored in the database, so the limits hold for all workers of the application.
+    A question takes a token from the user bucket and then from the global one, limit of 0 per minute is disabled.
+    """
+
+    repository: RateLimitRepository
+    user_per_minute: float
+    user_burst: int
+    global_per_minute: float
+    global_burst: int
+
+    @classmethod
+    def build(cls) -> "RateLimiter":
+        return RateLimiter(
+            repository=RateLimitRepository(db=get_database()),
+            user_per_minute=settings.RATE_LIMIT_USER_PER_MINUTE,
+            user_burst=settings.RATE_LIMIT_USER_BURST,
+            global_per_minute=settings.RATE_LIMIT_GLOBAL_PER_MINUTE,
+            global_burst=settings.RATE_LIMIT_GLOBAL_BURST,
+        )
+
+    async def acquire(self, user_id: int) -> RateLimitDTO:
+        now = time.time()
+        user_key = f"user:{user_id}"
+        if self.user_per_minute and not await self.repository.take_token(
+            user_key, capacity=self.user_burst, rate=self.user_per_minute / 60, now=now
+        ):
+            retry_after = await self.repository.get_retry_after(
+                user_key, capacity=self.user_burst, rate=self.user_per_minute / 60, now=now
+            )
+            return RateLimitDTO(is_allowed=False, retry_after=retry_after)
+
+        if self.global_per_minute and not await self.repository.take_token(
+            GLOBAL_BUCKET_KEY, capacity=self.global_burst, rate=self.global_per_minute / 60, now=now
+        ):
+            # the question is not asked, so the user should not pay for it
+            if self.user_per_minute:
+                await self.repository.return_token(user_key, capacity=self.user_burst)
+            retry_after = await self.repository.get_retry_after(
+                GLOBAL_BUCKET_KEY, capacity=self.global_burst, rate=self.global_per_minute / 60, now=now
+            )
+            return RateLimitDTO(is_allowed=False, retry_after=retry_after, is_global=True)
+
+        return RateLimitDTO(is_allowed=True)
+
+    async def delete_idle_buckets(self) -> None:
+        """Delete buckets not used long enough to be refilled to capacity"""
+        refill_times = [
+            burst / per_minute * 60
+            for per_minute, burst in (
+                (self.user_per_minute, self.user_burst),
+                (self.global_per_minute, self.global_burst),
+            )
+            if per_minute
+        ]
+        await self.repository.delete_idle_buckets(updated_before=time.time() - max(refill_times, default=0))
+
+
+def check_rate_limit(func: Any) -> Any:
+    @wraps(func)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        if not update.effective_message or not update.effective_user:
+            await func(update, context)
+            return
+
+        rate_limiter = RateLimiter.build()
+        rate_limit = await rate_limiter.acquire(update.effective_user.id)
+        if rate_limit.is_allowed:
+            await func(update, context)
+            return
+
+        logger.warning(
+            "question is rate limited",
+            user_id=update.effective_user.id,
+            is_global=rate_limit.is_global,
+            retry_after=rate_limit.retry_after,
+        )
+        retry_after = math.ceil(rate_limit.retry_after)
+        if rate_limit.is_global:
+            text = f"Бот сейчас получает слишком много вопросов. Пожалуйста, попробуйте снова через {retry_after} сек."
+        else:
+            text = f"Вы задаете вопросы слишком часто. Пожалуйста, попробуйте снова через {retry_after} сек."
+        await update.effective_message.reply_text(text)
+
+    return wrapper
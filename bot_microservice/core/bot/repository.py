@@ -1,24 +1,71 @@
+import asyncio
 import random
+from collections import deque
 from dataclasses import dataclass
-from typing import Any, Sequence
+from datetime import datetime, timedelta
+from typing import Any, AsyncGenerator, Callable, Sequence
 from uuid import uuid4
 
 import httpx
-from httpx import AsyncClient, AsyncHTTPTransport, Response
+from httpx import AsyncClient, Response
 from loguru import logger
-from sqlalchemy import delete, desc, select, update
+from sqlalchemy import ColumnElement, delete, desc, func, select, tuple_, update
 from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.sql.dml import ReturningInsert, ReturningUpdate
 
-from constants import INVALID_GPT_REQUEST_MESSAGES
-from core.bot.models.chatgpt import ChatGptModels
+from constants import INVALID_GPT_REQUEST_MESSAGES, MOSCOW_TZ
+from core.bot.dto import (
+    ChatGptAnswerDTO,
+    ChatGptModelDTO,
+    ChatGptModelStatsDTO,
+    ConversationTurn,
+)
+from core.bot.models.chatgpt import ChatGptAnswer, ChatGptModels
+from core.bot.models.conversation import ChatConversation
+from core.bot.models.rate_limit import RateLimitBucket
+from core.bot.models.voice import VoiceTranscription
+from core.bot.scoring import ModelRequest, ModelScoreboard
+from infra.cache import TTLCache, VersionFile
 from infra.database.db_adapter import Database
-from settings.config import AppSettings
+from infra.http_client import ChatGptClientGuard, ChatGptClientUnavailableError
+from settings.config import AppSettings, settings
+
+MODELS_PRIORITY_CACHE_KEY = "models_priority"
+
+chatgpt_models_cache: TTLCache[str, list[ChatGptModelDTO]] = TTLCache(
+    ttl=settings.GPT_MODELS_CACHE_TTL, maxsize=1, version_file=VersionFile("chatgpt_models")
+)
+
+# turns of the chat with their version, the version is compared with the database before the turns are used
+conversations_cache: TTLCache[int, tuple[int, tuple[ConversationTurn, ...]]] = TTLCache(
+    ttl=settings.GPT_CONVERSATION_CACHE_TTL, maxsize=settings.GPT_CONVERSATION_CACHE_SIZE
+)
+
+
+class ChatGptAnswerError(Exception):
+    """Model has not answered, `message` is sent to the user if no other model answers"""
+
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+        self.message = message
+
+
+class ChatGptServiceUnavailableError(ChatGptAnswerError):
+    """Request is rejected by the client guard, other models are not asked either"""
+
+
+class ChatGptAnswerInterruptedError(ChatGptAnswerError):
+    """Model has stopped answering after the beginning of the answer was yielded"""
 
 
 @dataclass
 class ChatGPTRepository:
     settings: AppSettings
     db: Database
+    client: AsyncClient
+    scoreboard: ModelScoreboard
+    client_guard: ChatGptClientGuard
 
     async def get_chatgpt_models(self) -> Sequence[ChatGptModels]:
         query = select(ChatGptModels).order_by(desc(ChatGptModels.priority))
@@ -31,17 +78,20 @@ class ChatGPTRepository:
         query = update(ChatGptModels).values(priority=priority).filter(ChatGptModels.id == model_id)
         async with self.db.get_transaction_session() as session:
             await session.execute(query)
+        chatgpt_models_cache.invalidate()
 
     async def reset_all_chatgpt_models_priority(self) -> None:
         query = update(ChatGptModels).values(priority=0)
 
         async with self.db.session() as session:
             await session.execute(query)
+        chatgpt_models_cache.invalidate()
 
     async def delete_all_chatgpt_models(self) -> None:
         query = delete(ChatGptModels)
         async with self.db.session() as session:
             await session.execute(query)
+        chatgpt_models_cache.invalidate()
 
     async def bulk_insert_chatgpt_models(self, models_priority: list[dict[str, Any]]) -> None:
         models = [ChatGptModels(**model_priority) for model_priority in models_priority]
@@ -49,6 +99,7 @@ class ChatGPTRepository:
         async with self.db.session() as session:
             session.add_all(models)
             await session.commit()
+        chatgpt_models_cache.invalidate()
 
     async def add_chatgpt_model(self, model: str, priority: int) -> dict[str, str | int]:
         query = (
@@ -61,48 +112,222 @@ class ChatGPTRepository:
         async with self.db.session() as session:
             await session.execute(query)
             await session.commit()
-            return {"model": model, "priority": priority}
+        chatgpt_models_cache.invalidate()
+        return {"model": model, "priority": priority}
 
     async def delete_chatgpt_model(self, model_id: int) -> None:
         query = delete(ChatGptModels).filter_by(id=model_id)
 
         async with self.db.session() as session:
             await session.execute(query)
+        chatgpt_models_cache.invalidate()
 
-    async def get_current_chatgpt_model(self) -> str:
-        query = select(ChatGptModels.model).order_by(desc(ChatGptModels.priority)).limit(1)
+    async def get_chatgpt_models_priority(self) -> list[ChatGptModelDTO]:
+        """Models from the highest priority to the lowest"""
+        if models := chatgpt_models_cache.get(MODELS_PRIORITY_CACHE_KEY):
+            return models
+
+        query = select(ChatGptModels.model, ChatGptModels.priority).order_by(desc(ChatGptModels.priority))
 
         async with self.db.session() as session:
             result = await session.execute(query)
-            return result.scalar_one()
+            models = [ChatGptModelDTO(model=model, priority=priority) for model, priority in result.all()]
+        if models:
+            chatgpt_models_cache.set(MODELS_PRIORITY_CACHE_KEY, models)
+        return models
+
+    async def get_chatgpt_models_order(self) -> list[str]:
+        """Names of models in order they are asked, by score if adaptive ranking is enabled or else by priority"""
+        models = await self.get_chatgpt_models_priority()
+        if self.settings.GPT_ADAPTIVE_RANKING:
+            return self.scoreboard.rank(models)
+        return [model.model for model in models]
+
+    async def get_chatgpt_models_stats(self) -> list[ChatGptModelStatsDTO]:
+        return self.scoreboard.get_models_stats(await self.get_chatgpt_models_priority())
 
-    async def ask_question(self, question: str, chatgpt_model: str) -> str:
+    async def get_current_chatgpt_model(self) -> str:
+        if not (models := await self.get_chatgpt_models_order()):
+            raise NoResultFound("there are no chatgpt models")
+        return models[0]
+
+    async def ask_question_with_failover(
+        self, question: str, conversation: Sequence[ConversationTurn] = ()
+    ) -> ChatGptAnswerDTO:
+        """
+        Ask models in order until one of them answers.
+
+        If hedging is enabled and the running requests have not received a byte within GPT_HEDGE_DELAY seconds,
+        the next model is asked in parallel. The first successful answer wins, other requests are cancelled.
+        """
+        models = deque((await self.get_chatgpt_models_order())[: self.settings.GPT_FAILOVER_MAX_MODELS])
+        running: dict[asyncio.Task[str], ModelRequest] = {}
+        error_message = "Вообще всё сломалось :("
+
+        def ask_next_model() -> None:
+            chatgpt_model = models.popleft()
+            model_request = self.scoreboard.start_request(chatgpt_model)
+            task = asyncio.create_task(self._request_answer(question, model_request, conversation=conversation))
+            running[task] = model_request
+
+        if models:
+            ask_next_model()
+        try:
+            while running:
+                can_hedge = bool(self.settings.GPT_HEDGE_DELAY and models)
+                done, _ = await asyncio.wait(
+                    running,
+                    timeout=self.settings.GPT_HEDGE_DELAY if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    if not any(model_request.has_first_byte for model_request in running.values()):
+                        logger.info("chatgpt model is slow, next model is asked", question=question)
+                        ask_next_model()
+                    continue
+                for task in done:
+                    model_request = running.pop(task)
+                    try:
+                        return ChatGptAnswerDTO(text=task.result(), chatgpt_model=model_request.model, is_complete=True)
+                    except ChatGptServiceUnavailableError as error:
+                        return ChatGptAnswerDTO(text=error.message)
+                    except ChatGptAnswerError as error:
+                        error_message = error.message
+                if not running and models:
+                    ask_next_model()
+            return ChatGptAnswerDTO(text=error_message)
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def ask_question_stream_with_failover(
+        self, question: str, answer: ChatGptAnswerDTO | None = None, conversation: Sequence[ConversationTurn] = ()
+    ) -> AsyncGenerator[str, None]:
+        """
+        Stream answer of the first model in order which starts answering successfully.
+
+        If `answer` is passed, the whole text is collected to it, the model is set and the answer is marked as complete
+        when the model has answered to the end.
+        The beginning of an interrupted answer is already sent, so other models are not asked then.
+        """
+        answer = answer or ChatGptAnswerDTO()
+        error_message = "Вообще всё сломалось :("
+        for chatgpt_model in (await self.get_chatgpt_models_order())[: self.settings.GPT_FAILOVER_MAX_MODELS]:
+            try:
+                async for chunk in self._stream_answer(
+                    question, self.scoreboard.start_request(chatgpt_model), conversation=conversation
+                ):
+                    answer.text += chunk
+                    yield chunk
+            except ChatGptServiceUnavailableError as error:  # noqa: PERF203
+                answer.text = error.message
+                yield error.message
+                return
+            except ChatGptAnswerInterruptedError as error:
+                answer.text += error.message
+                yield error.message
+                return
+            except ChatGptAnswerError as error:
+                error_message = error.message
+            else:
+                answer.chatgpt_model = chatgpt_model
+                answer.is_complete = True
+                return
+        answer.text = error_message
+        yield error_message
+
+    async def _request_answer(
+        self, question: str, model_request: ModelRequest, conversation: Sequence[ConversationTurn] = ()
+    ) -> str:
+        """Whole answer of the model, ChatGptAnswerError is raised if the model has not answered completely"""
         try:
-            response = await self.request_to_chatgpt_microservice(question=question, chatgpt_model=chatgpt_model)
-            status = response.status_code
-            for message in INVALID_GPT_REQUEST_MESSAGES:
-                if message in response.text:
-                    invalid_model_message = f"{message}: {chatgpt_model}"
-                    logger.info(invalid_model_message, question=question, chatgpt_model=chatgpt_model)
-                    return invalid_model_message
-            if status != httpx.codes.OK:
-                logger.info(f"got response status: {status} from chat api", response.text)
-                return "Что-то пошло не так, попробуйте еще раз или обратитесь к администратору"
+            return "".join([chunk async for chunk in self._stream_answer(question, model_request, conversation)])
+        except ChatGptAnswerInterruptedError as error:
+            # nothing is sent to the user yet, so the answer of another model can be used
+            raise ChatGptAnswerError("Вообще всё сломалось :(") from error
+
+    async def _stream_answer(
+        self, question: str, model_request: ModelRequest, conversation: Sequence[ConversationTurn] = ()
+    ) -> AsyncGenerator[str, None]:
+        """
+        Yield answer chunks as soon as chatgpt microservice sends them.
+
+        The beginning of the answer is held until it can be checked for invalid model messages.
+        Failures before anything is yielded raise ChatGptAnswerError with the message for the user,
+        so the next model can be asked instead. Failures after that raise ChatGptAnswerInterruptedError,
+        the answer is incomplete. The result of the request is recorded to the model score,
+        cancelled requests are not recorded.
+        """
+        chatgpt_model = model_request.model
+        data = self._build_request_data(question=question, chatgpt_model=chatgpt_model, conversation=conversation)
+        head_length = max(map(len, INVALID_GPT_REQUEST_MESSAGES)) + len(chatgpt_model) + 2
+        head, head_checked = "", False
+        try:
+            async with (
+                self.client_guard.guard(),
+                self.client.stream("POST", self.settings.chatgpt_backend_url, json=data) as response,
+            ):
+                await self._check_response_status(response)
+                async for chunk in response.aiter_text():
+                    model_request.received_first_byte()
+                    if head_checked:
+                        yield chunk
+                        continue
+                    head += chunk
+                    if len(head) < head_length:
+                        continue
+                    head_checked = True
+                    self._check_answer_head(head, question=question, chatgpt_model=chatgpt_model)
+                    yield head
+            if not head_checked:
+                self._check_answer_head(head, question=question, chatgpt_model=chatgpt_model)
+        except ChatGptClientUnavailableError as error:
+            logger.warning("request to chat api is rejected", error=error, chatgpt_model=chatgpt_model)
+            raise ChatGptServiceUnavailableError("Сервис сейчас перегружен, попробуйте позже") from error
+        except ChatGptAnswerError:
+            model_request.failed()
+            raise
         except Exception as error:
-            logger.error("error get data from chat api", error=error)
-        else:
-            return response.text
-        return "Вообще всё сломалось :("
+            logger.error("error get data from chat api", error=error, chatgpt_model=chatgpt_model)
+            model_request.failed()
+            if not head_checked:
+                raise ChatGptAnswerError("Вообще всё сломалось :(") from error
+            raise ChatGptAnswerInterruptedError("\n\nОтвет прервался, попробуйте задать вопрос еще раз") from error
+        model_request.succeeded()
+        if not head_checked:
+            yield head
+
+    @staticmethod
+    async def _check_response_status(response: Response) -> None:
+        if response.status_code != httpx.codes.OK:
+            await response.aread()
+            logger.info(f"got response status: {response.status_code} from chat api", response.text)
+            raise ChatGptAnswerError("Что-то пошло не так, попробуйте еще раз или обратитесь к администратору")
+
+    def _check_answer_head(self, text: str, question: str, chatgpt_model: str) -> None:
+        if invalid_model_message := self._get_invalid_model_message(
+            text, question=question, chatgpt_model=chatgpt_model
+        ):
+            raise ChatGptAnswerError(invalid_model_message)
 
     async def request_to_chatgpt_microservice(self, question: str, chatgpt_model: str) -> Response:
         data = self._build_request_data(question=question, chatgpt_model=chatgpt_model)
+        async with self.client_guard.guard():
+            return await self.client.post(self.settings.chatgpt_backend_url, json=data)
 
-        transport = AsyncHTTPTransport(retries=3)
-        async with AsyncClient(base_url=self.settings.GPT_BASE_HOST, transport=transport, timeout=50) as client:
-            return await client.post(self.settings.chatgpt_backend_url, json=data, timeout=50)
+    @staticmethod
+    def _get_invalid_model_message(text: str, question: str, chatgpt_model: str) -> str | None:
+        for message in INVALID_GPT_REQUEST_MESSAGES:
+            if message in text:
+                invalid_model_message = f"{message}: {chatgpt_model}"
+                logger.info(invalid_model_message, question=question, chatgpt_model=chatgpt_model)
+                return invalid_model_message
+        return None
 
     @staticmethod
-    def _build_request_data(*, question: str, chatgpt_model: str) -> dict[str, Any]:
+    def _build_request_data(
+        *, question: str, chatgpt_model: str, conversation: Sequence[ConversationTurn] = ()
+    ) -> dict[str, Any]:
         return {
             "conversation_id": str(uuid4()),
             "action": "_ask",
@@ -111,10 +336,280 @@ class ChatGPTRepository:
             "meta": {
                 "id": random.randint(10**18, 10**19 - 1),  # noqa: S311
                 "content": {
-                    "conversation": [],
+                    "conversation": [
+                        message
+                        for turn in conversation
+                        for message in (
+                            {"role": "user", "content": turn.question},
+                            {"role": "assistant", "content": turn.answer},
+                        )
+                    ],
                     "internet_access": False,
                     "content_type": "text",
                     "parts": [{"content": question, "role": "user"}],
                 },
             },
         }
+
+
+@dataclass
+class VoiceTranscriptionRepository:
+    db: Database
+
+    async def get_text_parts(self, file_unique_id: str) -> list[str] | None:
+        """Text parts of the transcribed voice, found transcription is marked as recently used"""
+        query = select(VoiceTranscription.text_parts).filter_by(file_unique_id=file_unique_id)
+        async with self.db.session() as session:
+            result = await session.execute(query)
+            text_parts = result.scalar()
+        if text_parts is None:
+            return None
+        # write lock is taken only for found transcriptions, misses are answered by a plain select
+        mark_query = (
+            update(VoiceTranscription)
+            .values(last_used_at=datetime.now(tz=MOSCOW_TZ))
+            .filter_by(file_unique_id=file_unique_id)
+        )
+        async with self.db.get_transaction_session() as session:
+            await session.execute(mark_query)
+        return text_parts
+
+    async def save_text_parts(self, file_unique_id: str, text_parts: list[str], max_size: int) -> None:
+        """Save transcription and evict the least recently used ones above `max_size`"""
+        now = datetime.now(tz=MOSCOW_TZ)
+        query = (
+            insert(VoiceTranscription)
+            .values(file_unique_id=file_unique_id, text_parts=text_parts, created_at=now, last_used_at=now)
+            .on_conflict_do_update(
+                index_elements=[VoiceTranscription.file_unique_id],
+                set_={"text_parts": text_parts, "last_used_at": now},
+            )
+        )
+        evicted = (
+            select(VoiceTranscription.file_unique_id)
+            .order_by(desc(VoiceTranscription.last_used_at))
+            .offset(max_size)
+            .scalar_subquery()
+        )
+        async with self.db.get_transaction_session() as session:
+            await session.execute(query)
+            await session.execute(delete(VoiceTranscription).where(VoiceTranscription.file_unique_id.in_(evicted)))
+
+
+@dataclass
+class ChatGptAnswerRepository:
+    db: Database
+
+    async def get_answer(self, question: str, chatgpt_models: list[str], ttl: float) -> ChatGptAnswerDTO | None:
+        """Cached answer of the first of the models, found answer is marked as recently used"""
+        now = datetime.now(tz=MOSCOW_TZ)
+        query = select(ChatGptAnswer.model, ChatGptAnswer.answer).filter(
+            ChatGptAnswer.question == question,
+            ChatGptAnswer.model.in_(chatgpt_models),
+            ChatGptAnswer.created_at > now - timedelta(seconds=ttl),
+        )
+        async with self.db.session() as session:
+            result = await session.execute(query)
+            answers = dict(result.tuples().all())
+        if not (chatgpt_model := next((model for model in chatgpt_models if model in answers), None)):
+            return None
+        # write lock is taken only for hits, misses are answered by a plain select
+        mark_query = (
+            update(ChatGptAnswer)
+            .values(last_used_at=now, hits=ChatGptAnswer.hits + 1)
+            .filter_by(question=question, model=chatgpt_model)
+        )
+        async with self.db.get_transaction_session() as session:
+            await session.execute(mark_query)
+        return ChatGptAnswerDTO(text=answers[chatgpt_model], chatgpt_model=chatgpt_model, is_complete=True)
+
+    async def save_answer(self, question: str, chatgpt_model: str, answer: str) -> None:
+        now = datetime.now(tz=MOSCOW_TZ)
+        query = (
+            insert(ChatGptAnswer)
+            .values(question=question, model=chatgpt_model, answer=answer, hits=0, created_at=now, last_used_at=now)
+            .on_conflict_do_update(
+                index_elements=[ChatGptAnswer.question, ChatGptAnswer.model],
+                set_={"answer": answer, "hits": 0, "created_at": now, "last_used_at": now},
+            )
+        )
+        async with self.db.get_transaction_session() as session:
+            await session.execute(query)
+
+    async def evict_answers(self, max_size: int, ttl: float) -> None:
+        """Delete expired answers and the least recently used ones above `max_size`"""
+        now = datetime.now(tz=MOSCOW_TZ)
+        evicted = (
+            select(ChatGptAnswer.question, ChatGptAnswer.model)
+            .order_by(desc(ChatGptAnswer.last_used_at))
+            .offset(max_size)
+        )
+        async with self.db.get_transaction_session() as session:
+            await session.execute(delete(ChatGptAnswer).where(ChatGptAnswer.created_at <= now - timedelta(seconds=ttl)))
+            await session.execute(
+                delete(ChatGptAnswer).where(tuple_(ChatGptAnswer.question, ChatGptAnswer.model).in_(evicted))
+            )
+
+    async def get_size_and_total_hits(self) -> tuple[int, int]:
+        query = select(func.count(), func.coalesce(func.sum(ChatGptAnswer.hits), 0))
+        async with self.db.session() as session:
+            result = await session.execute(query.select_from(ChatGptAnswer))
+            size, total_hits = result.one()
+        return size, total_hits
+
+
+@dataclass
+class ChatConversationRepository:
+    db: Database
+
+    async def get_turns(self, chat_id: int, expire: float) -> tuple[ConversationTurn, ...]:
+        """
+        Turns of the chat conversation from the oldest, conversation inactive for `expire` seconds is empty.
+
+        Cached turns are used only if their version is still saved, so changes from other workers are not missed.
+        """
+        is_active = ChatConversation.updated_at > datetime.now(tz=MOSCOW_TZ) - timedelta(seconds=expire)
+        if cached := conversations_cache.get(chat_id):
+            cached_version, turns = cached
+            version_query = select(ChatConversation.version).filter(ChatConversation.chat_id == chat_id, is_active)
+            async with self.db.session() as session:
+                result = await session.execute(version_query)
+                version = result.scalar()
+            if version == cached_version:
+                return turns
+            if version is None:
+                conversations_cache.delete(chat_id)
+                return ()
+
+        query = select(ChatConversation.turns, ChatConversation.version).filter(
+            ChatConversation.chat_id == chat_id, is_active
+        )
+        async with self.db.session() as session:
+            result = await session.execute(query)
+            conversation = result.one_or_none()
+        if not conversation:
+            conversations_cache.delete(chat_id)
+            return ()
+        turns = tuple(ConversationTurn(*turn) for turn in conversation.turns)
+        conversations_cache.set(chat_id, (conversation.version, turns))
+        return turns
+
+    async def update_turns(
+        self,
+        chat_id: int,
+        update_turns: Callable[[tuple[ConversationTurn, ...]], tuple[ConversationTurn, ...]],
+        expire: float,
+    ) -> tuple[ConversationTurn, ...]:
+        """
+        Change conversation of the chat with `update_turns`, conversation inactive for `expire` seconds is empty.
+
+        New turns are built from the saved ones and written only if nobody has changed them in between,
+        otherwise it is repeated, so concurrent changes from different workers are not lost.
+        """
+        while True:
+            now = datetime.now(tz=MOSCOW_TZ)
+            is_active = (ChatConversation.updated_at > now - timedelta(seconds=expire)).label("is_active")
+            query = select(ChatConversation.turns, ChatConversation.version, is_active).filter_by(chat_id=chat_id)
+            async with self.db.session() as session:
+                result = await session.execute(query)
+                conversation = result.one_or_none()
+            turns: tuple[ConversationTurn, ...] = ()
+            if conversation and conversation.is_active:
+                turns = tuple(ConversationTurn(*turn) for turn in conversation.turns)
+            turns = update_turns(turns)
+            write_query: ReturningInsert[tuple[int]] | ReturningUpdate[tuple[int]]
+            if conversation:
+                write_query = (
+                    update(ChatConversation)
+                    .values(turns=turns, updated_at=now, version=ChatConversation.version + 1)
+                    .filter_by(chat_id=chat_id, version=conversation.version)
+                    .returning(ChatConversation.version)
+                )
+            else:
+                write_query = (
+                    insert(ChatConversation)
+                    .values(chat_id=chat_id, turns=turns, updated_at=now, version=0)
+                    .on_conflict_do_nothing(index_elements=[ChatConversation.chat_id])
+                    .returning(ChatConversation.version)
+                )
+            async with self.db.get_transaction_session() as session:
+                result = await session.execute(write_query)
+                version = result.scalar()
+            if version is not None:
+                break
+            logger.info("chat conversation is changed concurrently, change is repeated", chat_id=chat_id)
+
+        conversations_cache.set(chat_id, (version, turns))
+        return turns
+
+    async def delete_turns(self, chat_id: int) -> None:
+        # turns are emptied instead of deleting the row, so the version keeps growing
+        # and other workers don't take their cached turns for the current ones
+        query = (
+            update(ChatConversation)
+            .values(turns=[], updated_at=datetime.now(tz=MOSCOW_TZ), version=ChatConversation.version + 1)
+            .filter_by(chat_id=chat_id)
+        )
+        async with self.db.get_transaction_session() as session:
+            await session.execute(query)
+        conversations_cache.delete(chat_id)
+
+    async def delete_expired(self, expire: float) -> None:
+        """Delete conversations inactive for `expire` seconds, they are already treated as empty"""
+        query = delete(ChatConversation).filter(
+            ChatConversation.updated_at <= datetime.now(tz=MOSCOW_TZ) - timedelta(seconds=expire)
+        )
+        async with self.db.get_transaction_session() as session:
+            await session.execute(query)
+
+
+@dataclass
+class RateLimitRepository:
+    db: Database
+
+    async def take_token(self, key: str, capacity: int, rate: float, now: float) -> bool:
+        """
+        Take a token from the bucket refilled by `rate` tokens per second up to `capacity`.
+
+        Refill and take are made by one upsert, so concurrent workers can't take the same token.
+        Bucket without a whole token is not changed.
+        """
+        tokens: ColumnElement[float] = func.min(
+            capacity, RateLimitBucket.tokens + func.max(now - RateLimitBucket.updated_at, 0) * rate
+        )
+        query = (
+            insert(RateLimitBucket)
+            .values(key=key, tokens=capacity - 1, updated_at=now)
+            .on_conflict_do_update(
+                index_elements=[RateLimitBucket.key],
+                set_={"tokens": tokens - 1, "updated_at": now},
+                where=tokens >= 1,
+            )
+            .returning(RateLimitBucket.key)
+        )
+        async with self.db.get_transaction_session() as session:
+            result = await session.execute(query)
+            return result.scalar() is not None
+
+    async def return_token(self, key: str, capacity: int) -> None:
+        query = update(RateLimitBucket).values(tokens=func.min(capacity, RateLimitBucket.tokens + 1)).filter_by(key=key)
+        async with self.db.get_transaction_session() as session:
+            await session.execute(query)
+
+    async def get_retry_after(self, key: str, capacity: int, rate: float, now: float) -> float:
+        """Seconds until the bucket has a whole token"""
+        query = select(RateLimitBucket.tokens, RateLimitBucket.updated_at).filter_by(key=key)
+        async with self.db.session() as session:
+            result = await session.execute(query)
+            bucket = result.one_or_none()
+        if not bucket:
+            return 0
+        tokens, updated_at = bucket
+        tokens = min(capacity, tokens + max(now - updated_at, 0) * rate)
+        return max(1 - tokens, 0) / rate
+
+    async def delete_idle_buckets(self, updated_before: float) -> None:
+        """Buckets which are refilled to capacity are the same as absent ones"""
+        query = delete(RateLimitBucket).filter(RateLimitBucket.updated_at < updated_before)
+        async with self.db.get_transaction_session() as session:
+            await session.execute(query)
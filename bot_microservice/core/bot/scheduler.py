@@ -0,0 +1,159 @@
+import asyncio
+import heapq
+import itertools
+from contextlib import suppress
+from typing import Any, Callable, Coroutine
+
+from loguru import logger
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from constants import TelegramSendPriorityEnum
+from infra.cache import TTLCache
+from settings.config import AppSettings
+
+JSONResult = bool | dict[str, Any] | list[dict[str, Any]]
+
+
+class TelegramSendScheduler(BaseRateLimiter[int]):
+    """
+    Scheduler of outgoing requests to telegram which keeps the bot within telegram flood limits.
+
+    Bot passes every request through it. Requests to a chat are spread by a token bucket of the chat,
+    group chats get less messages per minute. Then requests to all chats wait for the global bucket in order
+    of priority: new messages are sent before edits of already sent ones.
+    If telegram still answers with RetryAfter, all requests are paused for the asked time and the request is repeated.
+    Requests not addressed to a chat are only paused.
+
+    Buckets are kept in the process, so limits of the bot are shared equally between application workers.
+    Messages to one chat can be sent by different workers, so per chat limits hold only on average.
+    """
+
+    def __init__(
+        self,
+        global_per_second: float,
+        chat_per_second: float,
+        group_per_minute: float,
+        chat_burst: int,
+        max_retries: int,
+        chats_maxsize: int = 10000,
+    ) -> None:
+        self.global_interval = 1 / global_per_second
+        self.chat_interval = 1 / chat_per_second
+        self.group_interval = 60 / group_per_minute
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        # time when the next message can be sent to the chat if its bucket is empty,
+        # an entry expires after the chat bucket is refilled anyway
+        self._chats_send_at: TTLCache[int | str, float] = TTLCache(
+            ttl=chat_burst * max(self.chat_interval, self.group_interval) + 60, maxsize=chats_maxsize
+        )
+        self._queue: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._counter = itertools.count()
+        self._dispatcher: asyncio.Task[None] | None = None
+        self._next_send_at = 0.0
+        self._paused_until = 0.0
+
+    @classmethod
+    def build(cls, settings: AppSettings) -> "TelegramSendScheduler":
+        # limits are of the whole bot, buckets live in the process, so each application worker gets an equal share
+        workers_count = settings.WORKERS_COUNT
+        return TelegramSendScheduler(
+            global_per_second=settings.TELEGRAM_SEND_GLOBAL_PER_SECOND / workers_count,
+            chat_per_second=settings.TELEGRAM_SEND_CHAT_PER_SECOND / workers_count,
+            group_per_minute=settings.TELEGRAM_SEND_GROUP_PER_MINUTE / workers_count,
+            chat_burst=max(1, settings.TELEGRAM_SEND_CHAT_BURST // workers_count),
+            max_retries=settings.TELEGRAM_SEND_MAX_RETRIES,
+        )
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._dispatcher
+            self._dispatcher = None
+        while self._queue:
+            _, _, waiter = heapq.heappop(self._queue)
+            waiter.cancel()
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, JSONResult]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: int | None,
+    ) -> JSONResult:
+        chat_id = data.get("chat_id")
+        priority = self._get_priority(endpoint) if rate_limit_args is None else rate_limit_args
+        retries = 0
+        while True:
+            if chat_id is None:
+                await self._wait_pause()
+            else:
+                await self._wait_chat_turn(chat_id)
+                await self._wait_global_turn(priority)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as error:
+                if retries >= self.max_retries:
+                    raise
+                retries += 1
+                logger.warning(
+                    "telegram flood limit is exceeded",
+                    endpoint=endpoint,
+                    chat_id=chat_id,
+                    retry_after=error.retry_after,
+                )
+                self._pause(error.retry_after)
+
+    @staticmethod
+    def _get_priority(endpoint: str) -> int:
+        if endpoint.startswith("edit"):
+            return TelegramSendPriorityEnum.edit
+        return TelegramSendPriorityEnum.message
+
+    def _pause(self, seconds: float) -> None:
+        loop = asyncio.get_running_loop()
+        self._paused_until = max(self._paused_until, loop.time() + seconds)
+
+    async def _wait_pause(self) -> None:
+        loop = asyncio.get_running_loop()
+        while (wait := self._paused_until - loop.time()) > 0:
+            await asyncio.sleep(wait)
+
+    async def _wait_chat_turn(self, chat_id: int | str) -> None:
+        # private chats have positive ids, groups and channels negative ids or usernames
+        is_group = isinstance(chat_id, str) or chat_id < 0
+        interval = self.group_interval if is_group else self.chat_interval
+        now = asyncio.get_running_loop().time()
+        send_at = max(self._chats_send_at.get(chat_id) or now, now)
+        # turn is reserved before the wait, so messages to the chat keep their order
+        self._chats_send_at.set(chat_id, send_at + interval)
+        if (wait := send_at - (self.chat_burst - 1) * interval - now) > 0:
+            await asyncio.sleep(wait)
+
+    async def _wait_global_turn(self, priority: int) -> None:
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._counter), waiter))
+        if not self._dispatcher or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await waiter
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._queue:
+            if (wait := max(self._next_send_at, self._paused_until) - loop.time()) > 0:
+                await asyncio.sleep(wait)
+                # pause could be prolonged and a request with higher priority could come during the sleep
+                continue
+            _, _, waiter = heapq.heappop(self._queue)
+            if waiter.done():
+                # request is cancelled while waiting
+                continue
+            waiter.set_result(None)
+            self._next_send_at = loop.time() + self.global_interval
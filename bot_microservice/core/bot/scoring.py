@@ -0,0 +1,162 @@
+import time
+from bisect import bisect_left
+from functools import cache
+from typing import Sequence
+
+from constants import GPT_LATENCY_HISTOGRAM_BUCKETS, ChatGptCircuitStateEnum
+from core.bot.dto import ChatGptModelDTO, ChatGptModelStatsDTO
+from settings.config import settings
+
+
+class ModelStats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        # exponentially weighted moving averages
+        self.failure_rate: float | None = None
+        self.latency: float | None = None
+        self.first_byte_latency: float | None = None
+        self.latency_histogram = [0] * (len(GPT_LATENCY_HISTOGRAM_BUCKETS) + 1)
+        self.opened_at: float | None = None
+
+
+class ModelRequest:
+    """Timings of one request to the model, the result is recorded to the scoreboard once"""
+
+    def __init__(self, scoreboard: "ModelScoreboard", model: str) -> None:
+        self.scoreboard = scoreboard
+        self.model = model
+        self.started_at = time.monotonic()
+        self.first_byte_at: float | None = None
+
+    @property
+    def has_first_byte(self) -> bool:
+        return self.first_byte_at is not None
+
+    def received_first_byte(self) -> None:
+        if self.first_byte_at is None:
+            self.first_byte_at = time.monotonic()
+
+    def succeeded(self) -> None:
+        first_byte_latency = self.first_byte_at - self.started_at if self.first_byte_at is not None else None
+        self.scoreboard.record_success(
+            self.model, latency=time.monotonic() - self.started_at, first_byte_latency=first_byte_latency
+        )
+
+    def failed(self) -> None:
+        self.scoreboard.record_failure(self.model)
+
+
+class ModelScoreboard:
+    """
+    Live scores of chatgpt models calculated from the answers of this worker.
+
+    Score of the model is its priority weighted by moving averages of success rate and latency:
+    `(priority + 1) * (1 - failure_rate) / (1 + latency / latency_weight)`.
+    After `failure_threshold` consecutive failures the circuit of the model is open and the model goes to the end
+    of the order. In `reset_timeout` seconds the circuit is half open: the model is ranked by score again,
+    the next success closes the circuit and the next failure opens it again.
+    """
+
+    # models which always fail keep the order of their priorities
+    min_success_rate = 0.01
+
+    def __init__(self, alpha: float, latency_weight: float, failure_threshold: int, reset_timeout: float) -> None:
+        self.alpha = alpha
+        self.latency_weight = latency_weight
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._stats: dict[str, ModelStats] = {}
+
+    def start_request(self, model: str) -> ModelRequest:
+        return ModelRequest(self, model)
+
+    def record_success(self, model: str, latency: float, first_byte_latency: float | None = None) -> None:
+        stats = self._get_stats(model)
+        stats.requests += 1
+        stats.consecutive_failures = 0
+        stats.opened_at = None
+        stats.failure_rate = self._ewma(stats.failure_rate, 0)
+        stats.latency = self._ewma(stats.latency, latency)
+        if first_byte_latency is not None:
+            stats.first_byte_latency = self._ewma(stats.first_byte_latency, first_byte_latency)
+        stats.latency_histogram[bisect_left(GPT_LATENCY_HISTOGRAM_BUCKETS, latency)] += 1
+
+    def record_failure(self, model: str) -> None:
+        stats = self._get_stats(model)
+        stats.requests += 1
+        stats.failures += 1
+        stats.consecutive_failures += 1
+        stats.failure_rate = self._ewma(stats.failure_rate, 1)
+        if stats.consecutive_failures >= self.failure_threshold:
+            stats.opened_at = time.monotonic()
+
+    def circuit_state(self, model: str) -> ChatGptCircuitStateEnum:
+        if not (stats := self._stats.get(model)) or stats.opened_at is None:
+            return ChatGptCircuitStateEnum.closed
+        if time.monotonic() - stats.opened_at < self.reset_timeout:
+            return ChatGptCircuitStateEnum.open
+        return ChatGptCircuitStateEnum.half_open
+
+    def score(self, model: str, priority: int) -> float:
+        if not (stats := self._stats.get(model)):
+            return float(priority + 1)
+        success_rate = max(1 - (stats.failure_rate or 0), self.min_success_rate)
+        return (priority + 1) * success_rate / (1 + (stats.latency or 0) / self.latency_weight)
+
+    def rank(self, models: Sequence[ChatGptModelDTO]) -> list[str]:
+        """Names of models from the best to the worst, models with open circuit are the last"""
+        ranked = sorted(
+            models,
+            key=lambda model: (
+                self.circuit_state(model.model) == ChatGptCircuitStateEnum.open,
+                -self.score(model.model, model.priority),
+            ),
+        )
+        return [model.model for model in ranked]
+
+    def get_models_stats(self, models: Sequence[ChatGptModelDTO]) -> list[ChatGptModelStatsDTO]:
+        priorities = {model.model: model.priority for model in models}
+        return [self._build_model_stats(model, priorities[model]) for model in self.rank(models)]
+
+    def clear(self) -> None:
+        self._stats.clear()
+
+    def _build_model_stats(self, model: str, priority: int) -> ChatGptModelStatsDTO:
+        stats = self._stats.get(model) or ModelStats()
+        bucket_names = [f"<={bucket}" for bucket in GPT_LATENCY_HISTOGRAM_BUCKETS]
+        bucket_names.append(f">{GPT_LATENCY_HISTOGRAM_BUCKETS[-1]}")
+        return ChatGptModelStatsDTO(
+            model=model,
+            priority=priority,
+            score=self.score(model, priority),
+            circuit_state=self.circuit_state(model),
+            requests=stats.requests,
+            failures=stats.failures,
+            consecutive_failures=stats.consecutive_failures,
+            failure_rate=stats.failure_rate or 0,
+            latency=stats.latency,
+            first_byte_latency=stats.first_byte_latency,
+            latency_histogram=dict(zip(bucket_names, stats.latency_histogram, strict=True)),
+        )
+
+    def _get_stats(self, model: str) -> ModelStats:
+        if not (stats := self._stats.get(model)):
+            stats = self._stats[model] = ModelStats()
+        return stats
+
+    def _ewma(self, average: float | None, value: float) -> float:
+        if average is None:
+            return value
+        return self.alpha * value + (1 - self.alpha) * average
+
+
+@cache
+def get_model_scoreboard() -> ModelScoreboard:
+    return ModelScoreboard(
+        alpha=settings.GPT_SCORE_EWMA_ALPHA,
+        latency_weight=settings.GPT_SCORE_LATENCY_WEIGHT,
+        failure_threshold=settings.GPT_CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=settings.GPT_CIRCUIT_RESET_TIMEOUT,
+    )
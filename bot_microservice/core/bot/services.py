@@ -1,26 +1,44 @@
-import os
-import subprocess  # noqa: S404
-import tempfile
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
 from concurrent.futures.thread import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any, Sequence
+from functools import cache
+from typing import AsyncGenerator, AsyncIterator, Sequence
+from weakref import WeakValueDictionary
 
-from httpx import Response
 from loguru import logger
-from pydub import AudioSegment
-from speech_recognition import (
-    AudioFile,
-    Recognizer,
-    UnknownValueError as SpeechRecognizerError,
-)
 
-from constants import AUDIO_SEGMENT_DURATION, ChatGptModelsEnum
-from core.auth.models.users import User
-from core.auth.repository import UserRepository
+from constants import (
+    AUDIO_SAMPLE_RATE,
+    AUDIO_SAMPLE_WIDTH,
+    AUDIO_SEGMENT_DURATION,
+    AUDIO_SEGMENT_OVERLAP,
+    QUESTION_EDGE_PUNCTUATION,
+    ChatGptModelsEnum,
+    SpeechRecognitionModeEnum,
+)
+from core.auth.dto import UserStateDTO
 from core.auth.services import UserService
+from core.bot.dto import (
+    ChatGptAnswerCacheStatsDTO,
+    ChatGptAnswerDTO,
+    ChatGptModelStatsDTO,
+    ConversationTurn,
+)
 from core.bot.models.chatgpt import ChatGptModels
-from core.bot.repository import ChatGPTRepository
-from infra.database.db_adapter import Database
+from core.bot.repository import (
+    ChatConversationRepository,
+    ChatGptAnswerRepository,
+    ChatGPTRepository,
+    VoiceTranscriptionRepository,
+)
+from core.bot.scoring import get_model_scoreboard
+from core.bot.speech import recognize_speech
+from infra.database.db_adapter import get_database
+from infra.http_client import get_chatgpt_client, get_chatgpt_client_guard
+from infra.single_flight import SingleFlight
 from settings.config import settings
 
 
@@ -28,30 +46,75 @@ from settings.config import settings
 class ChatGptService:
     repository: ChatGPTRepository
     user_service: UserService
+    answer_cache: "ChatGptAnswerCacheService"
+    requests_in_flight: SingleFlight[tuple[str, tuple[str, ...]], ChatGptAnswerDTO]
+    conversations: "ChatConversationService"
 
     @classmethod
     def build(cls) -> "ChatGptService":
-        db = Database(settings=settings)
-        repository = ChatGPTRepository(settings=settings, db=db)
-        user_repository = UserRepository(db=db)
-        user_service = UserService(repository=user_repository)
-        return ChatGptService(repository=repository, user_service=user_service)
+        db = get_database()
+        repository = ChatGPTRepository(
+            settings=settings,
+            db=db,
+            client=get_chatgpt_client(),
+            scoreboard=get_model_scoreboard(),
+            client_guard=get_chatgpt_client_guard(),
+        )
+        return ChatGptService(
+            repository=repository,
+            user_service=UserService.build(),
+            answer_cache=ChatGptAnswerCacheService.build(),
+            requests_in_flight=get_chatgpt_requests_in_flight(),
+            conversations=ChatConversationService.build(),
+        )
 
     async def get_chatgpt_models(self) -> Sequence[ChatGptModels]:
         return await self.repository.get_chatgpt_models()
 
-    async def request_to_chatgpt(self, question: str | None) -> str:
+    async def request_to_chatgpt(self, question: str | None, chat_id: int | None = None) -> str:
+        """
+        Answer to the question, previous questions and answers of the chat are sent as its context.
+
+        Questions without context are answered from the cache, concurrent identical ones share one request to chatgpt.
+        """
+        question = question or "Привет!"
+        if conversation := await self.conversations.get_conversation(chat_id):
+            answer = await self.repository.ask_question_with_failover(question=question, conversation=conversation)
+        else:
+            answer = await self._request_to_chatgpt_without_context(question)
+        await self.conversations.add_turn(chat_id, question=question, answer=answer)
+        return answer.text
+
+    async def request_to_chatgpt_stream(
+        self, question: str | None, chat_id: int | None = None
+    ) -> AsyncGenerator[str, None]:
         question = question or "Привет!"
-        chatgpt_model = await self.get_current_chatgpt_model()
-        return await self.repository.ask_question(question=question, chatgpt_model=chatgpt_model)
+        conversation = await self.conversations.get_conversation(chat_id)
+        if not conversation and (cached_answer := await self._get_cached_answer(question)):
+            answer = cached_answer
+            yield answer.text
+        else:
+            answer = ChatGptAnswerDTO()
+            async for chunk in self.repository.ask_question_stream_with_failover(
+                question=question, answer=answer, conversation=conversation
+            ):
+                yield chunk
+            if not conversation:
+                await self.answer_cache.save_answer(question, answer)
+        await self.conversations.add_turn(chat_id, question=question, answer=answer)
 
-    async def request_to_chatgpt_microservice(self, question: str) -> Response:
-        chatgpt_model = await self.get_current_chatgpt_model()
-        return await self.repository.request_to_chatgpt_microservice(question=question, chatgpt_model=chatgpt_model)
+    async def reset_conversation(self, chat_id: int) -> None:
+        await self.conversations.reset(chat_id)
 
     async def get_current_chatgpt_model(self) -> str:
         return await self.repository.get_current_chatgpt_model()
 
+    async def get_chatgpt_models_stats(self) -> list[ChatGptModelStatsDTO]:
+        return await self.repository.get_chatgpt_models_stats()
+
+    async def get_answer_cache_stats(self) -> ChatGptAnswerCacheStatsDTO:
+        return await self.answer_cache.get_stats()
+
     async def change_chatgpt_model_priority(self, model_id: int, priority: int) -> None:
         return await self.repository.change_chatgpt_model_priority(model_id=model_id, priority=priority)
 
@@ -76,85 +139,367 @@ class ChatGptService:
         username: str | None = None,
         first_name: str | None = None,
         last_name: str | None = None,
-        ban_reason: str | None = None,
-        is_active: bool = True,
-        is_superuser: bool = False,
-    ) -> User:
-        return await self.user_service.get_or_create_user_by_id(
+    ) -> UserStateDTO:
+        return await self.user_service.get_or_create_user_state(
             user_id=user_id,
             email=email,
             username=username,
             first_name=first_name,
             last_name=last_name,
-            ban_reason=ban_reason,
-            is_active=is_active,
-            is_superuser=is_superuser,
         )
 
     async def update_bot_user_message_count(self, user_id: int) -> None:
         await self.user_service.update_user_message_count(user_id)
 
+    async def _request_to_chatgpt_without_context(self, question: str) -> ChatGptAnswerDTO:
+        if cached_answer := await self._get_cached_answer(question):
+            return cached_answer
+
+        async def ask_question() -> ChatGptAnswerDTO:
+            answer = await self.repository.ask_question_with_failover(question=question)
+            await self.answer_cache.save_answer(question, answer)
+            return answer
+
+        chatgpt_models = await self.repository.get_chatgpt_models_order()
+        key = (normalize_question(question), tuple(chatgpt_models[: settings.GPT_FAILOVER_MAX_MODELS]))
+        return await self.requests_in_flight.do(key, ask_question)
+
+    async def _get_cached_answer(self, question: str) -> ChatGptAnswerDTO | None:
+        chatgpt_models = await self.repository.get_chatgpt_models_order()
+        return await self.answer_cache.get_answer(question, chatgpt_models[: settings.GPT_FAILOVER_MAX_MODELS])
+
+
+@cache
+def get_speech_to_text_executor() -> ThreadPoolExecutor:
+    """Executor shared by all voice messages of the process, so recognition can't take all cpu of the host"""
+    return ThreadPoolExecutor(max_workers=settings.STT_EXECUTOR_WORKERS, thread_name_prefix="speech_to_text")
+
+
+@cache
+def get_speech_recognition_process_pool() -> ProcessPoolExecutor:
+    """
+    Processes recognizing segments of voice messages in parallel.
+
+    STT_MAX_PROCESSES is the limit of the host, so it is shared between application workers.
+    """
+    max_workers = max(1, settings.STT_MAX_PROCESSES // settings.WORKERS_COUNT)
+    # spawn instead of fork: the parent process runs event loop and threads
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def get_speech_recognition_executor() -> Executor:
+    match settings.STT_RECOGNITION_MODE:
+        case SpeechRecognitionModeEnum.process:
+            return get_speech_recognition_process_pool()
+        case _:
+            return get_speech_to_text_executor()
+
+
+def shutdown_speech_to_text_executors() -> None:
+    if get_speech_to_text_executor.cache_info().currsize:
+        get_speech_to_text_executor().shutdown(wait=False, cancel_futures=True)
+        get_speech_to_text_executor.cache_clear()
+    if get_speech_recognition_process_pool.cache_info().currsize:
+        get_speech_recognition_process_pool().shutdown(wait=False, cancel_futures=True)
+        get_speech_recognition_process_pool.cache_clear()
+
+
+_user_speech_semaphores: WeakValueDictionary[int, asyncio.Semaphore] = WeakValueDictionary()
+
+
+def get_user_speech_semaphore(user_id: int) -> asyncio.Semaphore:
+    """Limit voice messages of one user processed at the same time. Unused semaphores are garbage collected"""
+    if (semaphore := _user_speech_semaphores.get(user_id)) is None:
+        semaphore = asyncio.Semaphore(settings.STT_USER_CONCURRENCY)
+        _user_speech_semaphores[user_id] = semaphore
+    return semaphore
+
+
+class AudioDecodeError(Exception):
+    """ffmpeg has not decoded the whole audio, segments decoded before the failure are already yielded"""
+
 
 class SpeechToTextService:
-    def __init__(self, filename: str) -> None:
-        self.filename = filename
-        self.executor = ThreadPoolExecutor()
-        self.recognizer = Recognizer()
-        self.recognizer.energy_threshold = 50
-        self.text_parts: dict[int, str] = {}
-        self.text_recognised = False
-
-    def get_text_from_audio(self) -> None:
-        self.executor.submit(self._worker)
-
-    def _worker(self) -> Any:
-        self._convert_file_to_wav()
-        self._convert_audio_to_text()
-
-    def _convert_audio_to_text(self) -> None:
-        wav_filename = f"{self.filename}.wav"
-
-        speech = AudioSegment.from_wav(wav_filename)
-        speech_duration = len(speech)
-        pieces = speech_duration // AUDIO_SEGMENT_DURATION + 1
-        ending = speech_duration % AUDIO_SEGMENT_DURATION
-        for i in range(pieces):
-            if i == 0 and pieces == 1:
-                sound_segment = speech[0:ending]
-            elif i == 0:
-                sound_segment = speech[0 : (i + 1) * AUDIO_SEGMENT_DURATION]
-            elif i == (pieces - 1):
-                sound_segment = speech[i * AUDIO_SEGMENT_DURATION - 250 : i * AUDIO_SEGMENT_DURATION + ending]
-            else:
-                sound_segment = speech[i * AUDIO_SEGMENT_DURATION - 250 : (i + 1) * AUDIO_SEGMENT_DURATION]
-            self.text_parts[i] = self._recognize_by_google(sound_segment)
-
-        self.text_recognised = True
-
-        # clean temp voice message main files
+    """
+    Recognize voice message in memory.
+
+    ffmpeg decodes the message from stdin to raw pcm on stdout. Its output is read incrementally
+    and each segment is recognized as soon as it is decoded, so recognition of long messages starts
+    before the whole message is converted. The recognizer reads segments as in-memory wav,
+    nothing is written to disk.
+    """
+
+    decode_command: Sequence[str] = (
+        "ffmpeg",
+        *("-loglevel", "quiet"),
+        *("-i", "pipe:0"),
+        "-vn",
+        *("-f", "s16le", "-ac", "1", "-ar", str(AUDIO_SAMPLE_RATE)),
+        "pipe:1",
+    )
+    pcm_read_size = 64 * 1024
+
+    def __init__(self, audio: bytes | bytearray, recognition_executor: Executor | None = None) -> None:
+        self.audio = audio
+        self.recognition_executor = recognition_executor or get_speech_recognition_executor()
+        # recognition is cpu bound and holds GIL, so segments are recognized in parallel only by processes
+        self.parallel = isinstance(self.recognition_executor, ProcessPoolExecutor)
+
+    async def get_text_from_audio(self) -> AsyncGenerator[str, None]:
+        """Yield text of audio segments in order, each one as soon as it is recognized"""
+        async for text in self.recognize_segments(self._decode_audio()):
+            yield text
+
+    async def recognize_segments(self, segments: AsyncIterator[bytes]) -> AsyncGenerator[str, None]:
+        """
+        Recognize pcm segments and yield their text in order.
+
+        Segments are read in background task, so decoding goes on while the segments are recognized.
+        In parallel mode each segment is submitted as soon as it is read, the pool size limits used processes.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[bytes | asyncio.Future[str] | None] = asyncio.Queue()
+
+        async def read_segments() -> None:
+            try:
+                async for segment in segments:
+                    queue.put_nowait(self._recognize(loop, segment) if self.parallel else segment)
+            finally:
+                queue.put_nowait(None)
+
+        reader = asyncio.create_task(read_segments())
         try:
-            os.remove(wav_filename)
-            os.remove(self.filename)
-        except FileNotFoundError as error:
-            logger.error("error temps files not deleted", error=error, filenames=[self.filename, wav_filename])
-
-    def _convert_file_to_wav(self) -> None:
-        new_filename = self.filename + ".wav"
-        cmd = ["ffmpeg", "-loglevel", "quiet", "-i", self.filename, "-vn", new_filename]
+            while (item := await queue.get()) is not None:
+                yield await (item if isinstance(item, asyncio.Future) else self._recognize(loop, item))
+            # raise decoding error if any
+            await reader
+        finally:
+            reader.cancel()
+            while not queue.empty():
+                if isinstance(item := queue.get_nowait(), asyncio.Future):
+                    item.cancel()
+
+    def _recognize(self, loop: asyncio.AbstractEventLoop, segment: bytes) -> "asyncio.Future[str]":
+        return loop.run_in_executor(
+            self.recognition_executor, recognize_speech, segment, AUDIO_SAMPLE_RATE, AUDIO_SAMPLE_WIDTH
+        )
+
+    async def _decode_audio(self) -> AsyncGenerator[bytes, None]:
+        """
+        Yield pcm segments while ffmpeg decodes the audio.
+
+        Segments are AUDIO_SEGMENT_DURATION long, each one after the first starts AUDIO_SEGMENT_OVERLAP earlier.
+        The last segment is what is left after the previous one.
+        Segments are yielded before ffmpeg exits, so if it fails, the segments decoded before the failure
+        are already yielded and AudioDecodeError is raised after them.
+        """
+        # milliseconds to bytes of mono pcm
+        ms_size = AUDIO_SAMPLE_RATE * AUDIO_SAMPLE_WIDTH // 1000
+        segment_size = AUDIO_SEGMENT_DURATION * ms_size
+        overlap_size = AUDIO_SEGMENT_OVERLAP * ms_size
         try:
-            subprocess.run(args=cmd, check=True)  # noqa: S603
-            logger.info("file has been converted to wav", filename=new_filename)
-        except Exception as error:
-            logger.error("cant convert voice", error=error, filename=self.filename)
-
-    def _recognize_by_google(self, sound_segment: AudioSegment) -> str:
-        with tempfile.NamedTemporaryFile(delete=True) as tmpfile:
-            tmpfile.write(sound_segment.raw_data)
-            sound_segment.export(tmpfile, format="wav")
-            with AudioFile(tmpfile) as source:
-                audio_text = self.recognizer.listen(source)
-                try:
-                    return self.recognizer.recognize_sphinx(audio_text, language="ru-RU")
-                except SpeechRecognizerError as error:
-                    logger.error("error recognizing text with google", error=error)
-                    raise
+            process = await asyncio.create_subprocess_exec(
+                *self.decode_command,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+        except OSError as error:
+            logger.error("cant convert voice", error=error)
+            raise AudioDecodeError("ffmpeg is not started") from error
+
+        writer = asyncio.create_task(self._write_audio(process))
+        # buffer starts at the beginning of the current segment
+        buffer = bytearray()
+        current_segment_size = segment_size
+        try:
+            while chunk := await process.stdout.read(self.pcm_read_size):  # type: ignore[union-attr]
+                buffer += chunk
+                while len(buffer) >= current_segment_size:
+                    yield bytes(buffer[:current_segment_size])
+                    del buffer[: current_segment_size - overlap_size]
+                    current_segment_size = segment_size + overlap_size
+            if await process.wait():
+                logger.error("cant convert voice", returncode=process.returncode)
+                # the rest of the buffer can be cut in the middle of a word, it is not recognized
+                raise AudioDecodeError(f"ffmpeg exited with code {process.returncode}")
+            if buffer:
+                yield bytes(buffer)
+        finally:
+            writer.cancel()
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+    async def _write_audio(self, process: asyncio.subprocess.Process) -> None:
+        stdin: asyncio.StreamWriter = process.stdin  # type: ignore[assignment]
+        try:
+            stdin.write(self.audio)
+            await stdin.drain()
+            stdin.close()
+        except (BrokenPipeError, ConnectionResetError) as error:
+            # ffmpeg has stopped, the error is logged by its return code
+            logger.warning("voice is not written to ffmpeg", error=error)
+
+
+@dataclass
+class VoiceTranscriptionService:
+    """Transcriptions of voice messages, forwarded messages are not recognized again"""
+
+    repository: VoiceTranscriptionRepository
+    max_size: int
+
+    @classmethod
+    def build(cls) -> "VoiceTranscriptionService":
+        repository = VoiceTranscriptionRepository(db=get_database())
+        return VoiceTranscriptionService(repository=repository, max_size=settings.STT_TRANSCRIPTION_CACHE_SIZE)
+
+    async def get_text_parts(self, file_unique_id: str) -> list[str] | None:
+        if not self.max_size:
+            return None
+        return await self.repository.get_text_parts(file_unique_id)
+
+    async def save_text_parts(self, file_unique_id: str, text_parts: list[str]) -> None:
+        if not self.max_size or not text_parts:
+            return
+        await self.repository.save_text_parts(file_unique_id, text_parts=text_parts, max_size=self.max_size)
+
+
+@cache
+def get_chatgpt_requests_in_flight() -> SingleFlight[tuple[str, tuple[str, ...]], ChatGptAnswerDTO]:
+    """Requests to chatgpt of this process by normalized question and models"""
+    return SingleFlight()
+
+
+@dataclass
+class ChatGptAnswerCacheMetrics:
+    hits: int = 0
+    misses: int = 0
+    # monotonic time of the last eviction made by this process
+    evicted_at: float = float("-inf")
+
+
+@cache
+def get_chatgpt_answer_cache_metrics() -> ChatGptAnswerCacheMetrics:
+    """Hits and misses of the answer cache in this process"""
+    return ChatGptAnswerCacheMetrics()
+
+
+@dataclass
+class ChatGptAnswerCacheService:
+    """
+    Answers to repeated questions shared by all workers.
+
+    Questions are compared case and whitespace insensitive and without punctuation at the ends.
+    Only successful answers are cached, each one for the model which has given it.
+    """
+
+    repository: ChatGptAnswerRepository
+    metrics: ChatGptAnswerCacheMetrics
+    max_size: int
+    ttl: float
+    max_question_length: int
+    evict_interval: float
+
+    @classmethod
+    def build(cls) -> "ChatGptAnswerCacheService":
+        return ChatGptAnswerCacheService(
+            repository=ChatGptAnswerRepository(db=get_database()),
+            metrics=get_chatgpt_answer_cache_metrics(),
+            max_size=settings.GPT_ANSWER_CACHE_SIZE,
+            ttl=settings.GPT_ANSWER_CACHE_TTL,
+            max_question_length=settings.GPT_ANSWER_CACHE_MAX_QUESTION_LENGTH,
+            evict_interval=settings.GPT_ANSWER_CACHE_EVICT_INTERVAL,
+        )
+
+    async def get_answer(self, question: str, chatgpt_models: list[str]) -> ChatGptAnswerDTO | None:
+        if not (cache_key := self._get_cache_key(question)) or not chatgpt_models:
+            return None
+        answer = await self.repository.get_answer(cache_key, chatgpt_models=chatgpt_models, ttl=self.ttl)
+        if answer:
+            self.metrics.hits += 1
+        else:
+            self.metrics.misses += 1
+        return answer
+
+    async def save_answer(self, question: str, answer: ChatGptAnswerDTO) -> None:
+        # interrupted and error answers are never cached
+        if not answer.is_complete or not answer.chatgpt_model or not answer.text.strip():
+            return
+        if not (cache_key := self._get_cache_key(question)):
+            return
+        await self.repository.save_answer(cache_key, chatgpt_model=answer.chatgpt_model, answer=answer.text)
+        # eviction takes the write lock again, so it is made once in the interval instead of on each save
+        now = time.monotonic()
+        if now - self.metrics.evicted_at >= self.evict_interval:
+            self.metrics.evicted_at = now
+            await self.repository.evict_answers(max_size=self.max_size, ttl=self.ttl)
+
+    async def get_stats(self) -> ChatGptAnswerCacheStatsDTO:
+        size, total_hits = await self.repository.get_size_and_total_hits()
+        requests = self.metrics.hits + self.metrics.misses
+        return ChatGptAnswerCacheStatsDTO(
+            hits=self.metrics.hits,
+            misses=self.metrics.misses,
+            hit_rate=self.metrics.hits / requests if requests else 0,
+            size=size,
+            total_hits=total_hits,
+        )
+
+    def _get_cache_key(self, question: str) -> str | None:
+        """Normalized question or None if the question is not cached"""
+        if not self.max_size or len(question) > self.max_question_length:
+            return None
+        return normalize_question(question) or None
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split()).strip(QUESTION_EDGE_PUNCTUATION)
+
+
+@dataclass
+class ChatConversationService:
+    """
+    Context of chat conversations: the last `max_turns` questions with answers within `max_chars` characters.
+
+    Only answers received to the end are remembered, the oldest turns are dropped first.
+    """
+
+    repository: ChatConversationRepository
+    max_turns: int
+    max_chars: int
+    expire: float
+
+    @classmethod
+    def build(cls) -> "ChatConversationService":
+        return ChatConversationService(
+            repository=ChatConversationRepository(db=get_database()),
+            max_turns=settings.GPT_CONVERSATION_MAX_TURNS,
+            max_chars=settings.GPT_CONVERSATION_MAX_CHARS,
+            expire=settings.GPT_CONVERSATION_EXPIRE,
+        )
+
+    async def get_conversation(self, chat_id: int | None) -> tuple[ConversationTurn, ...]:
+        if not self.max_turns or chat_id is None:
+            return ()
+        return await self.repository.get_turns(chat_id, expire=self.expire)
+
+    async def add_turn(self, chat_id: int | None, question: str, answer: ChatGptAnswerDTO) -> None:
+        if not self.max_turns or chat_id is None or not answer.is_complete:
+            return
+        turn = ConversationTurn(question=question, answer=answer.text)
+        await self.repository.update_turns(chat_id, lambda turns: self._trim((*turns, turn)), expire=self.expire)
+
+    async def reset(self, chat_id: int) -> None:
+        await self.repository.delete_turns(chat_id)
+
+    async def delete_expired(self) -> None:
+        await self.repository.delete_expired(expire=self.expire)
+
+    def _trim(self, turns: tuple[ConversationTurn, ...]) -> tuple[ConversationTurn, ...]:
+        turns = turns[-self.max_turns :]
+        chars = sum(len(turn.question) + len(turn.answer) for turn in turns)
+        while turns and chars > self.max_chars:
+            chars -= len(turns[0].question) + len(turns[0].answer)
+            turns = turns[1:]
+        return turns
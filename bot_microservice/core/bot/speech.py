@@ -0,0 +1,40 @@
+"""
+Speech recognition of one audio segment.
+
+Module is kept free of application imports: its functions are executed in worker processes
+of speech recognition process pool, which import it on start.
+"""
+
+import io
+import wave
+
+from loguru import logger
+from speech_recognition import (
+    AudioFile,
+    Recognizer,
+    UnknownValueError as SpeechRecognizerError,
+)
+
+
+def pcm_to_wav(pcm: bytes | memoryview, sample_rate: int, sample_width: int) -> io.BytesIO:
+    wav_file = io.BytesIO()
+    with wave.open(wav_file, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(sample_width)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    wav_file.seek(0)
+    return wav_file
+
+
+def recognize_speech(pcm: bytes | memoryview, sample_rate: int, sample_width: int) -> str:
+    """Recognize mono pcm audio"""
+    recognizer = Recognizer()
+    recognizer.energy_threshold = 50
+    with AudioFile(pcm_to_wav(pcm, sample_rate=sample_rate, sample_width=sample_width)) as source:
+        audio_text = recognizer.listen(source)
+    try:
+        return recognizer.recognize_sphinx(audio_text, language="ru-RU")
+    except SpeechRecognizerError as error:
+        logger.error("error recognizing text with sphinx", error=error)
+        raise
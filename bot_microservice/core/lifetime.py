@@ -1,8 +1,14 @@
 from typing import Awaitable, Callable
 
 from fastapi import FastAPI
+from loguru import logger
 
+from core.auth.counters import get_user_question_counter
+from core.bot.prober import get_chatgpt_model_prober
+from core.bot.rate_limiter import RateLimiter
+from core.bot.services import ChatConversationService, shutdown_speech_to_text_executors
 from infra.database.db_adapter import Database
+from infra.http_client import close_chatgpt_client, get_chatgpt_client
 
 
 def startup(app: FastAPI, database: Database) -> Callable[[], Awaitable[None]]:
@@ -20,6 +26,12 @@ def startup(app: FastAPI, database: Database) -> Callable[[], Awaitable[None]]:
 
     async def _startup() -> None:
         _setup_db(app, database)
+        await _check_db_pragmas(database)
+        _setup_chatgpt_client(app)
+        _setup_user_question_counter(app)
+        _setup_chatgpt_model_prober(app)
+        await _delete_idle_rate_limit_buckets()
+        await _delete_expired_chat_conversations()
 
     return _startup
 
@@ -34,7 +46,11 @@ def shutdown(app: FastAPI) -> Callable[[], Awaitable[None]]:
     """
 
     async def _shutdown() -> None:
-        await app.state.db_engine.dispose()
+        await app.state.chatgpt_model_prober.stop()
+        await app.state.user_question_counter.stop()
+        await app.state.db.dispose()
+        await close_chatgpt_client()
+        shutdown_speech_to_text_executors()
 
     return _shutdown
 
@@ -43,11 +59,88 @@ def _setup_db(app: FastAPI, database: Database) -> None:
     """
     Create connection to the database.
 
-    This function creates SQLAlchemy engine instance,
+    This function stores SQLAlchemy engine instance of the process-wide database,
     session_factory for creating sessions
-    and stores them in the application's state property.
+    and the database itself in the application's state property.
 
     :param app: fastAPI application.
     """
+    app.state.db = database
     app.state.db_engine = database.async_engine
     app.state.db_session_factory = database._async_session_factory
+
+
+async def _check_db_pragmas(database: Database) -> None:
+    """
+    Log effective sqlite pragmas.
+
+    Some of them can silently fall back to defaults, e.g. WAL journal mode is not supported on network filesystems.
+
+    :param database: process-wide database.
+    """
+    pragmas = await database.get_sqlite_pragmas()
+    logger.info("sqlite pragmas", **pragmas)
+    if str(pragmas["journal_mode"]).lower() != database.sqlite_pragmas["journal_mode"]:
+        logger.warning(
+            "sqlite journal mode is not applied",
+            expected=database.sqlite_pragmas["journal_mode"],
+            actual=pragmas["journal_mode"],
+        )
+
+
+def _setup_chatgpt_client(app: FastAPI) -> None:
+    """
+    Create http client to chatgpt microservice.
+
+    The client keeps connections alive between requests and is shared
+    by api handlers and bot handlers of the process.
+
+    :param app: fastAPI application.
+    """
+    app.state.chatgpt_client = get_chatgpt_client()
+
+
+def _setup_user_question_counter(app: FastAPI) -> None:
+    """
+    Start periodic flush of users question counts.
+
+    Pending counts are flushed on shutdown before the database is disposed.
+
+    :param app: fastAPI application.
+    """
+    counter = get_user_question_counter()
+    counter.start()
+    app.state.user_question_counter = counter
+
+
+def _setup_chatgpt_model_prober(app: FastAPI) -> None:
+    """
+    Start background availability checks of chatgpt models.
+
+    Bot healthcheck answers from the results of the last check.
+    If probe interval is 0, models are checked on each healthcheck instead.
+
+    :param app: fastAPI application.
+    """
+    prober = get_chatgpt_model_prober()
+    if prober.interval:
+        prober.start()
+    app.state.chatgpt_model_prober = prober
+
+
+async def _delete_idle_rate_limit_buckets() -> None:
+    """
+    Delete rate limit buckets of users who have not asked questions for a long time.
+
+    Such buckets are full, so deleting them doesn't change the limits.
+    """
+    await RateLimiter.build().delete_idle_buckets()
+
+
+async def _delete_expired_chat_conversations() -> None:
+    """
+    Delete conversations of chats inactive longer than the conversation expire time.
+
+    Such conversations are already treated as empty, so deleting them doesn't change the context of chats.
+    """
+    await ChatConversationService.build().delete_expired()
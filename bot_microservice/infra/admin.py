@@ -1,4 +1,4 @@
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 from sqladmin import Admin, ModelView
 from sqlalchemy import Select, desc, select
@@ -6,7 +6,9 @@ from sqlalchemy.orm import contains_eager, load_only
 from starlette.requests import Request
 
 from core.auth.models.users import AccessToken, User, UserQuestionCount
-from core.bot.models.chatgpt import ChatGptModels
+from core.auth.repository import user_states_cache
+from core.bot.models.chatgpt import ChatGptAnswer, ChatGptModels
+from core.bot.repository import chatgpt_models_cache
 from core.utils import build_uri
 from settings.config import settings
 
@@ -25,6 +27,27 @@ class ChatGptAdmin(ModelView, model=ChatGptModels):
     can_create = False
     can_delete = False
 
+    async def after_model_change(self, data: dict[str, Any], model: Any, is_created: bool, request: Request) -> None:
+        chatgpt_models_cache.invalidate()
+
+
+class ChatGptAnswerAdmin(ModelView, model=ChatGptAnswer):
+    name = "ChatGPT answer"
+    name_plural = "ChatGPT answers cache"
+    column_list = [
+        ChatGptAnswer.question,
+        ChatGptAnswer.model,
+        ChatGptAnswer.hits,
+        ChatGptAnswer.created_at,
+        ChatGptAnswer.last_used_at,
+    ]
+    column_searchable_list = [ChatGptAnswer.question]
+    column_sortable_list = [ChatGptAnswer.hits, ChatGptAnswer.created_at, ChatGptAnswer.last_used_at]
+    column_default_sort = ("last_used_at", True)
+
+    can_create = False
+    can_edit = False
+
 
 class UserAdmin(ModelView, model=User):
     name = "User"
@@ -68,6 +91,12 @@ class UserAdmin(ModelView, model=User):
             )
         ).order_by(desc(UserQuestionCount.question_count))
 
+    async def after_model_change(self, data: dict[str, Any], model: Any, is_created: bool, request: Request) -> None:
+        user_states_cache.invalidate(model.id)
+
+    async def after_model_delete(self, model: Any, request: Request) -> None:
+        user_states_cache.invalidate(model.id)
+
 
 class AccessTokenAdmin(ModelView, model=AccessToken):
     name = "API access token"
@@ -85,6 +114,7 @@ def create_admin(application: "Application") -> Admin:
         authentication_backend=None,
     )
     admin.add_view(ChatGptAdmin)
+    admin.add_view(ChatGptAnswerAdmin)
     admin.add_view(UserAdmin)
     admin.add_view(AccessTokenAdmin)
     return admin
@@ -0,0 +1,93 @@
+import os
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Generic, Hashable, TypeVar
+
+from settings.config import DIR_CACHE
+
+KT = TypeVar("KT", bound=Hashable)
+VT = TypeVar("VT")
+
+
+class VersionFile:
+    """
+    Version of cached data shared between all processes of the host.
+
+    Process which changes the data bumps the version, other processes compare it
+    with the version their cache was filled on and drop the cache when it differs.
+    """
+
+    def __init__(self, name: str, directory: Path = DIR_CACHE) -> None:
+        self.path = directory / f"{name}.version"
+
+    def get(self) -> str:
+        try:
+            return self.path.read_text()
+        except FileNotFoundError:
+            return ""
+
+    def bump(self) -> None:
+        # random token instead of counter, so concurrent bumps from different processes can't produce the same version
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(uuid.uuid4().hex)
+        os.replace(tmp_path, self.path)
+
+
+class TTLCache(Generic[KT, VT]):
+    """
+    In-process LRU cache which entries expire after `ttl` seconds.
+
+    If `version_file` is set, the whole cache is dropped as soon as another process bumps the version.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024, version_file: VersionFile | None = None) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.version_file = version_file
+        self._version = version_file.get() if version_file else ""
+        self._data: OrderedDict[KT, tuple[float, VT]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: KT) -> VT | None:
+        self._check_version()
+        if not (item := self._data.get(key)):
+            return None
+        expire_at, value = item
+        if expire_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: KT, value: VT) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: KT) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def invalidate(self, key: KT | None = None) -> None:
+        """Drop the key (or the whole cache) in this process and notify other processes"""
+        if key is None:
+            self.clear()
+        else:
+            self.delete(key)
+        if self.version_file:
+            self.version_file.bump()
+            self._version = self.version_file.get()
+
+    def _check_version(self) -> None:
+        if not self.version_file:
+            return
+        if (version := self.version_file.get()) != self._version:
+            self._data.clear()
+            self._version = version
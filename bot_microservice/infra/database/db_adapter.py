@@ -3,10 +3,10 @@ import pkgutil
 from asyncio import current_task
 from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator
 
 from loguru import logger
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
@@ -16,7 +16,7 @@ from sqlalchemy.ext.asyncio import (
 )
 from sqlalchemy.orm import Session, scoped_session, sessionmaker
 
-from settings.config import AppSettings
+from settings.config import AppSettings, get_settings
 
 
 class Database:
@@ -28,18 +28,38 @@ class Database:
             echo=settings.DB_ECHO,
             execution_options={"isolation_level": "AUTOCOMMIT"},
         )
-        self._async_session_factory = async_scoped_session(
-            async_sessionmaker(
-                autoflush=False,
-                class_=AsyncSession,
-                expire_on_commit=False,
-                bind=self._async_engine,
-            ),
-            scopefunc=current_task,
+        self._async_session_maker = async_sessionmaker(
+            autoflush=False,
+            class_=AsyncSession,
+            expire_on_commit=False,
+            bind=self._async_engine,
         )
+        self._async_session_factory = async_scoped_session(self._async_session_maker, scopefunc=current_task)
         self._sync_engine = create_engine(str(settings.sync_db_url), echo=settings.DB_ECHO)
         self._sync_session_factory = scoped_session(sessionmaker(self._sync_engine))
 
+        self.sqlite_pragmas = settings.sqlite_pragmas
+        event.listen(self._async_engine.sync_engine, "connect", self._set_sqlite_pragmas)
+        event.listen(self._sync_engine, "connect", self._set_sqlite_pragmas)
+
+    def _set_sqlite_pragmas(self, dbapi_connection: Any, _connection_record: Any) -> None:
+        # values come from validated settings: enums and integers, so they are safe to be formatted into query
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma, value in self.sqlite_pragmas.items():
+                cursor.execute(f"PRAGMA {pragma} = {value}")
+        finally:
+            cursor.close()
+
+    async def get_sqlite_pragmas(self) -> dict[str, Any]:
+        """Effective values of configured pragmas"""
+        pragmas = {}
+        async with self._async_engine.connect() as connection:
+            for pragma in self.sqlite_pragmas:
+                result = await connection.exec_driver_sql(f"PRAGMA {pragma}")
+                pragmas[pragma] = result.scalar()
+        return pragmas
+
     def get_sync_db_session(self) -> Session:
         session: Session = self._sync_session_factory()
         try:
@@ -55,9 +75,15 @@ class Database:
     def async_engine(self) -> AsyncEngine:
         return self._async_engine
 
+    async def dispose(self) -> None:
+        """Close all connections of engines pools. Engines can still be used after it."""
+        await self._async_engine.dispose()
+        self._sync_engine.dispose()
+
     @asynccontextmanager
     async def session(self) -> AsyncGenerator[AsyncSession, None]:
-        session: AsyncSession = self._async_session_factory()
+        # new session for each call: the database lives as long as the process, so task scoped sessions would pile up
+        session: AsyncSession = self._async_session_maker()
 
         async with session:
             try:
@@ -68,7 +94,7 @@ class Database:
 
     @asynccontextmanager
     async def get_transaction_session(self) -> AsyncGenerator[AsyncSession, None]:
-        async with self._async_session_factory() as session, session.begin():
+        async with self._async_session_maker() as session, session.begin():
             try:
                 yield session
             except Exception:
@@ -106,6 +132,22 @@ class Database:
             os.remove(self.db_file)
 
 
+_databases: dict[str, Database] = {}
+
+
+def get_database(settings: AppSettings | None = None) -> Database:
+    """
+    Database shared by the whole process.
+
+    Engines and connection pools are built once for each database file, api handlers and bot handlers reuse them.
+    Without `settings` the database of the current settings is returned.
+    """
+    settings = settings or get_settings()
+    if (database := _databases.get(str(settings.db_file))) is None:
+        database = _databases[str(settings.db_file)] = Database(settings=settings)
+    return database
+
+
 def load_all_models() -> None:
     """Load all models from this folder."""
     package_dir = Path(__file__).resolve().parent.parent.parent
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from functools import cache
+from importlib.util import find_spec
+from typing import AsyncIterator
+
+from httpx import AsyncClient, AsyncHTTPTransport, Limits, Timeout, TransportError
+from loguru import logger
+
+from constants import ChatGptCircuitStateEnum
+from settings.config import AppSettings, get_settings
+
+
+class ChatGptClientUnavailableError(Exception):
+    """Request is not sent, chatgpt microservice is failing or too many requests are in flight"""
+
+
+class ChatGptClientGuard:
+    """
+    Circuit breaker and in-flight limit of requests to chatgpt microservice.
+
+    Not more than `max_in_flight` requests are sent at once, the next ones wait for a free slot
+    up to `queue_timeout` seconds. After `failure_threshold` consecutive connection errors or timeouts
+    the circuit is open and requests are rejected without waiting. In `reset_timeout` seconds the circuit
+    is half open: one trial request is sent, its success closes the circuit and its failure opens it again.
+    """
+
+    def __init__(self, max_in_flight: int, queue_timeout: float, failure_threshold: int, reset_timeout: float) -> None:
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._consecutive_failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_progress = False
+
+    @property
+    def state(self) -> ChatGptCircuitStateEnum:
+        if self._opened_at is None:
+            return ChatGptCircuitStateEnum.closed
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            return ChatGptCircuitStateEnum.open
+        return ChatGptCircuitStateEnum.half_open
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[None]:
+        state = self.state
+        is_trial = state == ChatGptCircuitStateEnum.half_open
+        if state == ChatGptCircuitStateEnum.open or (is_trial and self._trial_in_progress):
+            raise ChatGptClientUnavailableError("chatgpt microservice circuit is open")
+        self._trial_in_progress = self._trial_in_progress or is_trial
+        try:
+            try:
+                async with asyncio.timeout(self.queue_timeout):
+                    await self._semaphore.acquire()
+            except TimeoutError as error:
+                raise ChatGptClientUnavailableError("too many requests to chatgpt microservice in flight") from error
+            try:
+                yield
+            except TransportError:
+                self._record_failure()
+                raise
+            else:
+                self._record_success()
+            finally:
+                self._semaphore.release()
+        finally:
+            if is_trial:
+                self._trial_in_progress = False
+
+    def _record_success(self) -> None:
+        if self._opened_at is not None:
+            logger.info("chatgpt microservice circuit is closed")
+        self._consecutive_failures = 0
+        self._opened_at = None
+
+    def _record_failure(self) -> None:
+        self._consecutive_failures += 1
+        if self._consecutive_failures >= self.failure_threshold or self._opened_at is not None:
+            logger.warning("chatgpt microservice circuit is open", consecutive_failures=self._consecutive_failures)
+            self._opened_at = time.monotonic()
+
+
+def build_chatgpt_client(settings: AppSettings) -> AsyncClient:
+    http2 = settings.GPT_HTTP2
+    if http2 and not find_spec("h2"):
+        logger.warning("http2 for chatgpt client is enabled, but h2 package is not installed. Fallback to http1.1")
+        http2 = False
+
+    transport = AsyncHTTPTransport(
+        retries=settings.GPT_HTTP_RETRIES,
+        http2=http2,
+        limits=Limits(
+            max_connections=settings.GPT_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GPT_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.GPT_HTTP_KEEPALIVE_EXPIRY,
+        ),
+    )
+    return AsyncClient(
+        base_url=settings.GPT_BASE_HOST,
+        transport=transport,
+        timeout=Timeout(
+            connect=settings.GPT_CONNECT_TIMEOUT,
+            read=settings.GPT_READ_TIMEOUT,
+            write=settings.GPT_WRITE_TIMEOUT,
+            pool=settings.GPT_POOL_TIMEOUT,
+        ),
+    )
+
+
+@cache
+def get_chatgpt_client() -> AsyncClient:
+    """Http client to chatgpt microservice shared by the whole process."""
+    return build_chatgpt_client(get_settings())
+
+
+async def close_chatgpt_client() -> None:
+    if get_chatgpt_client.cache_info().currsize:
+        await get_chatgpt_client().aclose()
+        get_chatgpt_client.cache_clear()
+
+
+@cache
+def get_chatgpt_client_guard() -> ChatGptClientGuard:
+    """Guard of requests to chatgpt microservice shared by the whole process."""
+    settings = get_settings()
+    return ChatGptClientGuard(
+        max_in_flight=settings.GPT_CLIENT_MAX_IN_FLIGHT,
+        queue_timeout=settings.GPT_CLIENT_QUEUE_TIMEOUT,
+        failure_threshold=settings.GPT_CLIENT_FAILURE_THRESHOLD,
+        reset_timeout=settings.GPT_CLIENT_RESET_TIMEOUT,
+    )
@@ -0,0 +1,45 @@
+import asyncio
+from typing import Any, Callable, Coroutine, Generic, Hashable, TypeVar
+
+KT = TypeVar("KT", bound=Hashable)
+VT = TypeVar("VT")
+
+
+class SingleFlight(Generic[KT, VT]):
+    """
+    Coalesce concurrent calls with the same key into one call.
+
+    The first caller starts the call, callers with the same key which come while it is in flight wait for it
+    and get the same result or exception. Cancelled waiter does not cancel the call for the others,
+    the call is cancelled only when all its waiters are cancelled.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[KT, asyncio.Task[VT]] = {}
+        self._waiters: dict[KT, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: KT, func: Callable[[], Coroutine[Any, Any, VT]]) -> VT:
+        if (call := self._calls.get(key)) is None:
+            call = asyncio.create_task(func())
+            self._calls[key] = call
+            self._waiters[key] = 0
+            call.add_done_callback(lambda _: self._forget(key, call))
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(call)
+        except asyncio.CancelledError:
+            if self._calls.get(key) is call and not call.done():
+                self._waiters[key] -= 1
+                if not self._waiters[key]:
+                    # nobody waits for the result, new callers start a new call
+                    self._forget(key, call)
+                    call.cancel()
+            raise
+
+    def _forget(self, key: KT, call: "asyncio.Task[VT]") -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+            del self._waiters[key]
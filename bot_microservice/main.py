@@ -6,12 +6,13 @@ from fastapi import FastAPI
 from fastapi.responses import UJSONResponse
 
 from api.exceptions import internal_server_error_handler
-from core.bot.app import BotApplication, BotQueue
+from constants import BotQueueDispatcherEnum
+from core.bot.app import BotApplication, BotQueue, ChatLanesBotQueue
 from core.bot.handlers import bot_event_handlers
 from core.lifetime import shutdown, startup
 from core.utils import build_uri
 from infra.admin import create_admin
-from infra.database.db_adapter import Database
+from infra.database.db_adapter import get_database
 from infra.logging_conf import configure_logging
 from routers import api_router
 from settings.config import AppSettings, get_settings
@@ -33,9 +34,10 @@ class Application:
             },
         )
         self.bot_app = bot_app
-        self.db = Database(settings)
-        self._bot_queue = BotQueue(bot_app=self.bot_app)
+        self.db = get_database(settings)
+        self._bot_queue = self._build_bot_queue(settings)
         self.app.state.settings = settings
+        self.app.state.db = self.db
         self.app.state.queue = self._bot_queue
         self.app.state.bot_app = self.bot_app
 
@@ -67,6 +69,24 @@ class Application:
     def bot_queue(self) -> BotQueue:
         return self._bot_queue
 
+    def _build_bot_queue(self, settings: AppSettings) -> BotQueue:
+        match settings.BOT_QUEUE_DISPATCHER:
+            case BotQueueDispatcherEnum.chat_lanes:
+                return ChatLanesBotQueue(
+                    bot_app=self.bot_app,
+                    workers_count=settings.BOT_QUEUE_WORKERS_COUNT,
+                    maxsize=settings.BOT_QUEUE_MAXSIZE,
+                    overload_policy=settings.BOT_QUEUE_OVERLOAD_POLICY,
+                    lane_idle_timeout=settings.BOT_QUEUE_CHAT_LANE_IDLE_TIMEOUT,
+                )
+            case _:
+                return BotQueue(
+                    bot_app=self.bot_app,
+                    workers_count=settings.BOT_QUEUE_WORKERS_COUNT,
+                    maxsize=settings.BOT_QUEUE_MAXSIZE,
+                    overload_policy=settings.BOT_QUEUE_OVERLOAD_POLICY,
+                )
+
     def configure_bot_hooks(self) -> None:
         if self.bot_app.start_with_webhook:
             self.app.add_event_handler("startup", self._bot_start_up)
@@ -78,7 +98,7 @@ class Application:
     async def _bot_start_up(self) -> None:
         await self.bot_app.set_webhook()
         loop = asyncio.get_event_loop()
-        loop.create_task(self.app.state.queue.get_updates_from_queue())
+        self._bot_queue_task = loop.create_task(self.app.state.queue.get_updates_from_queue())
 
     async def _bot_shutdown(self) -> None:
         await self.bot_app.shutdown()
@@ -1,14 +1,24 @@
 from functools import cache, cached_property
-from os import environ
+from os import cpu_count, environ
 from pathlib import Path
 from typing import Any
 
 from dotenv import load_dotenv
-from pydantic import SecretStr, model_validator
+from pydantic import Field, SecretStr, model_validator
 from pydantic_settings import BaseSettings
 from yarl import URL
 
-from constants import API_PREFIX, CHATGPT_BASE_URI, LogLevelEnum
+from constants import (
+    API_PREFIX,
+    CHATGPT_BASE_URI,
+    BotQueueDispatcherEnum,
+    BotQueueOverloadPolicyEnum,
+    LogLevelEnum,
+    SpeechRecognitionModeEnum,
+    SqliteJournalModeEnum,
+    SqliteSynchronousEnum,
+    SqliteTempStoreEnum,
+)
 from core.utils import build_uri
 
 BASE_DIR = Path(__file__).parent.parent
@@ -18,6 +28,9 @@ SHARED_DIR.mkdir(exist_ok=True)
 DIR_LOGS = SHARED_DIR.joinpath("logs")
 DIR_LOGS.mkdir(exist_ok=True)
 
+DIR_CACHE = SHARED_DIR.joinpath("cache")
+DIR_CACHE.mkdir(exist_ok=True)
+
 env_path = f"{BASE_DIR}/settings/.env"
 
 if environ.get("STAGE") == "runtests":
@@ -78,6 +91,31 @@ class AppSettings(SentrySettings, LoggingSettings, BaseSettings):
     # telegram settings
     TELEGRAM_API_TOKEN: str = "123456789:AABBCCDDEEFFaabbccddeeff-1234567890"
     START_WITH_WEBHOOK: bool = False
+    # outgoing messages are throttled to stay within telegram flood limits. Limits are of the whole bot,
+    # each of WORKERS_COUNT application workers throttles its own messages by an equal share of them,
+    # messages to one chat can be sent by different workers, so per chat limits hold only on average
+    TELEGRAM_SEND_GLOBAL_PER_SECOND: float = Field(default=30, gt=0)
+    TELEGRAM_SEND_CHAT_PER_SECOND: float = Field(default=1, gt=0)
+    TELEGRAM_SEND_GROUP_PER_MINUTE: float = Field(default=20, gt=0)
+    # messages which can be sent to one chat at once before throttling starts
+    TELEGRAM_SEND_CHAT_BURST: int = Field(default=3, gt=0)
+    # times a request is repeated after telegram asks to retry later
+    TELEGRAM_SEND_MAX_RETRIES: int = Field(default=3, ge=0)
+
+    # ==== bot updates queue settings ====
+    # quantity of workers processing webhook updates. 0 - each update is processed in a separate task
+    BOT_QUEUE_WORKERS_COUNT: int = Field(default=0, ge=0)
+    # max quantity of updates waiting in queue. 0 - queue size is unlimited.
+    # For "queue" dispatcher it requires BOT_QUEUE_WORKERS_COUNT, otherwise updates don't wait in queue
+    BOT_QUEUE_MAXSIZE: int = Field(default=0, ge=0)
+    # what to do with a new update when the queue is full
+    BOT_QUEUE_OVERLOAD_POLICY: BotQueueOverloadPolicyEnum = BotQueueOverloadPolicyEnum.reject
+    # "queue" - updates are processed concurrently without any order,
+    # "chat_lanes" - updates of one chat are processed in order, updates of different chats in parallel.
+    # For "chat_lanes" BOT_QUEUE_WORKERS_COUNT limits quantity of chats processed at the same time
+    BOT_QUEUE_DISPATCHER: BotQueueDispatcherEnum = BotQueueDispatcherEnum.queue
+    # seconds after which an idle chat lane is removed
+    BOT_QUEUE_CHAT_LANE_IDLE_TIMEOUT: float = Field(default=60, gt=0)
 
     # domain settings
     DOMAIN: str = "https://localhost"
@@ -86,9 +124,132 @@ class AppSettings(SentrySettings, LoggingSettings, BaseSettings):
 
     DB_NAME: str = "chatgpt.db"
     DB_ECHO: bool = False
+    # sqlite pragmas applied to each new connection
+    DB_JOURNAL_MODE: SqliteJournalModeEnum = SqliteJournalModeEnum.WAL
+    DB_SYNCHRONOUS: SqliteSynchronousEnum = SqliteSynchronousEnum.NORMAL
+    # negative value - size in KiB, positive - quantity of pages
+    DB_CACHE_SIZE: int = -64000
+    # bytes of database file mapped to memory, 0 - disabled
+    DB_MMAP_SIZE: int = Field(default=256 * 1024 * 1024, ge=0)
+    DB_TEMP_STORE: SqliteTempStoreEnum = SqliteTempStoreEnum.MEMORY
+    # milliseconds to wait for a lock before "database is locked" error
+    DB_BUSY_TIMEOUT: int = Field(default=5000, ge=0)
+    # users question counts are accumulated in memory and written in one batch
+    # every USER_QUESTION_COUNT_FLUSH_INTERVAL seconds or when USER_QUESTION_COUNT_FLUSH_SIZE users are pending
+    USER_QUESTION_COUNT_FLUSH_INTERVAL: float = Field(default=5, gt=0)
+    USER_QUESTION_COUNT_FLUSH_SIZE: int = Field(default=100, gt=0)
+    # seconds to cache ban status and existence of telegram users. Changes through admin invalidate it immediately
+    USER_STATE_CACHE_TTL: float = Field(default=300, ge=0)
+    USER_STATE_CACHE_MAXSIZE: int = Field(default=10000, gt=0)
+    # token buckets limiting questions of each user and of all users together, shared by workers through the database.
+    # RATE_LIMIT_*_BURST questions can be asked at once, then buckets are refilled by RATE_LIMIT_*_PER_MINUTE.
+    # 0 per minute - limit is disabled
+    RATE_LIMIT_USER_PER_MINUTE: float = Field(default=6, ge=0)
+    RATE_LIMIT_USER_BURST: int = Field(default=10, gt=0)
+    RATE_LIMIT_GLOBAL_PER_MINUTE: float = Field(default=300, ge=0)
+    RATE_LIMIT_GLOBAL_BURST: int = Field(default=100, gt=0)
+
+    # ==== speech to text settings ====
+    # threads of the process used to recognize voice messages
+    STT_EXECUTOR_WORKERS: int = Field(default=4, gt=0)
+    # voice messages of one user processed at the same time, the next ones wait
+    STT_USER_CONCURRENCY: int = Field(default=1, gt=0)
+    # "thread" - segments of a voice message are recognized one by one in STT_EXECUTOR_WORKERS threads,
+    # "process" - segments are recognized in parallel in a process pool
+    STT_RECOGNITION_MODE: SpeechRecognitionModeEnum = SpeechRecognitionModeEnum.thread
+    # recognition processes of the host, shared equally between WORKERS_COUNT application workers, not less than them
+    STT_MAX_PROCESSES: int = Field(default=cpu_count() or 1, gt=0)
+    # transcriptions of voice messages kept in database, the least recently used are evicted. 0 - disabled
+    STT_TRANSCRIPTION_CACHE_SIZE: int = Field(default=1000, ge=0)
+    # ask recognized voice messages to chatgpt and send answers after the text.
+    # Each part of a long message is asked as soon as it is recognized
+    STT_ANSWER_WITH_GPT: bool = False
 
     # ==== gpt settings ====
     GPT_BASE_HOST: str = "http://chathpt_chat_service:8858"
+    # connection pool of http client to chatgpt microservice
+    GPT_HTTP_MAX_CONNECTIONS: int = Field(default=100, gt=0)
+    GPT_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = Field(default=20, ge=0)
+    GPT_HTTP_KEEPALIVE_EXPIRY: float = Field(default=30, ge=0)
+    GPT_HTTP_RETRIES: int = Field(default=3, ge=0)
+    # http/2 requires `h2` package to be installed: pip install httpx[http2]
+    GPT_HTTP2: bool = False
+    # timeouts in seconds
+    GPT_CONNECT_TIMEOUT: float = Field(default=5, gt=0)
+    GPT_READ_TIMEOUT: float = Field(default=50, gt=0)
+    GPT_WRITE_TIMEOUT: float = Field(default=5, gt=0)
+    GPT_POOL_TIMEOUT: float = Field(default=5, gt=0)
+    # requests to chatgpt microservice sent at once by the process, the next ones wait for a free slot
+    GPT_CLIENT_MAX_IN_FLIGHT: int = Field(default=50, gt=0)
+    # seconds to wait for a free slot, after that user gets "service is busy" answer
+    GPT_CLIENT_QUEUE_TIMEOUT: float = Field(default=10, ge=0)
+    # consecutive connection errors and timeouts after which requests are not sent to chatgpt microservice
+    GPT_CLIENT_FAILURE_THRESHOLD: int = Field(default=5, ge=1)
+    # seconds after which one trial request is sent to check whether chatgpt microservice is back
+    GPT_CLIENT_RESET_TIMEOUT: float = Field(default=30, ge=0)
+    # seconds to cache the current model in process. Changes through api and admin invalidate it immediately
+    GPT_MODELS_CACHE_TTL: float = Field(default=60, ge=0)
+    # send answer to telegram by parts while it is generating
+    GPT_STREAM_ANSWERS: bool = False
+    # min seconds between edits of the streamed answer, telegram allows about 1 edit per second in a chat
+    GPT_STREAM_EDIT_INTERVAL: float = Field(default=1.5, ge=0)
+    # min quantity of new characters to edit the streamed answer
+    GPT_STREAM_EDIT_MIN_CHARS: int = Field(default=50, ge=1)
+    # quantity of models in order of priority which are asked one after another if the previous one fails
+    GPT_FAILOVER_MAX_MODELS: int = Field(default=3, ge=1)
+    # seconds without any byte of the answer after which the next model is asked in parallel, 0 - disabled
+    GPT_HEDGE_DELAY: float = Field(default=0, ge=0)
+    # order models by score which is calculated from priority, latency and failures of the recent answers
+    GPT_ADAPTIVE_RANKING: bool = True
+    # weight of the last answer in moving averages of latency and failure rate
+    GPT_SCORE_EWMA_ALPHA: float = Field(default=0.2, gt=0, le=1)
+    # average answer latency in seconds which halves model score
+    GPT_SCORE_LATENCY_WEIGHT: float = Field(default=10, gt=0)
+    # consecutive failures after which model is moved to the end of the order
+    GPT_CIRCUIT_FAILURE_THRESHOLD: int = Field(default=3, ge=1)
+    # seconds after which model with open circuit is asked again
+    GPT_CIRCUIT_RESET_TIMEOUT: float = Field(default=60, ge=0)
+    # seconds between background availability checks of all models, 0 - models are checked on each healthcheck
+    GPT_PROBE_INTERVAL: float = Field(default=60, ge=0)
+    # quantity of models which are checked at once
+    GPT_PROBE_CONCURRENCY: int = Field(default=3, ge=1)
+    # seconds to wait for an answer of the checked model
+    GPT_PROBE_TIMEOUT: float = Field(default=30, gt=0)
+    # answers to repeated questions kept in database, the least recently used are evicted. 0 - disabled
+    GPT_ANSWER_CACHE_SIZE: int = Field(default=1000, ge=0)
+    # seconds after which cached answer is asked again
+    GPT_ANSWER_CACHE_TTL: float = Field(default=24 * 60 * 60, gt=0)
+    # longer questions are not cached, they are rarely repeated word for word
+    GPT_ANSWER_CACHE_MAX_QUESTION_LENGTH: int = Field(default=300, gt=0)
+    # seconds between evictions of expired and the least recently used answers, the cache can outgrow its size
+    # by answers saved in between. 0 - evicted on each save
+    GPT_ANSWER_CACHE_EVICT_INTERVAL: float = Field(default=60, ge=0)
+    # previous questions and answers of the chat sent with the question as its context. 0 - disabled
+    GPT_CONVERSATION_MAX_TURNS: int = Field(default=5, ge=0)
+    # max characters of the context, the oldest turns are dropped first
+    GPT_CONVERSATION_MAX_CHARS: int = Field(default=4000, gt=0)
+    # seconds of chat inactivity after which its context is forgotten
+    GPT_CONVERSATION_EXPIRE: float = Field(default=24 * 60 * 60, gt=0)
+    # contexts of recently active chats kept in memory of the process, the others are read from database
+    GPT_CONVERSATION_CACHE_SIZE: int = Field(default=10000, ge=0)
+    # seconds to keep context of a chat in memory, its version is checked in database before each use
+    GPT_CONVERSATION_CACHE_TTL: float = Field(default=60, ge=0)
+
+    @model_validator(mode="after")
+    def validate_bot_queue_maxsize(self) -> "AppSettings":
+        # without workers each update leaves the queue at once to a separate task, so the queue is never full
+        is_queue_dispatcher = self.BOT_QUEUE_DISPATCHER is BotQueueDispatcherEnum.queue
+        if is_queue_dispatcher and self.BOT_QUEUE_MAXSIZE and not self.BOT_QUEUE_WORKERS_COUNT:
+            raise RuntimeError("bot queue workers count must be set to limit bot queue size")
+        return self
+
+    @model_validator(mode="after")
+    def validate_stt_max_processes(self) -> "AppSettings":
+        # each application worker needs at least one recognition process
+        is_process_mode = self.STT_RECOGNITION_MODE is SpeechRecognitionModeEnum.process
+        if is_process_mode and self.STT_MAX_PROCESSES < self.WORKERS_COUNT:
+            raise RuntimeError("speech recognition processes must be not less than workers count")
+        return self
 
     @model_validator(mode="before")
     def validate_boolean_fields(self) -> Any:
@@ -101,6 +262,10 @@ class AppSettings(SentrySettings, LoggingSettings, BaseSettings):
             "DEBUG",
             "ENABLE_GRAYLOG",
             "ENABLE_SENTRY",
+            "GPT_HTTP2",
+            "GPT_STREAM_ANSWERS",
+            "GPT_ADAPTIVE_RANKING",
+            "STT_ANSWER_WITH_GPT",
         ):
             setting_value: str | None = values_dict.get(value)
             if setting_value and setting_value.lower() == "false":
@@ -133,6 +298,17 @@ class AppSettings(SentrySettings, LoggingSettings, BaseSettings):
     def db_file(self) -> Path:
         return SHARED_DIR / self.DB_NAME
 
+    @cached_property
+    def sqlite_pragmas(self) -> dict[str, str | int]:
+        return {
+            "journal_mode": self.DB_JOURNAL_MODE,
+            "synchronous": self.DB_SYNCHRONOUS,
+            "cache_size": self.DB_CACHE_SIZE,
+            "mmap_size": self.DB_MMAP_SIZE,
+            "temp_store": self.DB_TEMP_STORE,
+            "busy_timeout": self.DB_BUSY_TIMEOUT,
+        }
+
     @cached_property
     def async_db_url(self) -> URL:
         return URL.build(
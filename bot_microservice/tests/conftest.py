@@ -9,10 +9,14 @@ from sqlalchemy.orm import Session, sessionmaker
 from telegram import Bot, User
 from telegram.ext import Application, ApplicationBuilder, ExtBot
 
+from core.auth.repository import user_states_cache
 from core.bot.app import BotApplication
 from core.bot.handlers import bot_event_handlers
-from infra.database.db_adapter import Database
+from core.bot.repository import chatgpt_models_cache, conversations_cache
+from core.bot.scoring import get_model_scoreboard
+from core.bot.services import get_chatgpt_answer_cache_metrics
 from infra.database.meta import meta
+from infra.http_client import get_chatgpt_client_guard
 from main import Application as AppApplication
 from settings.config import AppSettings, get_settings
 from tests.integration.bot.networking import NonchalantHttpxRequest
@@ -84,6 +88,12 @@ def dbsession(engine: Engine) -> Generator[Session, None, None]:
         yield session
     finally:
         meta.drop_all(engine)
+        chatgpt_models_cache.clear()
+        conversations_cache.clear()
+        user_states_cache.clear()
+        get_model_scoreboard().clear()
+        get_chatgpt_client_guard.cache_clear()
+        get_chatgpt_answer_cache_metrics.cache_clear()
         session.close()
         connection.close()
 
@@ -183,10 +193,9 @@ async def main_application(
     bot_app.application.bot = make_bot(BotInfoFactory())
     bot_app.application.bot._bot_user = BotUserFactory()
     fast_api_app = AppApplication(settings=test_settings, bot_app=bot_app)
-    database = Database(test_settings)
-    await database.create_database()
+    await fast_api_app.db.create_database()
     yield fast_api_app
-    await database.drop_database()
+    await fast_api_app.db.drop_database()
 
 
 @pytest.fixture
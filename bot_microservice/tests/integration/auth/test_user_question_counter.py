@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from sqlalchemy.orm import Session
+
+from core.auth.counters import UserQuestionCounter
+from core.auth.models.users import UserQuestionCount
+from core.auth.repository import UserRepository
+from infra.database.db_adapter import get_database
+from main import Application as AppApplication
+from tests.integration.factories.user import UserFactory, UserQuestionCountFactory
+
+pytestmark = [
+    pytest.mark.asyncio,
+    pytest.mark.enable_socket,
+]
+
+
+@pytest.fixture
+def question_counter(main_application: AppApplication) -> UserQuestionCounter:
+    return UserQuestionCounter(repository=UserRepository(db=get_database()), flush_interval=60, flush_size=100)
+
+
+async def test_question_count_is_written_immediately_when_counter_is_not_started(
+    dbsession: Session,
+    question_counter: UserQuestionCounter,
+) -> None:
+    user = UserFactory()
+
+    await question_counter.add(user.id)
+
+    assert dbsession.query(UserQuestionCount).filter_by(user_id=user.id).one().question_count == 1
+    assert question_counter.pending_count == 0
+
+
+async def test_question_counts_are_written_in_one_batch(
+    dbsession: Session,
+    question_counter: UserQuestionCounter,
+) -> None:
+    new_user = UserFactory()
+    existing_user = UserFactory()
+    existing_question_count = UserQuestionCountFactory(user_id=existing_user.id).question_count
+    question_counter.start()
+
+    await question_counter.add(new_user.id)
+    await question_counter.add(new_user.id)
+    await question_counter.add(existing_user.id)
+
+    assert question_counter.pending_count == 2
+    assert dbsession.query(UserQuestionCount).filter_by(user_id=new_user.id).one_or_none() is None
+
+    await question_counter.stop()
+
+    assert question_counter.pending_count == 0
+    assert dbsession.query(UserQuestionCount).filter_by(user_id=new_user.id).one().question_count == 2
+    updated_question_count = dbsession.query(UserQuestionCount).filter_by(user_id=existing_user.id).one()
+    assert updated_question_count.question_count == existing_question_count + 1
+
+
+async def test_question_counts_are_flushed_when_flush_size_is_reached(
+    dbsession: Session,
+    main_application: AppApplication,
+) -> None:
+    users = UserFactory.create_batch(size=2)
+    question_counter = UserQuestionCounter(
+        repository=UserRepository(db=get_database()), flush_interval=60, flush_size=len(users)
+    )
+    question_counter.start()
+
+    for user in users:
+        await question_counter.add(user.id)
+    # let the flush task write the batch
+    for _ in range(10):
+        if not question_counter.pending_count:
+            break
+        await asyncio.sleep(0.01)
+
+    assert dbsession.query(UserQuestionCount).count() == len(users)
+    await question_counter.stop()
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from sqlalchemy.orm import Session
+
+from core.auth.models.users import User
+from core.auth.repository import user_states_cache
+from core.auth.services import UserService
+from main import Application as AppApplication
+from tests.integration.factories.user import UserFactory
+
+pytestmark = [
+    pytest.mark.asyncio,
+    pytest.mark.enable_socket,
+]
+
+
+@pytest.fixture
+def user_service(main_application: AppApplication) -> UserService:
+    return UserService.build()
+
+
+async def test_ban_status_is_cached_until_invalidation(dbsession: Session, user_service: UserService) -> None:
+    user = UserFactory(is_active=True)
+
+    assert (await user_service.check_user_is_banned(user.id)).is_banned is False
+
+    dbsession.query(User).filter_by(id=user.id).update({"is_active": False, "ban_reason": "spam"})
+    dbsession.commit()
+
+    assert (await user_service.check_user_is_banned(user.id)).is_banned is False
+
+    user_states_cache.invalidate(user.id)
+    user_status = await user_service.check_user_is_banned(user.id)
+
+    assert user_status.is_banned is True
+    assert user_status.ban_reason == "spam"
+
+
+async def test_missing_user_is_cached_and_replaced_on_create(dbsession: Session, user_service: UserService) -> None:
+    user_id = 12345
+
+    user_state = await user_service.repository.get_user_state(user_id)
+
+    assert user_state.exists is False
+    assert user_states_cache.get(user_id) == user_state
+
+    created_user_state = await user_service.get_or_create_user_state(user_id=user_id, username="new_user")
+
+    assert created_user_state.exists is True
+    assert created_user_state.is_banned is False
+    assert user_states_cache.get(user_id) == created_user_state
+    assert dbsession.query(User).filter_by(id=user_id).one().username == "new_user"
+
+
+async def test_existing_user_state_is_taken_from_cache(dbsession: Session, user_service: UserService) -> None:
+    user = UserFactory()
+    await user_service.check_user_is_banned(user.id)
+
+    dbsession.query(User).filter_by(id=user.id).delete()
+    dbsession.commit()
+
+    user_state = await user_service.get_or_create_user_state(user_id=user.id)
+
+    assert user_state.exists is True
+    assert dbsession.query(User).filter_by(id=user.id).one_or_none() is None
+
+
+async def test_concurrent_get_or_create_creates_user_once(dbsession: Session, user_service: UserService) -> None:
+    user_id = 54321
+
+    users = await asyncio.gather(
+        *[user_service.get_or_create_user_by_id(user_id=user_id, username="concurrent_user") for _ in range(5)]
+    )
+
+    assert {user.id for user in users} == {user_id}
+    assert dbsession.query(User).filter_by(id=user_id).count() == 1
+
+
+async def test_get_or_create_returns_existing_user_unchanged(dbsession: Session, user_service: UserService) -> None:
+    existing_user = UserFactory()
+
+    user = await user_service.get_or_create_user_by_id(user_id=existing_user.id, username="other_username")
+
+    assert user.username == existing_user.username
+    assert user.hashed_password == existing_user.hashed_password
+
+
+async def test_created_user_without_username_is_named_by_id(dbsession: Session, user_service: UserService) -> None:
+    user_id = 12345
+
+    await user_service.get_or_create_user_state(user_id=user_id, username=None)
+
+    assert dbsession.query(User).filter_by(id=user_id).one().username == str(user_id)
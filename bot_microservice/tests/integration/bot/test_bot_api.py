@@ -6,8 +6,10 @@ from sqlalchemy import desc
 from sqlalchemy.orm import Session
 
 from core.bot.models.chatgpt import ChatGptModels
+from core.bot.scoring import get_model_scoreboard
+from core.bot.services import ChatGptService, get_chatgpt_answer_cache_metrics
 from settings.config import AppSettings
-from tests.integration.factories.bot import ChatGptModelFactory
+from tests.integration.factories.bot import ChatGptAnswerFactory, ChatGptModelFactory
 from tests.integration.factories.user import AccessTokenFactory, UserFactory
 
 pytestmark = [
@@ -49,6 +51,53 @@ async def test_get_chatgpt_models(
     )
 
 
+async def test_get_chatgpt_models_stats(
+    dbsession: Session,
+    rest_client: AsyncClient,
+) -> None:
+    model1 = ChatGptModelFactory(priority=1)
+    model2 = ChatGptModelFactory(priority=0)
+    get_model_scoreboard().record_failure(model1.model)
+    get_model_scoreboard().record_success(model2.model, latency=10, first_byte_latency=0.5)
+
+    response = await rest_client.get(url="/api/chatgpt/models/stats")
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert [model["model"] for model in data] == [model2.model, model1.model]
+    assert_that(data[0]).is_equal_to(
+        {
+            "model": model2.model,
+            "priority": 0,
+            "score": 0.5,
+            "circuit_state": "closed",
+            "requests": 1,
+            "failures": 0,
+            "consecutive_failures": 0,
+            "failure_rate": 0,
+            "latency": 10,
+            "first_byte_latency": 0.5,
+        },
+        ignore="latency_histogram",
+    )
+    assert data[0]["latency_histogram"]["<=10"] == 1
+    assert data[1]["failures"] == 1
+
+
+async def test_get_answer_cache_stats(
+    dbsession: Session,
+    rest_client: AsyncClient,
+) -> None:
+    ChatGptAnswerFactory.create_batch(size=2, hits=3)
+    metrics = get_chatgpt_answer_cache_metrics()
+    metrics.hits, metrics.misses = 3, 1
+
+    response = await rest_client.get(url="/api/chatgpt/answers/cache/stats")
+
+    assert response.status_code == 200
+    assert response.json() == {"hits": 3, "misses": 1, "hit_rate": 0.75, "size": 2, "total_hits": 6}
+
+
 async def test_change_chatgpt_model_priority(
     dbsession: Session,
     rest_client: AsyncClient,
@@ -315,3 +364,29 @@ async def test_cant_delete_chatgpt_model_with_wrong_api_key(
 
     models = dbsession.query(ChatGptModels).all()
     assert len(models) == 3
+
+
+async def test_current_chatgpt_model_cache_invalidated_on_priority_change(
+    dbsession: Session,
+    rest_client: AsyncClient,
+    test_settings: AppSettings,
+) -> None:
+    model = ChatGptModelFactory(priority=0)
+    current_model = ChatGptModelFactory(priority=1)
+    user = UserFactory(username=test_settings.SUPERUSER)
+    access_token = AccessTokenFactory(user_id=user.id)
+    chatgpt_service = ChatGptService.build()
+
+    assert await chatgpt_service.get_current_chatgpt_model() == current_model.model
+
+    dbsession.query(ChatGptModels).filter_by(id=model.id).update({"priority": 42})
+    dbsession.commit()
+    assert await chatgpt_service.get_current_chatgpt_model() == current_model.model
+
+    response = await rest_client.put(
+        url=f"/api/chatgpt/models/{model.id}/priority",
+        json={"priority": 42},
+        headers={"BOT-API-KEY": access_token.token},
+    )
+    assert response.status_code == 202
+    assert await chatgpt_service.get_current_chatgpt_model() == model.model
@@ -1,5 +1,8 @@
 import asyncio
 import datetime
+import json
+import time
+from typing import Any, AsyncIterator, Callable
 from unittest import mock
 
 import httpx
@@ -8,21 +11,43 @@ import telegram
 from assertpy import assert_that
 from faker import Faker
 from httpx import AsyncClient, Response
+from speech_recognition import UnknownValueError as SpeechRecognizerError
 from sqlalchemy.orm import Session
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 
-from constants import MOSCOW_TZ, BotStagesEnum
+from constants import MOSCOW_TZ, BotQueueOverloadPolicyEnum, BotStagesEnum
 from core.auth.models.users import User, UserQuestionCount
-from core.bot.app import BotApplication, BotQueue
+from core.bot.app import BotApplication, BotQueue, ChatLanesBotQueue
+from core.bot.dto import ChatGptAnswerDTO, ChatGptModelDTO, ConversationTurn
+from core.bot.models.chatgpt import ChatGptAnswer
+from core.bot.models.conversation import ChatConversation
+from core.bot.models.voice import VoiceTranscription
+from core.bot.repository import (
+    ChatConversationRepository,
+    ChatGptAnswerRepository,
+    RateLimitRepository,
+    VoiceTranscriptionRepository,
+    conversations_cache,
+)
+from core.bot.scoring import get_model_scoreboard
+from core.bot.services import (
+    AudioDecodeError,
+    ChatGptAnswerCacheService,
+    SpeechToTextService,
+)
 from main import Application
 from settings.config import AppSettings
 from tests.integration.bot.networking import MockedRequest
 from tests.integration.factories.bot import (
     BotCallBackQueryFactory,
+    BotChatFactory,
     BotMessageFactory,
     BotUpdateFactory,
+    BotVoiceFactory,
     CallBackFactory,
+    ChatGptAnswerFactory,
     ChatGptModelFactory,
+    VoiceTranscriptionFactory,
 )
 from tests.integration.factories.user import UserFactory, UserQuestionCountFactory
 from tests.integration.utils import mocked_ask_question_api
@@ -78,6 +103,156 @@ async def test_get_update_from_bot_queue(
     assert update.json() == mocked_request.json()
 
 
+async def test_bot_queue_workers_pool(
+    bot: BotApplication,
+) -> None:
+    bot_queue = BotQueue(bot_app=bot, workers_count=2, maxsize=10)
+    consumer = asyncio.create_task(bot_queue.get_updates_from_queue())
+
+    for _ in range(5):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="/help"))
+        await bot_queue.put_updates_on_queue(MockedRequest(bot_update))  # type: ignore
+    await asyncio.sleep(0.5)
+
+    assert bot_queue.queue.empty()
+    assert bot_queue.stats.active_workers == 0
+    assert bot_queue.stats.workers_count == 2
+    consumer.cancel()
+
+
+async def test_bot_queue_is_full_reject_update(
+    bot: BotApplication,
+) -> None:
+    bot_queue = BotQueue(bot_app=bot, maxsize=1, overload_policy=BotQueueOverloadPolicyEnum.reject)
+
+    first_update = MockedRequest(BotUpdateFactory(message=BotMessageFactory.create_instance(text="/help")))
+    second_update = MockedRequest(BotUpdateFactory(message=BotMessageFactory.create_instance(text="/help")))
+    first_response = await bot_queue.put_updates_on_queue(first_update)  # type: ignore
+    second_response = await bot_queue.put_updates_on_queue(second_update)  # type: ignore
+
+    assert first_response.status_code == 202
+    assert second_response.status_code == 503
+    assert bot_queue.queue.qsize() == 1
+    assert await bot_queue.queue.get() is first_update
+    assert bot_queue.stats.rejected_updates == 1
+
+
+async def test_bot_queue_is_full_drop_oldest_update(
+    bot: BotApplication,
+) -> None:
+    bot_queue = BotQueue(bot_app=bot, maxsize=1, overload_policy=BotQueueOverloadPolicyEnum.drop_oldest)
+
+    first_update = MockedRequest(BotUpdateFactory(message=BotMessageFactory.create_instance(text="/help")))
+    second_update = MockedRequest(BotUpdateFactory(message=BotMessageFactory.create_instance(text="/help")))
+    first_response = await bot_queue.put_updates_on_queue(first_update)  # type: ignore
+    second_response = await bot_queue.put_updates_on_queue(second_update)  # type: ignore
+
+    assert first_response.status_code == 202
+    assert second_response.status_code == 202
+    assert bot_queue.queue.qsize() == 1
+    assert await bot_queue.queue.get() is second_update
+    assert bot_queue.stats.dropped_updates == 1
+
+
+async def test_chat_lanes_bot_queue_keeps_chat_order(
+    bot: BotApplication,
+) -> None:
+    processed_updates = []
+
+    async def process_update(update: Update) -> None:
+        await asyncio.sleep(0.2 if update.message.text == "slow" else 0)  # type: ignore[union-attr]
+        processed_updates.append((update.effective_chat.id, update.message.text))  # type: ignore[union-attr]
+
+    first_chat, second_chat = BotChatFactory()._asdict(), BotChatFactory()._asdict()
+    updates = [
+        Update.de_json(
+            data=BotUpdateFactory(message=BotMessageFactory.create_instance(text=text, chat=chat)),
+            bot=bot,  # type: ignore[arg-type]
+        )
+        for chat, text in ((first_chat, "slow"), (first_chat, "fast"), (second_chat, "fast"))
+    ]
+    bot_queue = ChatLanesBotQueue(bot_app=bot, lane_idle_timeout=0.3)
+
+    with mock.patch.object(bot.application, "process_update", side_effect=process_update):
+        consumer = asyncio.create_task(bot_queue.get_updates_from_queue())
+        for update in updates:
+            await bot_queue.put_updates_on_queue(update)  # type: ignore[arg-type]
+        await asyncio.sleep(0.1)
+        assert bot_queue.stats.chat_lanes == 2
+
+        await asyncio.sleep(0.3)
+        assert processed_updates == [
+            (second_chat["id"], "fast"),
+            (first_chat["id"], "slow"),
+            (first_chat["id"], "fast"),
+        ]
+
+        await asyncio.sleep(0.5)
+        assert bot_queue.stats.chat_lanes == 0
+        consumer.cancel()
+
+
+@pytest.mark.parametrize("overload_policy", [BotQueueOverloadPolicyEnum.reject, BotQueueOverloadPolicyEnum.drop_oldest])
+async def test_chat_lanes_bot_queue_is_full(
+    bot: BotApplication,
+    overload_policy: BotQueueOverloadPolicyEnum,
+) -> None:
+    processed_updates = []
+
+    async def process_update(update: Update) -> None:
+        await asyncio.sleep(0.2)
+        processed_updates.append(update.message.text)  # type: ignore[union-attr]
+
+    chat = BotChatFactory()._asdict()
+    updates = [
+        Update.de_json(
+            data=BotUpdateFactory(message=BotMessageFactory.create_instance(text=str(number), chat=chat)),
+            bot=bot,  # type: ignore[arg-type]
+        )
+        for number in range(4)
+    ]
+    bot_queue = ChatLanesBotQueue(bot_app=bot, maxsize=2, overload_policy=overload_policy, lane_idle_timeout=0.3)
+
+    with mock.patch.object(bot.application, "process_update", side_effect=process_update):
+        consumer = asyncio.create_task(bot_queue.get_updates_from_queue())
+        responses = []
+        for update in updates:
+            responses.append(await bot_queue.put_updates_on_queue(update))  # type: ignore[arg-type]
+            await asyncio.sleep(0.01)
+        assert bot_queue.stats.queue_size == 2
+
+        await asyncio.sleep(0.8)
+        consumer.cancel()
+
+    # the first update is being processed, the next two are waiting in the lane
+    if overload_policy == BotQueueOverloadPolicyEnum.reject:
+        assert [response.status_code for response in responses] == [202, 202, 202, 503]
+        assert responses[-1].headers["Retry-After"] == "1"
+        assert processed_updates == ["0", "1", "2"]
+        assert bot_queue.stats.rejected_updates == 1
+    else:
+        assert [response.status_code for response in responses] == [202, 202, 202, 202]
+        assert processed_updates == ["0", "2", "3"]
+        assert bot_queue.stats.dropped_updates == 1
+
+
+async def test_bot_queue_stats_endpoint(
+    rest_client: AsyncClient,
+) -> None:
+    response = await rest_client.get(url="/api/bot/queue/stats")
+
+    assert response.status_code == 200
+    assert_that(response.json()).contains_only(
+        "queue_size",
+        "queue_maxsize",
+        "workers_count",
+        "active_workers",
+        "rejected_updates",
+        "dropped_updates",
+        "chat_lanes",
+    )
+
+
 async def test_no_update_message(
     main_application: Application,
     test_settings: AppSettings,
@@ -604,3 +779,931 @@ async def test_ask_question_action_critical_error(
             },
             include=["text", "chat_id"],
         )
+
+
+async def test_ask_question_action_failover_to_next_model(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+) -> None:
+    ChatGptModelFactory(model="broken-model", priority=2)
+    ChatGptModelFactory(model="invalid-model", priority=1)
+    ChatGptModelFactory(model="working-model", priority=0)
+    asked_models = []
+
+    def answer_by_model(request: httpx.Request) -> Response:
+        model = json.loads(request.content)["model"]
+        asked_models.append(model)
+        match model:
+            case "broken-model":
+                return Response(status_code=httpx.codes.INTERNAL_SERVER_ERROR)
+            case "invalid-model":
+                return Response(status_code=httpx.codes.OK, text="Invalid request model")
+        return Response(status_code=httpx.codes.OK, text="Привет! Как я могу помочь вам сегодня?")
+
+    with (
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mocked_ask_question_api(host=test_settings.GPT_BASE_HOST, side_effect=answer_by_model),
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Привет!"))
+        bot_update["message"].pop("entities")
+
+        await main_application.bot_app.application.process_update(
+            update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+        )
+        assert_that(mocked_send_message.call_args.kwargs).is_equal_to(
+            {
+                "text": "Привет! Как я могу помочь вам сегодня?",
+                "chat_id": bot_update["message"]["chat"]["id"],
+            },
+            include=["text", "chat_id"],
+        )
+    assert asked_models == ["broken-model", "invalid-model", "working-model"]
+
+
+class InterruptedStream(httpx.AsyncByteStream):
+    """Body which is cut off by read timeout after the beginning of the answer"""
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        yield "Начало ответа, которое длиннее проверяемого заголовка ответа модели".encode()
+        raise httpx.ReadTimeout("timed out")
+
+
+@pytest.mark.parametrize("stream_answers", [False, True])
+async def test_ask_question_action_interrupted_answer(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+    stream_answers: bool,
+) -> None:
+    ChatGptModelFactory(model="interrupted-model", priority=1)
+    ChatGptModelFactory(model="working-model", priority=0)
+    asked_models = []
+
+    def answer_by_model(request: httpx.Request) -> Response:
+        model = json.loads(request.content)["model"]
+        asked_models.append(model)
+        if model == "interrupted-model":
+            return Response(status_code=httpx.codes.OK, stream=InterruptedStream())
+        return Response(status_code=httpx.codes.OK, text="Привет! Как я могу помочь вам сегодня?")
+
+    with (
+        mock.patch.object(test_settings, "GPT_STREAM_ANSWERS", stream_answers),
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mocked_ask_question_api(host=test_settings.GPT_BASE_HOST, side_effect=answer_by_model, assert_all_called=False),
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Привет!"))
+        bot_update["message"].pop("entities")
+
+        await main_application.bot_app.application.process_update(
+            update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+        )
+
+    if stream_answers:
+        # the beginning is already sent to the user, the answer of another model can't be appended to it
+        assert asked_models == ["interrupted-model"]
+    else:
+        assert asked_models == ["interrupted-model", "working-model"]
+        assert mocked_send_message.call_args.kwargs["text"] == "Привет! Как я могу помочь вам сегодня?"
+    [stats] = get_model_scoreboard().get_models_stats([ChatGptModelDTO(model="interrupted-model", priority=1)])
+    assert stats.failures == 1
+
+
+async def test_ask_question_action_failover_is_limited(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+) -> None:
+    ChatGptModelFactory(model="broken-model", priority=1)
+    ChatGptModelFactory(model="working-model", priority=0)
+
+    def answer_by_model(request: httpx.Request) -> Response:
+        if json.loads(request.content)["model"] == "broken-model":
+            return Response(status_code=httpx.codes.INTERNAL_SERVER_ERROR)
+        return Response(status_code=httpx.codes.OK, text="Привет!")
+
+    with (
+        mock.patch.object(test_settings, "GPT_FAILOVER_MAX_MODELS", 1),
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mocked_ask_question_api(host=test_settings.GPT_BASE_HOST, side_effect=answer_by_model),
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Привет!"))
+        bot_update["message"].pop("entities")
+
+        await main_application.bot_app.application.process_update(
+            update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+        )
+        assert mocked_send_message.call_args.kwargs["text"] == (
+            "Что-то пошло не так, попробуйте еще раз или обратитесь к администратору"
+        )
+
+
+async def test_ask_question_action_failing_model_is_ranked_lower(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+) -> None:
+    ChatGptModelFactory(model="broken-model", priority=1)
+    ChatGptModelFactory(model="working-model", priority=0)
+    asked_models = []
+
+    def answer_by_model(request: httpx.Request) -> Response:
+        model = json.loads(request.content)["model"]
+        asked_models.append(model)
+        if model == "broken-model":
+            return Response(status_code=httpx.codes.INTERNAL_SERVER_ERROR)
+        return Response(status_code=httpx.codes.OK, text="Привет!")
+
+    with (
+        mock.patch.object(telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)),
+        mocked_ask_question_api(host=test_settings.GPT_BASE_HOST, side_effect=answer_by_model),
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Привет!"))
+        bot_update["message"].pop("entities")
+        for text in ("Привет!", "Как дела?"):
+            bot_update["message"]["text"] = text
+            await main_application.bot_app.application.process_update(
+                update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+            )
+
+    assert asked_models == ["broken-model", "working-model", "working-model"]
+
+
+async def test_ask_question_action_hedged_request(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+) -> None:
+    ChatGptModelFactory(model="slow-model", priority=1)
+    ChatGptModelFactory(model="fast-model", priority=0)
+    slow_request_cancelled = asyncio.Event()
+
+    async def answer_by_model(request: httpx.Request) -> Response:
+        if json.loads(request.content)["model"] == "slow-model":
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                slow_request_cancelled.set()
+                raise
+        return Response(status_code=httpx.codes.OK, text="Ответ быстрой модели")
+
+    with (
+        mock.patch.object(test_settings, "GPT_HEDGE_DELAY", 0.05),
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mocked_ask_question_api(host=test_settings.GPT_BASE_HOST, side_effect=answer_by_model),
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Привет!"))
+        bot_update["message"].pop("entities")
+
+        await asyncio.wait_for(
+            main_application.bot_app.application.process_update(
+                update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+            ),
+            timeout=5,
+        )
+        assert mocked_send_message.call_args.kwargs["text"] == "Ответ быстрой модели"
+    await asyncio.wait_for(slow_request_cancelled.wait(), timeout=1)
+
+
+async def test_ask_question_action_streamed_failover_to_next_model(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+) -> None:
+    ChatGptModelFactory(model="broken-model", priority=1)
+    ChatGptModelFactory(model="working-model", priority=0)
+
+    def answer_by_model(request: httpx.Request) -> Response:
+        if json.loads(request.content)["model"] == "broken-model":
+            raise httpx.ConnectError("connection refused")
+        return Response(status_code=httpx.codes.OK, text="Привет! Как я могу помочь вам сегодня?")
+
+    with (
+        mock.patch.object(test_settings, "GPT_STREAM_ANSWERS", True),
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mocked_ask_question_api(host=test_settings.GPT_BASE_HOST, side_effect=answer_by_model),
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Привет!"))
+        bot_update["message"].pop("entities")
+
+        await main_application.bot_app.application.process_update(
+            update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+        )
+        assert mocked_send_message.call_args.kwargs["text"] == "Привет! Как я могу помочь вам сегодня?"
+
+
+async def test_ask_question_action_fast_fails_when_chatgpt_service_is_down(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+) -> None:
+    ChatGptModelFactory.create_batch(size=3)
+    with (
+        mock.patch.object(test_settings, "GPT_FAILOVER_MAX_MODELS", 1),
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mocked_ask_question_api(
+            host=test_settings.GPT_BASE_HOST, side_effect=httpx.ConnectError("connection refused")
+        ) as respx_mock,
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Привет!"))
+        bot_update["message"].pop("entities")
+        for _ in range(test_settings.GPT_CLIENT_FAILURE_THRESHOLD + 1):
+            await main_application.bot_app.application.process_update(
+                update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+            )
+
+        assert respx_mock["ask_question"].call_count == test_settings.GPT_CLIENT_FAILURE_THRESHOLD
+        assert mocked_send_message.call_args.kwargs["text"] == "Сервис сейчас перегружен, попробуйте позже"
+
+
+@pytest.mark.parametrize("stream_answers", [False, True])
+async def test_ask_question_action_repeated_question_is_answered_from_cache(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+    stream_answers: bool,
+) -> None:
+    ChatGptModelFactory(model="working-model", priority=0)
+    with (
+        mock.patch.object(test_settings, "GPT_STREAM_ANSWERS", stream_answers),
+        # questions asked within a conversation depend on its context and are not cached
+        mock.patch.object(test_settings, "GPT_CONVERSATION_MAX_TURNS", 0),
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mocked_ask_question_api(
+            host=test_settings.GPT_BASE_HOST,
+            return_value=Response(status_code=httpx.codes.OK, text="Привет! Как я могу помочь вам сегодня?"),
+        ) as respx_mock,
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Привет!"))
+        bot_update["message"].pop("entities")
+        for text in ("Привет!", "  привет  "):
+            bot_update["message"]["text"] = text
+            await main_application.bot_app.application.process_update(
+                update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+            )
+            assert mocked_send_message.call_args.kwargs["text"] == "Привет! Как я могу помочь вам сегодня?"
+
+        assert respx_mock["ask_question"].call_count == 1
+
+    cached_answer = dbsession.query(ChatGptAnswer).one()
+    assert cached_answer.question == "привет"
+    assert cached_answer.model == "working-model"
+    assert cached_answer.hits == 1
+
+    user = bot_update["message"]["from"]
+    user_question_count = dbsession.query(UserQuestionCount).filter_by(user_id=user["id"]).one()
+    assert user_question_count.question_count == 2
+
+
+async def test_ask_question_action_concurrent_identical_questions_share_request(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+) -> None:
+    ChatGptModelFactory(model="working-model", priority=0)
+
+    async def slow_answer(request: httpx.Request) -> Response:
+        await asyncio.sleep(0.1)
+        return Response(status_code=httpx.codes.OK, text="Привет! Как я могу помочь вам сегодня?")
+
+    with (
+        mock.patch.object(test_settings, "GPT_ANSWER_CACHE_SIZE", 0),
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mocked_ask_question_api(host=test_settings.GPT_BASE_HOST, side_effect=slow_answer) as respx_mock,
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Привет!"))
+        bot_update["message"].pop("entities")
+        await asyncio.gather(
+            *(
+                main_application.bot_app.application.process_update(
+                    update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+                )
+                for _ in range(3)
+            )
+        )
+
+        assert respx_mock["ask_question"].call_count == 1
+        sent_texts = [call.kwargs["text"] for call in mocked_send_message.call_args_list]
+        assert sent_texts.count("Привет! Как я могу помочь вам сегодня?") == 3
+
+
+async def test_ask_question_action_expired_answer_is_asked_again(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+) -> None:
+    ChatGptModelFactory(model="working-model", priority=0)
+    created_at = datetime.datetime.now(tz=MOSCOW_TZ) - datetime.timedelta(
+        seconds=test_settings.GPT_ANSWER_CACHE_TTL + 1
+    )
+    ChatGptAnswerFactory(
+        question="привет", model="working-model", answer="Старый ответ", created_at=created_at, last_used_at=created_at
+    )
+    with (
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mocked_ask_question_api(
+            host=test_settings.GPT_BASE_HOST, return_value=Response(status_code=httpx.codes.OK, text="Новый ответ")
+        ),
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Привет!"))
+        bot_update["message"].pop("entities")
+        await main_application.bot_app.application.process_update(
+            update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+        )
+        assert mocked_send_message.call_args.kwargs["text"] == "Новый ответ"
+
+    dbsession.expire_all()
+    assert dbsession.query(ChatGptAnswer.answer).scalar() == "Новый ответ"
+
+
+async def test_cached_answers_are_evicted_once_in_interval(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+) -> None:
+    with (
+        mock.patch.object(test_settings, "GPT_ANSWER_CACHE_SIZE", 1),
+        mock.patch.object(test_settings, "GPT_ANSWER_CACHE_EVICT_INTERVAL", 60),
+    ):
+        answer_cache = ChatGptAnswerCacheService.build()
+    for question in ("Первый вопрос", "Второй вопрос"):
+        answer = ChatGptAnswerDTO(text="Ответ", chatgpt_model="working-model", is_complete=True)
+        await answer_cache.save_answer(question, answer)
+    assert dbsession.query(ChatGptAnswer).count() == 2
+
+    answer_cache.metrics.evicted_at -= 60
+    await answer_cache.save_answer("Третий вопрос", answer)
+
+    dbsession.expire_all()
+    assert dbsession.query(ChatGptAnswer.question).all() == [("третий вопрос",)]
+
+
+async def test_only_found_cached_answer_is_marked_as_used(
+    dbsession: Session,
+    main_application: Application,
+) -> None:
+    now = datetime.datetime.now(tz=MOSCOW_TZ)
+    ChatGptAnswerFactory(
+        question="привет", model="other-model", created_at=now, last_used_at=now - datetime.timedelta(days=1)
+    )
+    cached_answer = dbsession.query(ChatGptAnswer.hits, ChatGptAnswer.last_used_at).one()
+    repository = ChatGptAnswerRepository(db=main_application.db)
+
+    assert await repository.get_answer("привет", chatgpt_models=["working-model"], ttl=60) is None
+    assert await repository.get_answer("пока", chatgpt_models=["other-model"], ttl=60) is None
+    assert await repository.get_answer("привет", chatgpt_models=["other-model"], ttl=60) is not None
+
+    dbsession.expire_all()
+    used_answer = dbsession.query(ChatGptAnswer.hits, ChatGptAnswer.last_used_at).one()
+    assert used_answer.hits == cached_answer.hits + 1
+    assert used_answer.last_used_at > cached_answer.last_used_at
+
+
+@pytest.mark.parametrize(
+    "answer",
+    [
+        Response(status_code=httpx.codes.INTERNAL_SERVER_ERROR),
+        Response(status_code=httpx.codes.OK, text="Invalid request model"),
+    ],
+)
+async def test_ask_question_action_error_answer_is_not_cached(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+    answer: Response,
+) -> None:
+    ChatGptModelFactory(model="broken-model", priority=0)
+    with (
+        mock.patch.object(telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)),
+        mocked_ask_question_api(host=test_settings.GPT_BASE_HOST, return_value=answer) as respx_mock,
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Привет!"))
+        bot_update["message"].pop("entities")
+        for _ in range(2):
+            await main_application.bot_app.application.process_update(
+                update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+            )
+
+        assert respx_mock["ask_question"].call_count == 2
+    assert dbsession.query(ChatGptAnswer).count() == 0
+
+
+@pytest.mark.parametrize("stream_answers", [False, True])
+async def test_ask_question_action_previous_turns_are_sent_as_conversation(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+    stream_answers: bool,
+) -> None:
+    ChatGptModelFactory(model="working-model", priority=0)
+    conversations = []
+
+    async def answer_with_number(request: httpx.Request) -> Response:
+        conversations.append(json.loads(request.content)["meta"]["content"]["conversation"])
+        return Response(status_code=httpx.codes.OK, text=f"Ответ {len(conversations)}")
+
+    with (
+        mock.patch.object(test_settings, "GPT_STREAM_ANSWERS", stream_answers),
+        mock.patch.object(test_settings, "GPT_CONVERSATION_MAX_TURNS", 2),
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mocked_ask_question_api(host=test_settings.GPT_BASE_HOST, side_effect=answer_with_number),
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Вопрос 1"))
+        bot_update["message"].pop("entities")
+        for number in range(1, 4):
+            bot_update["message"]["text"] = f"Вопрос {number}"
+            await main_application.bot_app.application.process_update(
+                update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+            )
+            assert mocked_send_message.call_args.kwargs["text"] == f"Ответ {number}"
+
+    assert conversations == [
+        [],
+        [{"role": "user", "content": "Вопрос 1"}, {"role": "assistant", "content": "Ответ 1"}],
+        [
+            {"role": "user", "content": "Вопрос 1"},
+            {"role": "assistant", "content": "Ответ 1"},
+            {"role": "user", "content": "Вопрос 2"},
+            {"role": "assistant", "content": "Ответ 2"},
+        ],
+    ]
+    conversation = dbsession.query(ChatConversation).one()
+    assert conversation.chat_id == bot_update["message"]["chat"]["id"]
+    assert conversation.turns == [["Вопрос 2", "Ответ 2"], ["Вопрос 3", "Ответ 3"]]
+
+
+async def test_ask_question_action_oldest_turns_are_dropped_over_chars_budget(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+) -> None:
+    ChatGptModelFactory(model="working-model", priority=0)
+    with (
+        mock.patch.object(test_settings, "GPT_CONVERSATION_MAX_CHARS", 30),
+        mock.patch.object(telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)),
+        mocked_ask_question_api(
+            host=test_settings.GPT_BASE_HOST, return_value=Response(status_code=httpx.codes.OK, text="Ответ")
+        ),
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Вопрос"))
+        bot_update["message"].pop("entities")
+        for text in ("Первый вопрос", "Второй вопрос", "Очень длинный вопрос, который не влезает в контекст"):
+            bot_update["message"]["text"] = text
+            await main_application.bot_app.application.process_update(
+                update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+            )
+            dbsession.expire_all()
+            turns = dbsession.query(ChatConversation.turns).scalar()
+
+            if text == "Второй вопрос":
+                assert turns == [["Второй вопрос", "Ответ"]]
+        assert turns == []
+
+
+async def test_ask_question_action_failed_answer_is_not_remembered(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+) -> None:
+    ChatGptModelFactory(model="broken-model", priority=0)
+    with (
+        mock.patch.object(telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)),
+        mocked_ask_question_api(
+            host=test_settings.GPT_BASE_HOST, return_value=Response(status_code=httpx.codes.INTERNAL_SERVER_ERROR)
+        ),
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Привет!"))
+        bot_update["message"].pop("entities")
+        await main_application.bot_app.application.process_update(
+            update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+        )
+
+    assert dbsession.query(ChatConversation).count() == 0
+
+
+async def test_concurrent_conversation_changes_are_not_lost(
+    dbsession: Session,
+    main_application: Application,
+) -> None:
+    repository = ChatConversationRepository(db=main_application.db)
+
+    def add_turn(text: str) -> Callable[[tuple[ConversationTurn, ...]], tuple[ConversationTurn, ...]]:
+        return lambda turns: (*turns, ConversationTurn(text, text))
+
+    await asyncio.gather(*(repository.update_turns(1, add_turn(text), expire=60) for text in ("first", "second")))
+
+    conversation = dbsession.query(ChatConversation).one()
+    assert sorted(conversation.turns) == [["first", "first"], ["second", "second"]]
+    assert conversation.version == 1
+
+
+async def test_conversation_changed_by_another_worker(
+    dbsession: Session,
+    main_application: Application,
+) -> None:
+    repository = ChatConversationRepository(db=main_application.db)
+    await repository.update_turns(1, lambda turns: (*turns, ConversationTurn("Привет!", "Привет")), expire=60)
+    assert await repository.get_turns(1, expire=60) == (ConversationTurn("Привет!", "Привет"),)
+
+    # another worker changes the conversation
+    conversation = dbsession.query(ChatConversation).one()
+    conversation.turns = [["Пока!", "Пока"]]
+    conversation.version += 1
+    dbsession.commit()
+    assert await repository.get_turns(1, expire=60) == (ConversationTurn("Пока!", "Пока"),)
+
+    # another worker deletes the conversation
+    dbsession.query(ChatConversation).delete()
+    dbsession.commit()
+    assert await repository.get_turns(1, expire=60) == ()
+    await repository.update_turns(1, lambda turns: (*turns, ConversationTurn("Как дела?", "Хорошо")), expire=60)
+    assert dbsession.query(ChatConversation.turns).scalar() == [["Как дела?", "Хорошо"]]
+
+
+async def test_conversation_change_keeps_cached_conversations_of_other_chats(
+    dbsession: Session,
+    main_application: Application,
+) -> None:
+    repository = ChatConversationRepository(db=main_application.db)
+    for chat_id in (1, 2):
+        await repository.update_turns(chat_id, lambda turns: (*turns, ConversationTurn("Привет!", "Привет")), expire=60)
+    conversations_cache.clear()
+    await repository.get_turns(1, expire=60)
+
+    await repository.update_turns(2, lambda turns: (*turns, ConversationTurn("Как дела?", "Хорошо")), expire=60)
+
+    assert conversations_cache.get(1) == (0, (ConversationTurn("Привет!", "Привет"),))
+
+
+async def test_expired_conversations_are_deleted(
+    dbsession: Session,
+    main_application: Application,
+) -> None:
+    repository = ChatConversationRepository(db=main_application.db)
+    for chat_id in (1, 2):
+        await repository.update_turns(chat_id, lambda turns: (*turns, ConversationTurn("Привет!", "Привет")), expire=60)
+    dbsession.query(ChatConversation).filter_by(chat_id=1).update(
+        {"updated_at": datetime.datetime.now(tz=MOSCOW_TZ) - datetime.timedelta(seconds=61)}
+    )
+    dbsession.commit()
+
+    await repository.delete_expired(expire=60)
+
+    assert dbsession.query(ChatConversation.chat_id).all() == [(2,)]
+
+
+async def test_reset_conversation_action(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+) -> None:
+    ChatGptModelFactory(model="working-model", priority=0)
+    conversations = []
+
+    async def answer(request: httpx.Request) -> Response:
+        conversations.append(json.loads(request.content)["meta"]["content"]["conversation"])
+        return Response(status_code=httpx.codes.OK, text="Ответ")
+
+    with (
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mocked_ask_question_api(host=test_settings.GPT_BASE_HOST, side_effect=answer),
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Привет!"))
+        bot_update["message"].pop("entities")
+        await main_application.bot_app.application.process_update(
+            update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+        )
+
+        bot_update["message"]["text"] = "/reset"
+        bot_update["message"]["entities"] = [{"type": "bot_command", "offset": 0, "length": 6}]
+        await main_application.bot_app.application.process_update(
+            update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+        )
+        assert mocked_send_message.call_args.kwargs["text"] == (
+            "Контекст диалога очищен, следующий вопрос начнет новый диалог"
+        )
+        assert dbsession.query(ChatConversation.turns).scalar() == []
+
+        bot_update["message"]["text"] = "Как дела?"
+        bot_update["message"].pop("entities")
+        await main_application.bot_app.application.process_update(
+            update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+        )
+
+    assert conversations == [[], []]
+
+
+@pytest.mark.parametrize("stream_answers", [False, True])
+async def test_ask_question_action_interrupted_answer_is_not_cached(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+    stream_answers: bool,
+) -> None:
+    ChatGptModelFactory(model="interrupted-model", priority=0)
+    with (
+        mock.patch.object(test_settings, "GPT_STREAM_ANSWERS", stream_answers),
+        mock.patch.object(test_settings, "GPT_CONVERSATION_MAX_TURNS", 0),
+        mock.patch.object(telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)),
+        mocked_ask_question_api(
+            host=test_settings.GPT_BASE_HOST,
+            side_effect=lambda request: Response(status_code=httpx.codes.OK, stream=InterruptedStream()),
+        ) as respx_mock,
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Привет!"))
+        bot_update["message"].pop("entities")
+        for _ in range(2):
+            await main_application.bot_app.application.process_update(
+                update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+            )
+
+        assert respx_mock["ask_question"].call_count == 2
+    assert dbsession.query(ChatGptAnswer).count() == 0
+
+
+async def test_ask_question_action_streamed_answer(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+) -> None:
+    ChatGptModelFactory.create_batch(size=3)
+    with (
+        mock.patch.object(test_settings, "GPT_STREAM_ANSWERS", True),
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mocked_ask_question_api(
+            host=test_settings.GPT_BASE_HOST,
+            return_value=Response(status_code=httpx.codes.OK, text="Привет! Как я могу помочь вам сегодня?"),
+        ),
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Привет!"))
+        bot_update["message"].pop("entities")
+
+        await main_application.bot_app.application.process_update(
+            update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+        )
+        assert_that(mocked_send_message.call_args.kwargs).is_equal_to(
+            {
+                "text": "Привет! Как я могу помочь вам сегодня?",
+                "chat_id": bot_update["message"]["chat"]["id"],
+            },
+            include=["text", "chat_id"],
+        )
+
+    user = bot_update["message"]["from"]
+    user_question_count = dbsession.query(UserQuestionCount).filter_by(user_id=user["id"]).one()
+    assert user_question_count.question_count == 1
+
+
+@pytest.mark.parametrize("text", ["Invalid request model", "return unexpected http status code"])
+async def test_ask_question_action_streamed_invalid_model(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+    text: str,
+) -> None:
+    model = ChatGptModelFactory(priority=42)
+    with (
+        mock.patch.object(test_settings, "GPT_STREAM_ANSWERS", True),
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mocked_ask_question_api(
+            host=test_settings.GPT_BASE_HOST,
+            return_value=Response(status_code=httpx.codes.OK, text=text),
+        ),
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Привет!"))
+        bot_update["message"].pop("entities")
+
+        await main_application.bot_app.application.process_update(
+            update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+        )
+        assert mocked_send_message.call_args.kwargs["text"] == f"{text}: {model.model}"
+
+
+async def _recognized_text(*args: Any) -> AsyncIterator[str]:
+    for text in ("Привет!", "Как дела?"):
+        yield text
+
+
+async def test_ask_question_action_user_is_rate_limited(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+) -> None:
+    ChatGptModelFactory(model="working-model", priority=0)
+    with (
+        mock.patch.object(test_settings, "RATE_LIMIT_USER_BURST", 2),
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mocked_ask_question_api(
+            host=test_settings.GPT_BASE_HOST, return_value=Response(status_code=httpx.codes.OK, text="Ответ")
+        ) as respx_mock,
+    ):
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Вопрос"))
+        bot_update["message"].pop("entities")
+        for number in range(3):
+            bot_update["message"]["text"] = f"Вопрос {number}"
+            await main_application.bot_app.application.process_update(
+                update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+            )
+
+        assert respx_mock["ask_question"].call_count == 2
+        assert mocked_send_message.call_args.kwargs["text"] == (
+            "Вы задаете вопросы слишком часто. Пожалуйста, попробуйте снова через 10 сек."
+        )
+
+
+async def test_ask_question_action_global_rate_limit(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+) -> None:
+    with (
+        mock.patch.object(test_settings, "RATE_LIMIT_GLOBAL_BURST", 1),
+        mock.patch.object(test_settings, "RATE_LIMIT_GLOBAL_PER_MINUTE", 0.5),
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+    ):
+        # bucket is emptied by another worker
+        await RateLimitRepository(db=main_application.db).take_token(
+            "global", capacity=1, rate=0.5 / 60, now=time.time()
+        )
+        bot_update = BotUpdateFactory(message=BotMessageFactory.create_instance(text="Привет!"))
+        bot_update["message"].pop("entities")
+        await main_application.bot_app.application.process_update(
+            update=Update.de_json(data=bot_update, bot=main_application.bot_app.bot)
+        )
+
+        assert mocked_send_message.call_count == 1
+        assert mocked_send_message.call_args.kwargs["text"] == (
+            "Бот сейчас получает слишком много вопросов. Пожалуйста, попробуйте снова через 120 сек."
+        )
+    assert dbsession.query(User).count() == 0
+
+
+async def test_voice_message_is_recognized_and_transcription_saved(
+    dbsession: Session,
+    main_application: Application,
+) -> None:
+    voice = BotVoiceFactory()
+    message = BotMessageFactory.create_instance(text=None, entities=None, voice=voice)
+
+    with (
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mock.patch.object(telegram.Voice, "get_file") as mocked_get_file,
+        mock.patch.object(SpeechToTextService, "get_text_from_audio", _recognized_text),
+    ):
+        mocked_get_file.return_value.download_as_bytearray = mock.AsyncMock(return_value=bytearray(b"voice"))
+
+        await main_application.bot_app.application.process_update(
+            update=Update.de_json(data=BotUpdateFactory(message=message), bot=main_application.bot_app.bot)
+        )
+
+    mocked_get_file.assert_called_once()
+    assert [call.kwargs["text"] for call in mocked_send_message.call_args_list][1:] == ["Привет!", "Как дела?"]
+    transcription = dbsession.query(VoiceTranscription).filter_by(file_unique_id=voice["file_unique_id"]).one()
+    assert transcription.text_parts == ["Привет!", "Как дела?"]
+
+
+@pytest.mark.parametrize("error", [SpeechRecognizerError(), AudioDecodeError()])
+@pytest.mark.parametrize(
+    "recognized_parts, sent_texts",
+    [
+        (["Привет!"], ["Привет!"]),
+        ([], ["Не удалось распознать голосовое сообщение :("]),
+    ],
+)
+async def test_voice_message_recognized_partially_is_not_saved(
+    dbsession: Session,
+    main_application: Application,
+    recognized_parts: list[str],
+    sent_texts: list[str],
+    error: Exception,
+) -> None:
+    voice = BotVoiceFactory()
+    message = BotMessageFactory.create_instance(text=None, entities=None, voice=voice)
+
+    async def recognize_partially(self: SpeechToTextService) -> AsyncIterator[str]:
+        for text in recognized_parts:
+            yield text
+        raise error
+
+    with (
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mock.patch.object(telegram.Voice, "get_file") as mocked_get_file,
+        mock.patch.object(SpeechToTextService, "get_text_from_audio", recognize_partially),
+    ):
+        mocked_get_file.return_value.download_as_bytearray = mock.AsyncMock(return_value=bytearray(b"voice"))
+
+        await main_application.bot_app.application.process_update(
+            update=Update.de_json(data=BotUpdateFactory(message=message), bot=main_application.bot_app.bot)
+        )
+
+    assert [call.kwargs["text"] for call in mocked_send_message.call_args_list][1:] == sent_texts
+    assert dbsession.query(VoiceTranscription).count() == 0
+
+
+async def test_voice_message_transcription_is_taken_from_cache(
+    dbsession: Session,
+    main_application: Application,
+) -> None:
+    transcription = VoiceTranscriptionFactory()
+    message = BotMessageFactory.create_instance(
+        text=None, entities=None, voice=BotVoiceFactory(file_unique_id=transcription.file_unique_id)
+    )
+
+    with (
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mock.patch.object(telegram.Voice, "get_file") as mocked_get_file,
+    ):
+        await main_application.bot_app.application.process_update(
+            update=Update.de_json(data=BotUpdateFactory(message=message), bot=main_application.bot_app.bot)
+        )
+
+    mocked_get_file.assert_not_called()
+    assert [call.kwargs["text"] for call in mocked_send_message.call_args_list] == transcription.text_parts
+    used_transcription = (
+        dbsession.query(VoiceTranscription).filter_by(file_unique_id=transcription.file_unique_id).one()
+    )
+    assert used_transcription.last_used_at > transcription.last_used_at
+
+
+async def test_voice_transcriptions_above_max_size_are_evicted(
+    dbsession: Session,
+    main_application: Application,
+) -> None:
+    now = datetime.datetime.now(tz=MOSCOW_TZ)
+    VoiceTranscriptionFactory(file_unique_id="oldest_voice", last_used_at=now - datetime.timedelta(days=2))
+    VoiceTranscriptionFactory(file_unique_id="recent_voice", last_used_at=now - datetime.timedelta(days=1))
+    repository = VoiceTranscriptionRepository(db=main_application.db)
+
+    await repository.save_text_parts("new_voice", text_parts=["Привет!"], max_size=2)
+
+    file_unique_ids = {transcription.file_unique_id for transcription in dbsession.query(VoiceTranscription).all()}
+    assert file_unique_ids == {"recent_voice", "new_voice"}
+
+
+async def test_voice_message_is_answered_by_chatgpt(
+    dbsession: Session,
+    main_application: Application,
+    test_settings: AppSettings,
+) -> None:
+    ChatGptModelFactory.create_batch(size=3)
+    transcription = VoiceTranscriptionFactory(text_parts=["Привет!"])
+    message = BotMessageFactory.create_instance(
+        text=None, entities=None, voice=BotVoiceFactory(file_unique_id=transcription.file_unique_id)
+    )
+
+    with (
+        mock.patch.object(test_settings, "STT_ANSWER_WITH_GPT", True),
+        mock.patch.object(
+            telegram._bot.Bot, "send_message", return_value=lambda *args, **kwargs: (args, kwargs)
+        ) as mocked_send_message,
+        mocked_ask_question_api(
+            host=test_settings.GPT_BASE_HOST,
+            return_value=Response(status_code=httpx.codes.OK, text="Привет! Как я могу помочь вам сегодня?"),
+        ),
+    ):
+        await main_application.bot_app.application.process_update(
+            update=Update.de_json(data=BotUpdateFactory(message=message), bot=main_application.bot_app.bot)
+        )
+
+    assert [call.kwargs["text"] for call in mocked_send_message.call_args_list] == [
+        "Привет!",
+        "Привет! Как я могу помочь вам сегодня?",
+    ]
+    user_question_count = dbsession.query(UserQuestionCount).filter_by(user_id=message["from"]["id"]).one()
+    assert user_question_count.question_count == 1
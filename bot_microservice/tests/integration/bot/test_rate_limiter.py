@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from sqlalchemy.orm import Session
+
+from core.bot.models.rate_limit import RateLimitBucket
+from core.bot.rate_limiter import RateLimiter
+from core.bot.repository import RateLimitRepository
+from infra.database.db_adapter import get_database
+
+pytestmark = [
+    pytest.mark.asyncio,
+    pytest.mark.enable_socket,
+]
+
+
+async def test_bucket_is_refilled_with_time(dbsession: Session) -> None:
+    repository = RateLimitRepository(db=get_database())
+
+    assert [await repository.take_token("user:1", capacity=2, rate=0.5, now=100) for _ in range(3)] == [
+        True,
+        True,
+        False,
+    ]
+    assert await repository.get_retry_after("user:1", capacity=2, rate=0.5, now=101) == 1
+
+    assert await repository.take_token("user:1", capacity=2, rate=0.5, now=102) is True
+    assert await repository.take_token("user:1", capacity=2, rate=0.5, now=102) is False
+    # refill is limited by capacity
+    assert [await repository.take_token("user:1", capacity=2, rate=0.5, now=1000) for _ in range(3)] == [
+        True,
+        True,
+        False,
+    ]
+
+
+async def test_concurrent_takes_share_bucket(dbsession: Session) -> None:
+    repository = RateLimitRepository(db=get_database())
+
+    taken = await asyncio.gather(*(repository.take_token("global", capacity=3, rate=1, now=100) for _ in range(10)))
+
+    assert taken.count(True) == 3
+    bucket = dbsession.query(RateLimitBucket).one()
+    assert bucket.tokens == 0
+
+
+async def test_global_limit_returns_user_token(dbsession: Session) -> None:
+    rate_limiter = RateLimiter(
+        repository=RateLimitRepository(db=get_database()),
+        user_per_minute=60,
+        user_burst=5,
+        global_per_minute=60,
+        global_burst=1,
+    )
+
+    assert (await rate_limiter.acquire(user_id=1)).is_allowed is True
+    rate_limit = await rate_limiter.acquire(user_id=2)
+
+    assert rate_limit.is_allowed is False
+    assert rate_limit.is_global is True
+    assert 0 < rate_limit.retry_after <= 1
+    user_tokens = {bucket.key: bucket.tokens for bucket in dbsession.query(RateLimitBucket)}
+    assert user_tokens["user:1"] == 4
+    assert user_tokens["user:2"] == 5
+
+
+async def test_idle_buckets_are_deleted(dbsession: Session) -> None:
+    repository = RateLimitRepository(db=get_database())
+    await repository.take_token("user:1", capacity=1, rate=1, now=100)
+    rate_limiter = RateLimiter(
+        repository=repository, user_per_minute=60, user_burst=1, global_per_minute=0, global_burst=1
+    )
+
+    await rate_limiter.delete_idle_buckets()
+
+    assert dbsession.query(RateLimitBucket).count() == 0
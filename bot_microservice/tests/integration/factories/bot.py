@@ -6,7 +6,8 @@ import factory.fuzzy
 from faker import Faker
 
 from constants import BotStagesEnum
-from core.bot.models.chatgpt import ChatGptModels
+from core.bot.models.chatgpt import ChatGptAnswer, ChatGptModels
+from core.bot.models.voice import VoiceTranscription
 from tests.integration.factories.utils import BaseModelFactory
 
 faker = Faker("ru_RU")
@@ -61,6 +62,28 @@ class ChatGptModelFactory(BaseModelFactory):
         model = ChatGptModels
 
 
+class ChatGptAnswerFactory(BaseModelFactory):
+    question = factory.Faker("sentence")
+    model = factory.Faker("word")
+    answer = factory.Faker("paragraph")
+    hits = factory.Faker("random_int", min=0, max=42)
+    created_at = factory.Faker("past_datetime")
+    last_used_at = factory.Faker("past_datetime")
+
+    class Meta:
+        model = ChatGptAnswer
+
+
+class VoiceTranscriptionFactory(BaseModelFactory):
+    file_unique_id = factory.Faker("lexify", text="???????????????", locale="en_US")
+    text_parts = factory.LazyFunction(lambda: [faker.sentence(), faker.sentence()])
+    created_at = factory.Faker("past_datetime")
+    last_used_at = factory.Faker("past_datetime")
+
+    class Meta:
+        model = VoiceTranscription
+
+
 class BotInfoFactory(factory.DictFactory):
     token = factory.Faker(
         "bothify", text="#########:??????????????????????????-#????????#?", letters=string.ascii_letters
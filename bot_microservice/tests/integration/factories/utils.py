@@ -1,9 +1,8 @@
 import factory
 
-from infra.database.db_adapter import Database
-from settings.config import settings
+from infra.database.db_adapter import get_database
 
-database = Database(settings)
+database = get_database()
 
 
 class BaseModelFactory(factory.alchemy.SQLAlchemyModelFactory):
@@ -1,5 +1,10 @@
+import asyncio
+import json
+from pathlib import Path
+
 import httpx
 import pytest
+from assertpy import assert_that
 from faker import Faker
 from fastapi.responses import ORJSONResponse
 from httpx import ASGITransport, AsyncClient, Response
@@ -9,7 +14,11 @@ from starlette import status
 from starlette.routing import BaseRoute
 
 from api.exceptions import BaseAPIException
+from core.auth.services import UserService
 from core.bot.app import BotApplication
+from core.bot.prober import ChatGptModelProber, get_chatgpt_model_prober
+from core.bot.services import ChatGptService
+from infra.database.db_adapter import get_database
 from main import Application as AppApplication
 from settings.config import AppSettings
 from tests.integration.factories.bot import ChatGptModelFactory
@@ -29,6 +38,38 @@ async def test_bot_updates(rest_client: AsyncClient) -> None:
     assert response.status_code == 200
 
 
+async def test_database_is_shared_by_app_and_bot_handlers(main_application: AppApplication) -> None:
+    assert main_application.fastapi_app.state.db is main_application.db
+    assert ChatGptService.build().repository.db is main_application.db
+    assert UserService.build().repository.db is main_application.db
+
+
+async def test_application_uses_database_of_given_settings(
+    main_application: AppApplication,
+    test_settings: AppSettings,
+) -> None:
+    other_settings = test_settings.model_copy(update={"DB_NAME": "other_test_db.sqlite"})
+    other_settings.__dict__.pop("db_file", None)
+
+    application = AppApplication(settings=other_settings, bot_app=main_application.bot_app)
+
+    assert application.db.db_file == other_settings.db_file != test_settings.db_file
+    assert application.db is get_database(other_settings)
+    assert main_application.db is get_database()
+
+
+async def test_database_connections_use_configured_pragmas(
+    main_application: AppApplication,
+    test_settings: AppSettings,
+) -> None:
+    pragmas = await main_application.db.get_sqlite_pragmas()
+
+    assert pragmas["journal_mode"] == test_settings.DB_JOURNAL_MODE == "wal"
+    assert pragmas["busy_timeout"] == test_settings.DB_BUSY_TIMEOUT
+    assert pragmas["cache_size"] == test_settings.DB_CACHE_SIZE
+    assert pragmas["temp_store"] == 2  # memory
+
+
 async def test_bot_healthcheck_is_ok(
     dbsession: Session,
     rest_client: AsyncClient,
@@ -70,6 +111,128 @@ async def test_bot_healthcheck_not_ok(
         assert response.status_code == httpx.codes.INTERNAL_SERVER_ERROR
 
 
+async def test_bot_healthcheck_detail(
+    dbsession: Session,
+    rest_client: AsyncClient,
+    test_settings: AppSettings,
+) -> None:
+    ChatGptModelFactory(model="working-model", priority=1)
+    ChatGptModelFactory(model="invalid-model", priority=0)
+
+    def answer_by_model(request: httpx.Request) -> Response:
+        if json.loads(request.content)["model"] == "invalid-model":
+            return Response(status_code=httpx.codes.OK, text="Invalid request model")
+        return Response(status_code=httpx.codes.OK, text="Привет!")
+
+    with mocked_ask_question_api(host=test_settings.GPT_BASE_HOST, side_effect=answer_by_model):
+        response = await rest_client.get("/api/bot-healthcheck", params={"detail": True})
+
+    assert response.status_code == httpx.codes.OK
+    data = response.json()
+    assert data["is_available"] is True
+    assert_that(data["models"]).extracting("model", "is_available", "status_code", "error").is_equal_to(
+        [
+            ("working-model", True, 200, None),
+            ("invalid-model", False, 200, "Invalid request model"),
+        ]
+    )
+
+
+async def test_bot_healthcheck_answers_from_background_probe_results(
+    dbsession: Session,
+    rest_client: AsyncClient,
+    test_settings: AppSettings,
+) -> None:
+    ChatGptModelFactory.create_batch(size=3)
+    prober = get_chatgpt_model_prober()
+    with mocked_ask_question_api(
+        host=test_settings.GPT_BASE_HOST,
+        return_value=Response(status_code=httpx.codes.OK, text="Привет! Как я могу помочь вам сегодня?"),
+    ) as respx_mock:
+        prober.start()
+        try:
+            while respx_mock["ask_question"].call_count < 3:
+                await asyncio.sleep(0.01)
+
+            for _ in range(5):
+                response = await rest_client.get("/api/bot-healthcheck")
+                assert response.status_code == httpx.codes.OK
+        finally:
+            await prober.stop()
+
+        assert respx_mock["ask_question"].call_count == 3
+
+
+async def test_bot_healthcheck_is_unknown_until_first_probe_results(
+    dbsession: Session,
+    rest_client: AsyncClient,
+    test_settings: AppSettings,
+) -> None:
+    ChatGptModelFactory.create_batch(size=2)
+    prober = get_chatgpt_model_prober()
+    request_event, answer_event = asyncio.Event(), asyncio.Event()
+
+    async def wait_answer(request: httpx.Request) -> Response:
+        request_event.set()
+        await answer_event.wait()
+        return Response(status_code=httpx.codes.OK, text="Привет! Как я могу помочь вам сегодня?")
+
+    with mocked_ask_question_api(host=test_settings.GPT_BASE_HOST, side_effect=wait_answer):
+        prober.start()
+        try:
+            await request_event.wait()
+
+            response = await rest_client.get("/api/bot-healthcheck", params={"detail": True})
+            assert response.status_code == httpx.codes.OK
+            assert response.json() == {"is_available": None, "models": []}
+
+            answer_event.set()
+            while not await prober.get_results():
+                await asyncio.sleep(0.01)
+
+            response = await rest_client.get("/api/bot-healthcheck", params={"detail": True})
+            assert response.status_code == httpx.codes.OK
+            assert response.json()["is_available"] is True
+        finally:
+            await prober.stop()
+
+
+async def test_models_are_probed_by_one_prober_of_host(
+    dbsession: Session,
+    test_settings: AppSettings,
+    tmp_path: Path,
+) -> None:
+    ChatGptModelFactory.create_batch(size=3)
+    repository = get_chatgpt_model_prober().repository
+    leader, follower = (
+        ChatGptModelProber(repository=repository, interval=0.1, concurrency=3, timeout=1, directory=tmp_path)
+        for _ in range(2)
+    )
+    with mocked_ask_question_api(
+        host=test_settings.GPT_BASE_HOST,
+        return_value=Response(status_code=httpx.codes.OK, text="Привет! Как я могу помочь вам сегодня?"),
+    ) as respx_mock:
+        leader.start()
+        follower.start()
+        try:
+            while not (results := await follower.get_results()):
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.25)
+
+            assert leader.is_leader is True
+            assert follower.is_leader is False
+            assert_that(results).extracting("is_available").is_equal_to([True, True, True])
+            # only the leader probes models, once in the interval
+            assert respx_mock["ask_question"].call_count <= 3 * 4
+
+            await leader.stop()
+            while not follower.is_leader:
+                await asyncio.sleep(0.01)
+        finally:
+            await leader.stop()
+            await follower.stop()
+
+
 async def test_server_error_handler_returns_500_without_traceback_when_debug_disabled(
     test_settings: AppSettings,
     bot_app: BotApplication,
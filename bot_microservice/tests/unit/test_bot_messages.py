@@ -0,0 +1,182 @@
+import asyncio
+from typing import AsyncIterator
+from unittest import mock
+
+import pytest
+from telegram.error import BadRequest, RetryAfter
+
+from constants import TELEGRAM_MESSAGE_MAX_LENGTH
+from core.bot.messages import StreamedAnswerMessage, VoiceAnswerMessages, split_text
+
+
+async def _chunks(*chunks: str) -> AsyncIterator[str]:
+    for chunk in chunks:
+        yield chunk
+
+
+async def test_streamed_answer_first_chunk_sent_and_next_edited() -> None:
+    reply_to = mock.AsyncMock()
+    answer_message = StreamedAnswerMessage(reply_to=reply_to, edit_interval=0, edit_min_chars=1)
+
+    text = await answer_message.send(_chunks("Привет", "! Как", " дела?"))
+
+    assert text == "Привет! Как дела?"
+    reply_to.reply_text.assert_awaited_once_with("Привет")
+    sent_message = reply_to.reply_text.return_value
+    assert [call.args for call in sent_message.edit_text.await_args_list] == [("Привет! Как",), ("Привет! Как дела?",)]
+
+
+async def test_streamed_answer_edits_are_coalesced() -> None:
+    reply_to = mock.AsyncMock()
+    answer_message = StreamedAnswerMessage(reply_to=reply_to, edit_interval=60, edit_min_chars=1)
+
+    await answer_message.send(_chunks("Привет", "! Как", " дела", "?"))
+
+    reply_to.reply_text.assert_awaited_once_with("Привет")
+    reply_to.reply_text.return_value.edit_text.assert_awaited_once_with("Привет! Как дела?")
+
+
+async def test_streamed_answer_skips_rate_limited_edit() -> None:
+    reply_to = mock.AsyncMock()
+    sent_message = reply_to.reply_text.return_value
+    sent_message.edit_text.side_effect = [RetryAfter(0), None]
+    answer_message = StreamedAnswerMessage(reply_to=reply_to, edit_interval=0, edit_min_chars=1)
+
+    await answer_message.send(_chunks("Привет", "! Как", " дела?"))
+
+    assert [call.args for call in sent_message.edit_text.await_args_list] == [("Привет! Как",), ("Привет! Как дела?",)]
+
+
+async def test_streamed_answer_last_edit_is_retried() -> None:
+    reply_to = mock.AsyncMock()
+    sent_message = reply_to.reply_text.return_value
+    sent_message.edit_text.side_effect = [RetryAfter(0), RetryAfter(0), None]
+    answer_message = StreamedAnswerMessage(reply_to=reply_to, edit_interval=60, edit_min_chars=1)
+
+    text = await answer_message.send(_chunks("Привет", "! Как дела?"))
+
+    assert text == "Привет! Как дела?"
+    assert [call.args for call in sent_message.edit_text.await_args_list] == [("Привет! Как дела?",)] * 3
+
+
+@pytest.mark.parametrize(
+    "edit_errors",
+    [
+        [RetryAfter(0), BadRequest("Message is not modified")],
+        [RetryAfter(0)] * 3,
+    ],
+)
+async def test_streamed_answer_failed_retry_of_last_edit_is_skipped(edit_errors: list[Exception]) -> None:
+    reply_to = mock.AsyncMock()
+    reply_to.reply_text.return_value.edit_text.side_effect = edit_errors
+    answer_message = StreamedAnswerMessage(reply_to=reply_to, edit_interval=60, edit_min_chars=1, edit_max_retries=2)
+
+    text = await answer_message.send(_chunks("Привет", "! Как дела?"))
+
+    assert text == "Привет! Как дела?"
+
+
+async def test_streamed_long_answer_split_by_messages() -> None:
+    reply_to = mock.AsyncMock()
+    answer_message = StreamedAnswerMessage(reply_to=reply_to, edit_interval=60, edit_min_chars=1)
+    first_part, second_part = "a" * TELEGRAM_MESSAGE_MAX_LENGTH, "b" * 10
+
+    await answer_message.send(_chunks("a" * 10, first_part[10:] + "b", second_part[1:]))
+
+    assert [call.args for call in reply_to.reply_text.await_args_list] == [("a" * 10,), ("b",)]
+    sent_message = reply_to.reply_text.return_value
+    assert [call.args for call in sent_message.edit_text.await_args_list] == [(first_part,), (second_part,)]
+
+
+async def test_voice_answers_are_sent_in_order_of_parts() -> None:
+    reply_to = mock.AsyncMock()
+    second_part_asked = asyncio.Event()
+
+    async def ask(question: str) -> str:
+        if question == "первый":
+            # the first answer is ready only after the second part is asked
+            await second_part_asked.wait()
+        else:
+            second_part_asked.set()
+        return f"ответ на {question}"
+
+    voice_messages = VoiceAnswerMessages(reply_to=reply_to, ask=ask)
+
+    text_parts = await voice_messages.send(_chunks("первый", "второй"))
+
+    assert text_parts == ["первый", "второй"]
+    sent_texts = [call.args[0] for call in reply_to.reply_text.await_args_list]
+    assert sent_texts.index("ответ на первый") < sent_texts.index("ответ на второй")
+    assert sorted(sent_texts) == sorted(["первый", "второй", "ответ на первый", "ответ на второй"])
+
+
+async def test_voice_question_is_asked_before_next_part_is_recognized() -> None:
+    reply_to = mock.AsyncMock()
+    first_part_asked = asyncio.Event()
+
+    async def text_parts() -> AsyncIterator[str]:
+        yield "первый"
+        await asyncio.wait_for(first_part_asked.wait(), timeout=1)
+        yield "второй"
+
+    async def ask(question: str) -> str:
+        first_part_asked.set()
+        return f"ответ на {question}"
+
+    await VoiceAnswerMessages(reply_to=reply_to, ask=ask).send(text_parts())
+
+    assert reply_to.reply_text.await_count == 4
+
+
+async def test_voice_failed_answer_does_not_stop_next_answers() -> None:
+    reply_to = mock.AsyncMock()
+
+    async def ask(question: str) -> str:
+        if question == "первый":
+            raise RuntimeError("database is locked")
+        return f"ответ на {question}"
+
+    await VoiceAnswerMessages(reply_to=reply_to, ask=ask).send(_chunks("первый", "второй"))
+
+    sent_texts = [call.args[0] for call in reply_to.reply_text.await_args_list]
+    assert sent_texts[2:] == ["Вообще всё сломалось :(", "ответ на второй"]
+
+
+async def test_voice_questions_are_cancelled_if_answers_are_not_sent() -> None:
+    reply_to = mock.AsyncMock()
+    second_answer_cancelled = asyncio.Event()
+
+    async def ask(question: str) -> str:
+        if question == "первый":
+            return f"ответ на {question}"
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            second_answer_cancelled.set()
+            raise
+        return f"ответ на {question}"
+
+    async def reply_text(text: str) -> None:
+        if text == "ответ на первый":
+            raise RuntimeError("telegram is not available")
+
+    reply_to.reply_text.side_effect = reply_text
+
+    with pytest.raises(RuntimeError, match="telegram is not available"):
+        await VoiceAnswerMessages(reply_to=reply_to, ask=ask).send(_chunks("первый", "второй"))
+
+    assert second_answer_cancelled.is_set()
+
+
+async def test_voice_parts_are_sent_without_answers() -> None:
+    reply_to = mock.AsyncMock()
+
+    await VoiceAnswerMessages(reply_to=reply_to).send(_chunks("первый", "второй"))
+
+    assert [call.args[0] for call in reply_to.reply_text.await_args_list] == ["первый", "второй"]
+
+
+def test_split_text_on_line_breaks() -> None:
+    assert split_text("Первая строка\nВторая строка", max_length=20) == ["Первая строка", "Вторая строка"]
+    assert split_text("a" * 25, max_length=10) == ["a" * 10, "a" * 10, "a" * 5]
+    assert split_text("Короткий ответ") == ["Короткий ответ"]
@@ -0,0 +1,41 @@
+import time
+from pathlib import Path
+
+from infra.cache import TTLCache, VersionFile
+
+
+def test_ttl_cache_entry_expires() -> None:
+    cache: TTLCache[str, int] = TTLCache(ttl=0.2)
+    cache.set("answer", 42)
+
+    assert cache.get("answer") == 42
+    time.sleep(0.3)
+    assert cache.get("answer") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used() -> None:
+    cache: TTLCache[str, int] = TTLCache(ttl=60, maxsize=2)
+    cache.set("first", 1)
+    cache.set("second", 2)
+
+    assert cache.get("first") == 1
+    cache.set("third", 3)
+
+    assert cache.get("second") is None
+    assert cache.get("first") == 1
+    assert cache.get("third") == 3
+
+
+def test_ttl_cache_invalidated_by_another_process(tmp_path: Path) -> None:
+    cache: TTLCache[str, int] = TTLCache(ttl=60, version_file=VersionFile("test", directory=tmp_path))
+    another_process_cache: TTLCache[str, int] = TTLCache(ttl=60, version_file=VersionFile("test", directory=tmp_path))
+    cache.set("answer", 42)
+    another_process_cache.set("answer", 42)
+    another_process_cache.set("question", 1)
+
+    another_process_cache.invalidate("answer")
+
+    assert another_process_cache.get("answer") is None
+    assert another_process_cache.get("question") == 1
+    assert cache.get("answer") is None
@@ -0,0 +1,101 @@
+import asyncio
+
+import httpx
+import pytest
+from assertpy import assert_that
+
+from constants import ChatGptCircuitStateEnum
+from infra.http_client import (
+    ChatGptClientGuard,
+    ChatGptClientUnavailableError,
+    build_chatgpt_client,
+    close_chatgpt_client,
+    get_chatgpt_client,
+)
+from settings.config import AppSettings
+
+
+async def test_chatgpt_client_is_shared_until_closed() -> None:
+    client = get_chatgpt_client()
+
+    assert get_chatgpt_client() is client
+
+    await close_chatgpt_client()
+
+    assert client.is_closed
+    assert get_chatgpt_client() is not client
+
+
+@pytest.mark.parametrize("http2", [True, False])
+async def test_build_chatgpt_client_from_settings(test_settings: AppSettings, http2: bool) -> None:
+    settings = test_settings.model_copy(
+        update={"GPT_HTTP2": http2, "GPT_CONNECT_TIMEOUT": 1, "GPT_READ_TIMEOUT": 42, "GPT_POOL_TIMEOUT": 3}
+    )
+
+    client = build_chatgpt_client(settings)
+
+    assert str(client.base_url).rstrip("/") == settings.GPT_BASE_HOST
+    assert client.timeout.connect == 1
+    assert client.timeout.read == 42
+    assert client.timeout.pool == 3
+    await client.aclose()
+
+
+async def test_client_guard_circuit_opens_after_consecutive_failures() -> None:
+    guard = ChatGptClientGuard(max_in_flight=10, queue_timeout=1, failure_threshold=2, reset_timeout=0.1)
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectTimeout):
+            async with guard.guard():
+                raise httpx.ConnectTimeout("timeout")
+
+    assert_that(guard.state).is_equal_to(ChatGptCircuitStateEnum.open)
+    with pytest.raises(ChatGptClientUnavailableError):
+        async with guard.guard():
+            pass
+
+    await asyncio.sleep(0.15)
+    assert_that(guard.state).is_equal_to(ChatGptCircuitStateEnum.half_open)
+
+    trial_started, finish_trial = asyncio.Event(), asyncio.Event()
+
+    async def trial_request() -> None:
+        async with guard.guard():
+            trial_started.set()
+            await finish_trial.wait()
+
+    trial = asyncio.create_task(trial_request())
+    await trial_started.wait()
+    with pytest.raises(ChatGptClientUnavailableError):
+        async with guard.guard():
+            pass
+    finish_trial.set()
+    await trial
+
+    assert_that(guard.state).is_equal_to(ChatGptCircuitStateEnum.closed)
+
+
+async def test_client_guard_failed_trial_opens_circuit() -> None:
+    guard = ChatGptClientGuard(max_in_flight=10, queue_timeout=1, failure_threshold=1, reset_timeout=0.1)
+    with pytest.raises(httpx.ReadTimeout):
+        async with guard.guard():
+            raise httpx.ReadTimeout("timeout")
+    await asyncio.sleep(0.15)
+
+    with pytest.raises(httpx.ConnectError):
+        async with guard.guard():
+            raise httpx.ConnectError("refused")
+
+    assert_that(guard.state).is_equal_to(ChatGptCircuitStateEnum.open)
+
+
+async def test_client_guard_limits_requests_in_flight() -> None:
+    guard = ChatGptClientGuard(max_in_flight=1, queue_timeout=0.05, failure_threshold=1, reset_timeout=60)
+
+    async with guard.guard():
+        with pytest.raises(ChatGptClientUnavailableError):
+            async with guard.guard():
+                pass
+
+    async with guard.guard():
+        pass
+    assert_that(guard.state).is_equal_to(ChatGptCircuitStateEnum.closed)
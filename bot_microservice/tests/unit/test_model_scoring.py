@@ -0,0 +1,79 @@
+import time
+
+from constants import ChatGptCircuitStateEnum
+from core.bot.dto import ChatGptModelDTO
+from core.bot.scoring import ModelScoreboard
+
+MODELS = [ChatGptModelDTO(model="first", priority=2), ChatGptModelDTO(model="second", priority=1)]
+
+
+def build_scoreboard(reset_timeout: float = 60) -> ModelScoreboard:
+    return ModelScoreboard(alpha=0.5, latency_weight=10, failure_threshold=2, reset_timeout=reset_timeout)
+
+
+def test_models_without_answers_are_ranked_by_priority() -> None:
+    scoreboard = build_scoreboard()
+
+    assert scoreboard.rank(MODELS) == ["first", "second"]
+    assert scoreboard.score("first", priority=2) == 3
+
+
+def test_slow_model_is_ranked_lower() -> None:
+    scoreboard = build_scoreboard()
+    scoreboard.record_success("first", latency=30, first_byte_latency=20)
+    scoreboard.record_success("second", latency=1, first_byte_latency=0.5)
+
+    assert scoreboard.rank(MODELS) == ["second", "first"]
+
+
+def test_failures_lower_score() -> None:
+    scoreboard = build_scoreboard()
+    scoreboard.record_success("first", latency=1)
+    scoreboard.record_failure("first")
+
+    assert scoreboard.score("first", priority=2) < scoreboard.score("second", priority=1)
+    assert scoreboard.rank(MODELS) == ["second", "first"]
+    assert scoreboard.circuit_state("first") == ChatGptCircuitStateEnum.closed
+
+
+def test_circuit_is_open_after_consecutive_failures() -> None:
+    scoreboard = build_scoreboard(reset_timeout=0.1)
+    scoreboard.record_failure("first")
+    scoreboard.record_failure("first")
+
+    assert scoreboard.circuit_state("first") == ChatGptCircuitStateEnum.open
+    assert scoreboard.rank(MODELS) == ["second", "first"]
+
+    time.sleep(0.15)
+    assert scoreboard.circuit_state("first") == ChatGptCircuitStateEnum.half_open
+
+    scoreboard.record_failure("first")
+    assert scoreboard.circuit_state("first") == ChatGptCircuitStateEnum.open
+
+    time.sleep(0.15)
+    scoreboard.record_success("first", latency=1)
+    assert scoreboard.circuit_state("first") == ChatGptCircuitStateEnum.closed
+
+
+def test_models_stats() -> None:
+    scoreboard = build_scoreboard()
+    model_request = scoreboard.start_request("second")
+    model_request.received_first_byte()
+    model_request.succeeded()
+    scoreboard.record_success("second", latency=3)
+    scoreboard.record_failure("second")
+
+    first_stats, second_stats = scoreboard.get_models_stats(MODELS)
+
+    assert first_stats.model == "first"
+    assert first_stats.requests == 0
+    assert first_stats.latency is None
+    assert first_stats.failure_rate == 0
+    assert second_stats.requests == 3
+    assert second_stats.failures == 1
+    assert second_stats.consecutive_failures == 1
+    assert second_stats.failure_rate == 0.5
+    assert second_stats.first_byte_latency is not None
+    assert second_stats.latency_histogram["<=0.5"] == 1
+    assert second_stats.latency_histogram["<=5"] == 1
+    assert sum(second_stats.latency_histogram.values()) == 2
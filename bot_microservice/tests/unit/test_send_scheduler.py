@@ -0,0 +1,123 @@
+import asyncio
+from typing import Any
+
+import pytest
+from telegram.error import RetryAfter
+
+from core.bot.scheduler import TelegramSendScheduler
+from settings.config import AppSettings
+
+
+def _build_scheduler(**kwargs: Any) -> TelegramSendScheduler:
+    params = {
+        "global_per_second": 1000,
+        "chat_per_second": 1000,
+        "group_per_minute": 60000,
+        "chat_burst": 1,
+        "max_retries": 1,
+        **kwargs,
+    }
+    return TelegramSendScheduler(**params)
+
+
+async def _send(
+    scheduler: TelegramSendScheduler, sent: list[str], text: str, chat_id: int = 1, endpoint: str = "sendMessage"
+) -> None:
+    async def callback() -> bool:
+        sent.append(text)
+        return True
+
+    await scheduler.process_request(
+        callback=callback, args=(), kwargs={}, endpoint=endpoint, data={"chat_id": chat_id}, rate_limit_args=None
+    )
+
+
+async def test_messages_are_sent_before_edits() -> None:
+    scheduler = _build_scheduler(global_per_second=20)
+    sent: list[str] = []
+
+    await asyncio.gather(
+        _send(scheduler, sent, "first", chat_id=1),
+        _send(scheduler, sent, "edit", chat_id=2, endpoint="editMessageText"),
+        _send(scheduler, sent, "message", chat_id=3),
+    )
+
+    assert sent == ["first", "message", "edit"]
+
+
+async def test_messages_to_chat_are_throttled() -> None:
+    scheduler = _build_scheduler(chat_per_second=10, chat_burst=2)
+    sent: list[str] = []
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+
+    await asyncio.gather(*(_send(scheduler, sent, str(number)) for number in range(4)))
+
+    assert sent == ["0", "1", "2", "3"]
+    assert loop.time() - started_at >= 0.2
+
+
+async def test_group_chat_is_throttled_per_minute() -> None:
+    scheduler = _build_scheduler(group_per_minute=600)
+    sent: list[str] = []
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+
+    await asyncio.gather(_send(scheduler, sent, "first", chat_id=-1), _send(scheduler, sent, "second", chat_id=-1))
+    assert loop.time() - started_at >= 0.1
+
+    started_at = loop.time()
+    await asyncio.gather(_send(scheduler, sent, "private", chat_id=1), _send(scheduler, sent, "private", chat_id=2))
+    assert loop.time() - started_at < 0.1
+
+
+async def test_request_is_repeated_after_retry_after() -> None:
+    scheduler = _build_scheduler()
+    calls = 0
+
+    async def callback() -> bool:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RetryAfter(retry_after=1)
+        return True
+
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+
+    result = await scheduler.process_request(
+        callback=callback, args=(), kwargs={}, endpoint="sendMessage", data={"chat_id": 1}, rate_limit_args=None
+    )
+
+    assert result is True
+    assert calls == 2
+    assert loop.time() - started_at >= 1
+
+
+async def test_retry_after_is_raised_when_retries_are_exhausted() -> None:
+    scheduler = _build_scheduler(max_retries=0)
+
+    async def callback() -> bool:
+        raise RetryAfter(retry_after=1)
+
+    with pytest.raises(RetryAfter):
+        await scheduler.process_request(
+            callback=callback, args=(), kwargs={}, endpoint="sendMessage", data={"chat_id": 1}, rate_limit_args=None
+        )
+
+
+def test_limits_are_shared_between_application_workers() -> None:
+    settings = AppSettings(
+        WORKERS_COUNT=4,
+        TELEGRAM_SEND_GLOBAL_PER_SECOND=30,
+        TELEGRAM_SEND_CHAT_PER_SECOND=1,
+        TELEGRAM_SEND_GROUP_PER_MINUTE=20,
+        TELEGRAM_SEND_CHAT_BURST=3,
+    )
+
+    scheduler = TelegramSendScheduler.build(settings)
+
+    assert scheduler.global_interval == pytest.approx(4 / 30)
+    assert scheduler.chat_interval == pytest.approx(4)
+    assert scheduler.group_interval == pytest.approx(12)
+    assert scheduler.chat_burst == 1
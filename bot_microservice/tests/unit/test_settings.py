@@ -0,0 +1,50 @@
+import pytest
+from assertpy import assert_that
+
+from constants import BotQueueDispatcherEnum, SpeechRecognitionModeEnum
+from settings.config import AppSettings
+
+
+def test_bot_queue_maxsize_requires_workers() -> None:
+    with pytest.raises(RuntimeError, match="bot queue workers count must be set"):
+        AppSettings(
+            BOT_QUEUE_DISPATCHER=BotQueueDispatcherEnum.queue,
+            BOT_QUEUE_WORKERS_COUNT=0,
+            BOT_QUEUE_MAXSIZE=100,
+        )
+
+
+@pytest.mark.parametrize(
+    "dispatcher, workers_count, maxsize",
+    [
+        (BotQueueDispatcherEnum.queue, 0, 0),
+        (BotQueueDispatcherEnum.queue, 4, 100),
+        (BotQueueDispatcherEnum.chat_lanes, 0, 100),
+    ],
+)
+def test_bot_queue_settings_are_valid(dispatcher: BotQueueDispatcherEnum, workers_count: int, maxsize: int) -> None:
+    settings = AppSettings(
+        BOT_QUEUE_DISPATCHER=dispatcher,
+        BOT_QUEUE_WORKERS_COUNT=workers_count,
+        BOT_QUEUE_MAXSIZE=maxsize,
+    )
+
+    assert_that(settings.BOT_QUEUE_MAXSIZE).is_equal_to(maxsize)
+
+
+def test_speech_recognition_processes_are_not_less_than_workers() -> None:
+    with pytest.raises(RuntimeError, match="speech recognition processes must be not less than workers count"):
+        AppSettings(WORKERS_COUNT=4, STT_RECOGNITION_MODE=SpeechRecognitionModeEnum.process, STT_MAX_PROCESSES=2)
+
+
+@pytest.mark.parametrize(
+    "recognition_mode, max_processes",
+    [
+        (SpeechRecognitionModeEnum.process, 4),
+        (SpeechRecognitionModeEnum.thread, 2),
+    ],
+)
+def test_speech_recognition_settings_are_valid(recognition_mode: SpeechRecognitionModeEnum, max_processes: int) -> None:
+    settings = AppSettings(WORKERS_COUNT=4, STT_RECOGNITION_MODE=recognition_mode, STT_MAX_PROCESSES=max_processes)
+
+    assert_that(settings.STT_MAX_PROCESSES).is_equal_to(max_processes)
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from infra.single_flight import SingleFlight
+
+
+async def test_concurrent_calls_share_result() -> None:
+    single_flight: SingleFlight[str, int] = SingleFlight()
+    calls = 0
+
+    async def func() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return 42
+
+    results = await asyncio.gather(*(single_flight.do("question", func) for _ in range(3)))
+
+    assert results == [42, 42, 42]
+    assert calls == 1
+    assert len(single_flight) == 0
+
+    assert await single_flight.do("question", func) == 42
+    assert calls == 2
+
+
+async def test_concurrent_calls_share_exception() -> None:
+    single_flight: SingleFlight[str, int] = SingleFlight()
+
+    async def func() -> int:
+        await asyncio.sleep(0.05)
+        raise ValueError("failed")
+
+    results = await asyncio.gather(*(single_flight.do("question", func) for _ in range(2)), return_exceptions=True)
+
+    assert [type(result) for result in results] == [ValueError, ValueError]
+    assert len(single_flight) == 0
+
+
+async def test_cancelled_waiter_does_not_cancel_call_for_others() -> None:
+    single_flight: SingleFlight[str, int] = SingleFlight()
+
+    async def func() -> int:
+        await asyncio.sleep(0.05)
+        return 42
+
+    cancelled_waiter = asyncio.create_task(single_flight.do("question", func))
+    waiter = asyncio.create_task(single_flight.do("question", func))
+    await asyncio.sleep(0.01)
+    cancelled_waiter.cancel()
+
+    assert await waiter == 42
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled_waiter
+
+
+async def test_call_is_cancelled_when_all_waiters_are_cancelled() -> None:
+    single_flight: SingleFlight[str, int] = SingleFlight()
+    call_cancelled = asyncio.Event()
+
+    async def func() -> int:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            call_cancelled.set()
+            raise
+        return 42
+
+    waiters = [asyncio.create_task(single_flight.do("question", func)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+
+    await asyncio.wait_for(call_cancelled.wait(), timeout=1)
+    assert len(single_flight) == 0
+
+    async def new_func() -> int:
+        return 1
+
+    assert await single_flight.do("question", new_func) == 1
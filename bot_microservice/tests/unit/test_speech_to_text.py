@@ -0,0 +1,136 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator
+from unittest import mock
+
+import pytest
+
+from constants import AUDIO_SAMPLE_RATE, AUDIO_SAMPLE_WIDTH, AUDIO_SEGMENT_DURATION
+from core.bot.services import (
+    AudioDecodeError,
+    SpeechToTextService,
+    get_user_speech_semaphore,
+)
+from core.bot.speech import pcm_to_wav
+
+MS_SIZE = AUDIO_SAMPLE_RATE * AUDIO_SAMPLE_WIDTH // 1000
+
+
+def _pcm_duration(pcm: bytes, sample_rate: int, sample_width: int) -> str:
+    return f"{len(pcm) // (sample_rate * sample_width // 1000)} ms"
+
+
+async def _segments(*segments: bytes) -> AsyncIterator[bytes]:
+    for segment in segments:
+        yield segment
+
+
+def _build_service(audio: bytes, **kwargs: ThreadPoolExecutor) -> SpeechToTextService:
+    speech_to_text_service = SpeechToTextService(audio=audio, **kwargs)
+    # audio of tests is pcm already, it is passed through decoder as is
+    speech_to_text_service.decode_command = ("cat",)
+    return speech_to_text_service
+
+
+async def test_speech_segments_are_yielded_in_order() -> None:
+    pcm = bytes((2 * AUDIO_SEGMENT_DURATION + 10_000) * MS_SIZE)
+    speech_to_text_service = _build_service(audio=pcm)
+
+    with mock.patch("core.bot.services.recognize_speech", side_effect=_pcm_duration):
+        text_parts = [text async for text in speech_to_text_service.get_text_from_audio()]
+
+    assert text_parts == ["120000 ms", "120250 ms", "10250 ms"]
+
+
+async def test_short_speech_is_one_segment() -> None:
+    speech_to_text_service = _build_service(audio=bytes(10_000 * MS_SIZE))
+
+    with mock.patch("core.bot.services.recognize_speech", side_effect=_pcm_duration):
+        text_parts = [text async for text in speech_to_text_service.get_text_from_audio()]
+
+    assert text_parts == ["10000 ms"]
+
+
+async def test_first_segment_is_recognized_before_audio_is_decoded() -> None:
+    speech_to_text_service = _build_service(audio=b"")
+    first_segment_recognized = asyncio.Event()
+
+    async def decode_audio() -> AsyncIterator[bytes]:
+        yield bytes(AUDIO_SEGMENT_DURATION * MS_SIZE)
+        await first_segment_recognized.wait()
+        yield bytes(1000 * MS_SIZE)
+
+    def recognize_speech(pcm: bytes, sample_rate: int, sample_width: int) -> str:
+        asyncio.run_coroutine_threadsafe(_set(first_segment_recognized), loop)
+        return _pcm_duration(pcm, sample_rate, sample_width)
+
+    loop = asyncio.get_running_loop()
+    with (
+        mock.patch.object(speech_to_text_service, "_decode_audio", side_effect=decode_audio),
+        mock.patch("core.bot.services.recognize_speech", side_effect=recognize_speech),
+    ):
+        text_parts = [text async for text in speech_to_text_service.get_text_from_audio()]
+
+    assert text_parts == ["120000 ms", "1000 ms"]
+
+
+async def _set(event: asyncio.Event) -> None:
+    event.set()
+
+
+async def test_speech_is_not_recognized_when_audio_is_not_decoded() -> None:
+    speech_to_text_service = SpeechToTextService(audio=b"voice")
+    speech_to_text_service.decode_command = ("false",)
+
+    with (
+        mock.patch("core.bot.services.recognize_speech") as mocked_recognize_speech,
+        pytest.raises(AudioDecodeError),
+    ):
+        [text async for text in speech_to_text_service.get_text_from_audio()]
+
+    mocked_recognize_speech.assert_not_called()
+
+
+async def test_speech_decoded_before_decoder_failure_is_recognized() -> None:
+    pcm = bytes((AUDIO_SEGMENT_DURATION + 10_000) * MS_SIZE)
+    speech_to_text_service = _build_service(audio=pcm)
+    # decoder outputs the first segment and a part of the next one, then fails
+    speech_to_text_service.decode_command = ("sh", "-c", "cat; exit 1")
+    text_parts = speech_to_text_service.get_text_from_audio()
+
+    with mock.patch("core.bot.services.recognize_speech", side_effect=_pcm_duration):
+        assert await anext(text_parts) == "120000 ms"
+        with pytest.raises(AudioDecodeError):
+            await anext(text_parts)
+
+
+async def test_parallel_recognized_speech_segments_are_yielded_in_order() -> None:
+    speech_to_text_service = SpeechToTextService(audio=b"", recognition_executor=ThreadPoolExecutor(2))
+    speech_to_text_service.parallel = True
+
+    def recognize_speech(pcm: bytes, sample_rate: int, sample_width: int) -> str:
+        # the first segment is recognized after the second one
+        time.sleep(0.1 if pcm == b"first" else 0)
+        return pcm.decode()
+
+    with mock.patch("core.bot.services.recognize_speech", side_effect=recognize_speech):
+        text_parts = [text async for text in speech_to_text_service.recognize_segments(_segments(b"first", b"second"))]
+
+    assert text_parts == ["first", "second"]
+
+
+def test_pcm_to_wav() -> None:
+    pcm = bytes(1000 * MS_SIZE)
+
+    wav_file = pcm_to_wav(memoryview(pcm), sample_rate=AUDIO_SAMPLE_RATE, sample_width=AUDIO_SAMPLE_WIDTH)
+
+    assert wav_file.read(4) == b"RIFF"
+    assert len(wav_file.getvalue()) == len(pcm) + 44
+
+
+async def test_user_speech_semaphore_is_shared_by_user() -> None:
+    semaphore = get_user_speech_semaphore(1)
+
+    assert get_user_speech_semaphore(1) is semaphore
+    assert get_user_speech_semaphore(2) is not semaphore